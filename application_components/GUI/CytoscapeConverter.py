@@ -1,6 +1,36 @@
+import math
+from typing import Tuple
+
 from application_components.dataclasses import *
 
+# Distance (in the units of the positions) at which people are drawn around their street segment
+PERSON_OFFSET = 30
+
 class CytoscapeConverter:
+    @staticmethod
+    def person_node_id(ssn) -> str:
+        return f"person_{ssn}"
+
+    @staticmethod
+    def person_connection_id(ssn) -> str:
+        return f"conn_{ssn}"
+
+    @staticmethod
+    def dispatch_edge_id(patient_ssn, responder_ssn) -> str:
+        return f"dispatch_{patient_ssn}_{responder_ssn}"
+
+    @staticmethod
+    def dispatch_edge(patient_ssn, responder_ssn) -> Dict[str, Any]:
+        """Edge from a selected responder to the patient, added while the request is pending or accepted."""
+        return {
+            'data': {
+                'id': CytoscapeConverter.dispatch_edge_id(patient_ssn, responder_ssn),
+                'source': CytoscapeConverter.person_node_id(responder_ssn),
+                'target': CytoscapeConverter.person_node_id(patient_ssn),
+                'type': 'dispatch'
+            }
+        }
+
     @staticmethod
     def convert_to_cytoscape(graph_data: GraphData) -> Dict[str, Any]:
         elements = []
@@ -12,7 +42,7 @@ class CytoscapeConverter:
 
             elements.append({
                 'data': {
-                    'id': f"edge_{edge.id}",
+                    'id': f"edge_{edge.id}_{edge.target}",
                     'source': edge.id,
                     'target': edge.target,
                     'distance': edge.distance,
@@ -30,7 +60,7 @@ class CytoscapeConverter:
             })
 
         for person in graph_data.people:
-            person_node_id = f"person_{person.ssn}"
+            person_node_id = CytoscapeConverter.person_node_id(person.ssn)
             elements.append({
                 'data': {
                     'id': person_node_id,
@@ -48,7 +78,7 @@ class CytoscapeConverter:
 
             elements.append({
                 'data': {
-                    'id': f"conn_{person.ssn}",
+                    'id': CytoscapeConverter.person_connection_id(person.ssn),
                     'source': person_node_id,
                     'target': person.target
                 }
@@ -59,4 +89,65 @@ class CytoscapeConverter:
     @staticmethod
     def convert_to_json_object(graph_data: GraphData) -> Dict[str, Any]:
         cytoscape_data = CytoscapeConverter.convert_to_cytoscape(graph_data)
-        return cytoscape_data
\ No newline at end of file
+        return cytoscape_data
+
+    @staticmethod
+    def convert_region(graph_data: GraphData, positions: Dict[str, Tuple[float, float]]) -> Dict[str, Any]:
+        """
+        Like convert_to_cytoscape, with a preset position for every node: street segments at their position,
+        people in a circle around their segment.
+        """
+        cytoscape_data = CytoscapeConverter.convert_to_cytoscape(graph_data)
+        segment_of_person = {CytoscapeConverter.person_node_id(person.ssn): person.target
+                             for person in graph_data.people}
+        people_on_segment: Dict[str, int] = {}
+        for element in cytoscape_data['elements']:
+            element_id = element['data']['id']
+            if element['data'].get('type') == 'edge_node':
+                x, y = positions.get(element_id, (0.0, 0.0))
+                element['position'] = {'x': x, 'y': y}
+            elif element_id in segment_of_person:
+                segment = segment_of_person[element_id]
+                index = people_on_segment[segment] = people_on_segment.get(segment, -1) + 1
+                x, y = positions.get(segment, (0.0, 0.0))
+                angle = index * 2.399963  # golden angle in radians, keeps the people of a segment apart
+                radius = PERSON_OFFSET * (1 + index // 8)
+                element['position'] = {'x': x + radius * math.cos(angle), 'y': y + radius * math.sin(angle)}
+        return cytoscape_data
+
+    @staticmethod
+    def convert_districts(districts, links: Dict[Tuple[str, str], int], size: float) -> Dict[str, Any]:
+        """Cytoscape nodes for aggregated districts (see ViewportIndex.districts_in) and edges for their links."""
+        elements = []
+        for district in districts:
+            elements.append({
+                'data': {
+                    'id': district.id,
+                    'label': f"{district.responders} responders",
+                    'type': 'district',
+                    'size': size,
+                    'segments': district.segments,
+                    'citizens': district.citizens,
+                    'responders': district.responders,
+                    'respondersBySpeciality': dict(district.responders_by_speciality)
+                },
+                'position': {'x': district.x, 'y': district.y}
+            })
+        for (source, target), count in links.items():
+            elements.append({
+                'data': {
+                    'id': f"link_{source}_{target}",
+                    'source': source,
+                    'target': target,
+                    'type': 'district_link',
+                    'links': count
+                }
+            })
+        return {'elements': elements}
+
+    @staticmethod
+    def without_dangling_edges(elements: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Drops the edges whose source or target node is not among the elements (e.g. outside a viewport)."""
+        node_ids = {element['data']['id'] for element in elements if 'source' not in element['data']}
+        return [element for element in elements if 'source' not in element['data']
+                or (element['data']['source'] in node_ids and element['data']['target'] in node_ids)]
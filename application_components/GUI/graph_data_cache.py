@@ -0,0 +1,91 @@
+import gzip
+import json
+import threading
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# Bodies smaller than this are not worth compressing
+GZIP_MIN_SIZE = 1024
+GZIP_COMPRESS_LEVEL = 6
+# Elements encoded per json.dumps call, the encoder holds the GIL for the whole call
+ENCODE_CHUNK_SIZE = 1000
+
+
+@dataclass
+class EncodedGraphData:
+    etag: str
+    body: bytes
+    # Set by compress(), None until then or if the body is too small to be worth it
+    gzip_body: Optional[bytes] = None
+
+    def compress(self) -> Optional[bytes]:
+        """Compresses the body once, returns gzip_body."""
+        if self.gzip_body is None and len(self.body) >= GZIP_MIN_SIZE:
+            self.gzip_body = gzip.compress(self.body, compresslevel=GZIP_COMPRESS_LEVEL)
+        return self.gzip_body
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """True if the If-None-Match header of a request names this version."""
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or self.etag in tags or f"W/{self.etag}" in tags
+
+
+def encode_elements(data: Dict[str, Any]) -> bytes:
+    """
+    JSON of Cytoscape data, with the elements encoded in chunks: the event loop thread gets the GIL
+    between the chunks, while one json.dumps of a whole city would stall it until the encoding is done.
+    """
+    elements = data['elements']
+    chunks = [json.dumps(elements[start:start + ENCODE_CHUNK_SIZE], separators=(',', ':'))[1:-1]
+              for start in range(0, len(elements), ENCODE_CHUNK_SIZE)]
+    rest = json.dumps({key: value for key, value in data.items() if key != 'elements'}, separators=(',', ':'))
+    return ('{"elements":[' + ','.join(chunks) + ']' + (',' + rest[1:] if len(rest) > 2 else '}')).encode("utf-8")
+
+
+class GraphDataCache:
+    """
+    The /graphdata response, encoded once per version.
+
+    The Cytoscape elements are converted once per `graph_version` (bumped by Simpy when its graph_data changes)
+    and encoded to JSON once per (graph_version, diff version) pair. Every other request is served the same
+    bytes, or a 304 when its ETag still matches. The ETag includes a random token of this cache, so a browser
+    never revalidates against the versions of an earlier server process.
+    `get` may be called from worker threads, calls are serialised so each version is converted once.
+    """
+    def __init__(self):
+        self._token = uuid.uuid4().hex[:8]
+        self._graph_version: Optional[Hashable] = None
+        self._elements: Optional[Dict[str, Any]] = None
+        self._encoded_version: Optional[tuple] = None
+        self._encoded: Optional[EncodedGraphData] = None
+        self._lock = threading.Lock()
+
+    def get(self, graph_version: Hashable, convert: Callable[[], Dict[str, Any]], diff_version: Hashable = 0,
+            finish: Callable[[Dict[str, Any]], Dict[str, Any]] = None) -> EncodedGraphData:
+        """
+        Args:
+            graph_version: Version of the graph, `convert` runs only when it changed.
+            convert: Builds the Cytoscape data of the graph (e.g. CytoscapeConverter.convert_to_json_object).
+            diff_version: Version of the changes `finish` merges into the converted data.
+            finish: Turns the converted data into the response object (e.g. GraphDiffStream.apply_overlay).
+        """
+        with self._lock:
+            return self._get(graph_version, convert, diff_version, finish)
+
+    def _get(self, graph_version: Hashable, convert: Callable[[], Dict[str, Any]], diff_version: Hashable,
+             finish: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]]) -> EncodedGraphData:
+        if graph_version != self._graph_version or self._elements is None:
+            self._elements = convert()
+            self._graph_version = graph_version
+            self._encoded_version = None
+        if (graph_version, diff_version) != self._encoded_version:
+            data = finish(self._elements) if finish is not None else self._elements
+            self._encoded = EncodedGraphData(
+                etag=f"\"{self._token}-{graph_version}-{diff_version}\"",
+                body=encode_elements(data)
+            )
+            self._encoded_version = (graph_version, diff_version)
+        return self._encoded
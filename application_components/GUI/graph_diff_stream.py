@@ -0,0 +1,162 @@
+import asyncio
+import json
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, List
+
+from application_components.dataclasses import *
+from .CytoscapeConverter import CytoscapeConverter
+
+logger = logging.getLogger(__name__)
+
+# Patches buffered per client, a client falling further behind is told to reload the whole graph
+DEFAULT_CLIENT_QUEUE_SIZE = 1000
+# Seconds between keep-alive comments on an idle stream
+KEEPALIVE_INTERVAL = 15
+
+
+class PatchOperation:
+    RELOAD = "reload"  # the graph was replaced, fetch /graphdata again
+    UPDATE = "update"  # merge the given data into existing elements (by id)
+    ADD = "add"        # add the given Cytoscape elements
+    REMOVE = "remove"  # remove the elements with the given ids
+    MOVE = "move"      # reconnect an edge to another source/target
+
+    def __str__(self):
+        return f"PatchOperation(class with constants: RELOAD='{self.RELOAD}', UPDATE='{self.UPDATE}')"
+
+    def __repr__(self):
+        return f"<PatchOperation class>"
+
+
+class GraphDiffStream:
+    """
+    Incremental updates of the Cytoscape graph for the connected dashboards, sent as Server-Sent Events.
+
+    Bus events (person moved, emergency raised, responder selected/declined/accepted, emergency over) are turned
+    into small patches, numbered by `version`, and fanned out to one bounded queue per client.
+    The dispatch state only exists in these patches, so it is also kept as an overlay that `apply_overlay`
+    merges into a full /graphdata snapshot: a client loads the snapshot (which carries its version),
+    then applies the streamed patches with a higher version.
+    """
+    def __init__(self, client_queue_size: int = DEFAULT_CLIENT_QUEUE_SIZE):
+        self.client_queue_size = client_queue_size
+        self.version = 0
+        self.clients: List[asyncio.Queue] = []
+        # Data merged into existing elements and elements added by patches since the last reload
+        self._overlay_data: Dict[str, Dict[str, Any]] = {}
+        self._overlay_elements: Dict[str, Dict[str, Any]] = {}
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.client_queue_size)
+        self.clients.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        if queue in self.clients:
+            self.clients.remove(queue)
+
+    async def events(self, queue: asyncio.Queue) -> AsyncIterator[bytes]:
+        """Server-Sent Events of one client, starting with the current version."""
+        try:
+            yield self._encode("hello", {"version": self.version})
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+        finally:
+            self.unsubscribe(queue)
+
+    @staticmethod
+    def _encode(event: str, payload: Dict[str, Any]) -> bytes:
+        return f"event: {event}\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n".encode("utf-8")
+
+    def publish(self, op: str, **fields):
+        self.version += 1
+        self._apply_to_overlay(op, fields)
+        frame = self._encode("patch", {"version": self.version, "op": op, **fields})
+        for queue in self.clients:
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                # The client missed patches, it has to start over from a snapshot
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self._encode("patch", {"version": self.version, "op": PatchOperation.RELOAD}))
+
+    def _apply_to_overlay(self, op: str, fields: Dict[str, Any]):
+        if op == PatchOperation.RELOAD:
+            self._overlay_data.clear()
+            self._overlay_elements.clear()
+        elif op == PatchOperation.UPDATE:
+            for data in fields["elements"]:
+                if data["id"] in self._overlay_elements:
+                    self._overlay_elements[data["id"]]["data"].update(data)
+                else:
+                    self._overlay_data.setdefault(data["id"], {}).update(data)
+        elif op == PatchOperation.ADD:
+            for element in fields["elements"]:
+                self._overlay_elements[element["data"]["id"]] = element
+        elif op == PatchOperation.REMOVE:
+            for element_id in fields["ids"]:
+                self._overlay_elements.pop(element_id, None)
+
+    def apply_overlay(self, cytoscape_data: Dict[str, Any]) -> Dict[str, Any]:
+        """The snapshot with the dispatch state of the patches merged in, tagged with the current version."""
+        return self.overlay_snapshot()(cytoscape_data)
+
+    def overlay_snapshot(self) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+        """
+        apply_overlay for the current version, on a copy of the overlay: the returned function can run
+        in a worker thread while the event loop keeps applying patches.
+        """
+        overlay_data = {element_id: dict(data) for element_id, data in self._overlay_data.items()}
+        overlay_elements = [{**element, 'data': dict(element['data'])} for element in self._overlay_elements.values()]
+        version = self.version
+
+        def apply(cytoscape_data: Dict[str, Any]) -> Dict[str, Any]:
+            elements = []
+            for element in cytoscape_data['elements']:
+                overlay = overlay_data.get(element['data']['id'])
+                if overlay is not None:
+                    element = {**element, 'data': {**element['data'], **overlay}}
+                elements.append(element)
+            elements.extend(overlay_elements)
+            return {'elements': elements, 'version': version}
+        return apply
+
+    # Bus events
+
+    def graph_replaced(self, graph: GraphData):
+        self.publish(PatchOperation.RELOAD)
+
+    def person_moved(self, message: PersonMovedMessage):
+        self.publish(PatchOperation.MOVE, id=CytoscapeConverter.person_connection_id(message.ssn),
+                     target=message.target)
+
+    def emergency_raised(self, message: EmergencyRaisedMessage):
+        self.publish(PatchOperation.UPDATE, elements=[{
+            'id': CytoscapeConverter.person_node_id(message.patient_ssn), 'hasEmergency': True,
+            'state': 'emergency', 'level': message.level
+        }])
+
+    def responder_selected(self, message: HealthResponderSelectedMessage):
+        self.publish(PatchOperation.UPDATE, elements=[
+            {'id': CytoscapeConverter.person_node_id(message.responder_ssn), 'state': 'selected'}
+        ])
+        self.publish(PatchOperation.ADD,
+                     elements=[CytoscapeConverter.dispatch_edge(message.patient_ssn, message.responder_ssn)])
+
+    def responder_answered(self, message: EmergencyHelpResponse):
+        responder_id = CytoscapeConverter.person_node_id(message.first_responder_ssn)
+        if message.help_accepted:
+            self.publish(PatchOperation.UPDATE, elements=[{'id': responder_id, 'state': 'accepted'}])
+            return
+        self.publish(PatchOperation.UPDATE, elements=[{'id': responder_id, 'state': 'declined'}])
+        self.publish(PatchOperation.REMOVE,
+                     ids=[CytoscapeConverter.dispatch_edge_id(message.patient_ssn, message.first_responder_ssn)])
+
+    def emergency_over(self, message: EmergencyOverMessage):
+        self.publish(PatchOperation.UPDATE, elements=[
+            {'id': CytoscapeConverter.person_node_id(message.patient_ssn), 'state': 'assisted'}
+        ])
@@ -1,13 +1,25 @@
+import asyncio
+import threading
 from pathlib import Path
 
 import uvicorn
+from broadcaster import Broadcast
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 
+from application_components.dataclasses import *
 from .CytoscapeConverter import CytoscapeConverter
+from .graph_data_cache import EncodedGraphData, GraphDataCache
+from .graph_diff_stream import GraphDiffStream
+from .viewport_index import ViewportIndex
 import logging
 logger = logging.getLogger(__name__)
 
+# Views with more street segments than this are shown as aggregated districts
+DEFAULT_VIEWPORT_SEGMENTS = 2000
+# Most districts returned for a zoomed-out view, neighbouring districts are merged beyond that
+DEFAULT_VIEWPORT_DISTRICTS = 400
+
 class GUIServer:
     """
     GUI Server - Visualization Interface
@@ -16,11 +28,23 @@ class GUIServer:
     Serves the HTML/Cytoscape.js frontend and exposes endpoints to:
     -   Start/Stop the simulation.
     -   Retrieve the current graph state (graphdata) for rendering.
+    -   Stream incremental updates of that graph (graphdata/stream) as simulation and dispatch events
+        arrive on the message bus, so the frontend patches the graph instead of reloading it.
+    -   Retrieve the part of the graph within a viewport (graphdata/viewport), for cities too large to send whole.
     """
-    def __init__(self, simpy):
+    def __init__(self, simpy, broadcast: Broadcast = None):
         self.simpy = simpy
+        self.broadcast = broadcast
         self.app = FastAPI(title="GUI Server")
-        self.websocket_connections = []
+        self.graph_diff_stream = GraphDiffStream()
+        self.graph_data_cache = GraphDataCache()
+        self.index_html = (Path(__file__).parent / "index.html").read_text(encoding="utf-8")
+        # Spatial index of the street graph of simpy, rebuilt for a new graph, people recounted per graph version
+        self.viewport_index: Optional[ViewportIndex] = None
+        self._viewport_index_graph: Optional[GraphData] = None
+        self._viewport_index_version = None
+        # The viewport index is built and queried in worker threads, one request at a time
+        self._viewport_lock = threading.Lock()
         self.setup_routes()
 
     def setup_routes(self):
@@ -36,13 +60,9 @@ class GUIServer:
         @self.app.get("/simulation/watch")
         def watch():
             """
-            Serves the main frontend HTML page for visualizing the simulation.
+            Serves the main frontend HTML page for visualizing the simulation (read once on startup).
             """
-            html_file_path = Path(__file__).parent / "index.html"
-            html_content = ""
-            with open(html_file_path, 'r', encoding='utf-8') as f:
-                html_content = f.read()
-                return HTMLResponse(content=html_content)
+            return HTMLResponse(content=self.index_html)
 
         @self.app.get("/simulation/stop")
         async def stop_simulation():
@@ -51,13 +71,112 @@ class GUIServer:
 
         ## private
         @self.app.get("/graphdata")
-        def get_graphdata():
+        async def get_graphdata(request: Request):
             """
             Returns the current state of the simulation graph (nodes, edges, people) 
-            formatted for Cytoscape.js.
+            formatted for Cytoscape.js, including the dispatch state and the version of graphdata/stream.
+            The encoded JSON is cached per version and revalidated with ETag/If-None-Match, gzip if accepted.
+            """
+            # Conversion, JSON encoding and compression run in a worker thread, off the loop shared with the bus.
+            # The dispatch state is copied here, on the loop that applies the patches.
+            graph_data = self.simpy.graph_data
+            if graph_data is None:
+                return Response(status_code=503, content="No scenario loaded yet", headers={"Retry-After": "1"})
+            accepts_gzip = "gzip" in request.headers.get("accept-encoding", "")
+            encoded = await asyncio.get_running_loop().run_in_executor(
+                None, self._encode_graphdata, graph_data, self.simpy.graph_version,
+                self.graph_diff_stream.version, self.graph_diff_stream.overlay_snapshot(), accepts_gzip)
+            headers = {"ETag": encoded.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+            if encoded.matches(request.headers.get("if-none-match")):
+                return Response(status_code=304, headers=headers)
+            if accepts_gzip and encoded.gzip_body is not None:
+                return Response(content=encoded.gzip_body, media_type="application/json",
+                                headers=headers | {"Content-Encoding": "gzip"})
+            return Response(content=encoded.body, media_type="application/json", headers=headers)
+
+        @self.app.get("/graphdata/viewport")
+        async def get_viewport(min_x: Optional[float] = None, min_y: Optional[float] = None,
+                               max_x: Optional[float] = None, max_y: Optional[float] = None,
+                               max_segments: int = DEFAULT_VIEWPORT_SEGMENTS,
+                               max_districts: int = DEFAULT_VIEWPORT_DISTRICTS):
+            """
+            Returns the graph within the bounding box (the whole city if none is given) for Cytoscape.js,
+            with preset node positions:
+            -   mode "detail": the street segments, edges and people of the box, if at most `max_segments`.
+            -   mode "districts": otherwise the districts of the box with their segment, citizen and responder
+                counts, and the number of street links between them.
+            Also returns the bounds of the whole city and its number of street segments.
+            """
+            graph_data = self.simpy.graph_data
+            if graph_data is None:
+                return Response(status_code=503, content="No scenario loaded yet", headers={"Retry-After": "1"})
+            # Building and querying the index runs in a worker thread, off the loop shared with the bus
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self._viewport, graph_data, self.simpy.graph_version, self.graph_diff_stream.version,
+                self.graph_diff_stream.overlay_snapshot(), (min_x, min_y, max_x, max_y), max_segments, max_districts)
+
+        @self.app.get("/graphdata/stream")
+        async def stream_graphdata():
+            """
+            Server-Sent Events with the patches to the graph of /graphdata, see GraphDiffStream.
             """
-            graphdata = self.simpy.graph_data
-            return CytoscapeConverter.convert_to_json_object(graphdata)
+            queue = self.graph_diff_stream.subscribe()
+            return StreamingResponse(self.graph_diff_stream.events(queue), media_type="text/event-stream",
+                                     headers={"Cache-Control": "no-cache"})
+
+    def _encode_graphdata(self, graph_data: GraphData, graph_version, diff_version, apply_overlay,
+                          compress: bool) -> EncodedGraphData:
+        encoded = self.graph_data_cache.get(
+            graph_version, lambda: CytoscapeConverter.convert_to_json_object(graph_data),
+            diff_version=diff_version, finish=apply_overlay
+        )
+        if compress:
+            encoded.compress()
+        return encoded
+
+    def _viewport(self, graph_data: GraphData, graph_version, diff_version, apply_overlay, bbox: tuple,
+                  max_segments: int, max_districts: int) -> dict:
+        with self._viewport_lock:
+            index = self._get_viewport_index(graph_data, graph_version)
+            if None in bbox:
+                bbox = index.bounds
+            segments = index.segments_in(bbox, limit=max_segments)
+            if len(segments) <= max_segments:
+                data = apply_overlay(CytoscapeConverter.convert_region(index.region(segments), index.positions))
+                data['elements'] = CytoscapeConverter.without_dangling_edges(data['elements'])
+                mode = "detail"
+            else:
+                districts, links, size = index.districts_in(bbox, max_districts)
+                data = CytoscapeConverter.convert_districts(districts, links, size)
+                data['version'] = diff_version
+                mode = "districts"
+            return data | {'mode': mode, 'bounds': index.bounds, 'segments': len(index.positions)}
+
+    def _get_viewport_index(self, graph_data: GraphData, graph_version) -> ViewportIndex:
+        if self._viewport_index_graph is not graph_data:
+            self.viewport_index = ViewportIndex(graph_data.edges)
+            self._viewport_index_graph = graph_data
+            self._viewport_index_version = None
+        if self._viewport_index_version != graph_version:
+            self.viewport_index.update_people(graph_data.people)
+            self._viewport_index_version = graph_version
+        return self.viewport_index
+
+    async def listen_to_bus_messages(self):
+        stream = self.graph_diff_stream
+        await asyncio.gather(
+            self._listen_channel(Channel.INIT, stream.graph_replaced),
+            self._listen_channel(Channel.PERSON_MOVED, stream.person_moved),
+            self._listen_channel(Channel.EMERGENCY_RAISED, stream.emergency_raised),
+            self._listen_channel(Channel.HEALTH_RESPONDER_SELECTED_MESSAGE, stream.responder_selected),
+            self._listen_channel(Channel.HEALTH_RESPONDER_RESPONSE, stream.responder_answered),
+            self._listen_channel(Channel.EMERGENCY_OVER, stream.emergency_over)
+        )
+
+    async def _listen_channel(self, channel, handler):
+        async with self.broadcast.subscribe(channel=channel) as subscriber:
+            async for event in subscriber:
+                handler(event.message)
 
     async def start(self):
         config = uvicorn.Config(
@@ -67,5 +186,7 @@ class GUIServer:
             log_level="info"
         )
         server = uvicorn.Server(config)
+        if self.broadcast is not None:
+            asyncio.create_task(self.listen_to_bus_messages())
         print("Starting GUI Server on port 8000")
         await server.serve()
@@ -0,0 +1,207 @@
+import math
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from application_components.dataclasses import *
+
+# Side length (metres) of the cells of the spatial index
+DEFAULT_CELL_SIZE = 500
+# Side length (metres) of the smallest district, far-away regions are shown as districts or merged districts
+DEFAULT_DISTRICT_SIZE = 2000
+# Spacing (metres) of the lattice that places segments without a position (e.g. the hand-written scenarios)
+FALLBACK_SPACING = 150
+
+BoundingBox = Tuple[float, float, float, float]  # (min_x, min_y, max_x, max_y)
+
+
+@dataclass
+class District:
+    """Aggregate of the street segments and people within one square of the district grid."""
+    id: str
+    segments: int = 0
+    citizens: int = 0
+    responders: int = 0
+    responders_by_speciality: Counter = field(default_factory=Counter)
+    _x_sum: float = 0.0
+    _y_sum: float = 0.0
+
+    @property
+    def x(self) -> float:
+        return self._x_sum / self.segments if self.segments else 0.0
+
+    @property
+    def y(self) -> float:
+        return self._y_sum / self.segments if self.segments else 0.0
+
+    def merge(self, other: "District"):
+        self.segments += other.segments
+        self.citizens += other.citizens
+        self.responders += other.responders
+        self.responders_by_speciality.update(other.responders_by_speciality)
+        self._x_sum += other._x_sum
+        self._y_sum += other._y_sum
+
+    def __str__(self):
+        return f"District(id={self.id}, segments={self.segments}, citizens={self.citizens}, responders={self.responders})"
+
+
+class ViewportIndex:
+    """
+    Spatial index of the street segments of a GraphData, for viewport queries of the GUI.
+
+    Segments are bucketed into square cells by their position (Edge.x/Edge.y), so the segments within
+    a bounding box are found by visiting the overlapping cells only. Segments without a position are placed
+    on a lattice in the order they appear. For zoomed-out views the segments and people are aggregated into
+    districts (DEFAULT_DISTRICT_SIZE squares, merged further when a view covers too many of them).
+
+    The street part is built once per street graph. People move, so `update_people` recounts them
+    (one pass over the people) whenever the graph version changes.
+    """
+    def __init__(self, edges: List[Edge], cell_size: float = DEFAULT_CELL_SIZE,
+                 district_size: float = DEFAULT_DISTRICT_SIZE):
+        self.cell_size = cell_size
+        self.district_size = district_size
+        self.positions: Dict[str, Tuple[float, float]] = {}
+        self.edges_by_segment: Dict[str, List[Edge]] = defaultdict(list)
+        for each_edge in edges:
+            self.edges_by_segment[each_edge.id].append(each_edge)
+            if each_edge.x is not None and each_edge.y is not None:
+                self.positions.setdefault(each_edge.id, (each_edge.x, each_edge.y))
+        self._place_unpositioned(edges)
+
+        self._cells: Dict[Tuple[int, int], List[str]] = defaultdict(list)
+        self._district_segments: Dict[Tuple[int, int], District] = {}
+        for segment, (x, y) in self.positions.items():
+            self._cells[self._cell(x, y, self.cell_size)].append(segment)
+            district = self._district(self._cell(x, y, self.district_size), self._district_segments)
+            district.segments += 1
+            district._x_sum += x
+            district._y_sum += y
+        xs = [x for x, _ in self.positions.values()] or [0.0]
+        ys = [y for _, y in self.positions.values()] or [0.0]
+        self.bounds: BoundingBox = (min(xs), min(ys), max(xs), max(ys))
+
+        # Number of segment links between neighbouring districts
+        self._district_links: Counter = Counter()
+        for each_edge in edges:
+            first = self._cell(*self.positions[each_edge.id], self.district_size)
+            second = self._cell(*self.positions[each_edge.target], self.district_size)
+            if first != second:
+                self._district_links[min(first, second), max(first, second)] += 1
+
+        self.people_by_segment: Dict[str, List[Person]] = {}
+        self.districts: Dict[Tuple[int, int], District] = {}
+
+    def _place_unpositioned(self, edges: List[Edge]):
+        segments = dict.fromkeys(segment for each_edge in edges for segment in (each_edge.id, each_edge.target))
+        unpositioned = [segment for segment in segments if segment not in self.positions]
+        columns = max(1, math.ceil(math.sqrt(len(unpositioned))))
+        for index, segment in enumerate(unpositioned):
+            row, column = divmod(index, columns)
+            self.positions[segment] = (column * FALLBACK_SPACING, row * FALLBACK_SPACING)
+
+    @staticmethod
+    def _cell(x: float, y: float, size: float) -> Tuple[int, int]:
+        return int(math.floor(x / size)), int(math.floor(y / size))
+
+    @staticmethod
+    def _district(key: Tuple[int, int], districts: Dict[Tuple[int, int], District]) -> District:
+        district = districts.get(key)
+        if district is None:
+            district = districts[key] = District(id=f"district_{key[0]}_{key[1]}")
+        return district
+
+    def update_people(self, people: List[Person]):
+        self.people_by_segment = defaultdict(list)
+        self.districts = {}
+        for key, segments in self._district_segments.items():
+            self._district(key, self.districts).merge(segments)
+        for each_person in people:
+            self.people_by_segment[each_person.target].append(each_person)
+            position = self.positions.get(each_person.target)
+            if position is None:
+                continue
+            district = self._district(self._cell(*position, self.district_size), self.districts)
+            if each_person.type == "FirstResponder":
+                district.responders += 1
+                district.responders_by_speciality[each_person.speciality.value] += 1
+            else:
+                district.citizens += 1
+
+    def _cells_in(self, bbox: BoundingBox, size: float) -> Iterator[Tuple[int, int]]:
+        min_x, min_y, max_x, max_y = bbox
+        first_column, first_row = self._cell(min_x, min_y, size)
+        last_column, last_row = self._cell(max_x, max_y, size)
+        for column in range(first_column, last_column + 1):
+            for row in range(first_row, last_row + 1):
+                yield column, row
+
+    def _visited_cells(self, bbox: BoundingBox) -> Iterator[Tuple[int, int]]:
+        """The index cells overlapping the bounding box, clipped to the cells that exist."""
+        clipped = (max(bbox[0], self.bounds[0]), max(bbox[1], self.bounds[1]),
+                   min(bbox[2], self.bounds[2]), min(bbox[3], self.bounds[3]))
+        if clipped[0] > clipped[2] or clipped[1] > clipped[3]:
+            return iter(())
+        return self._cells_in(clipped, self.cell_size)
+
+    def segments_in(self, bbox: BoundingBox, limit: Optional[int] = None) -> List[str]:
+        """Segments within the bounding box, at most `limit` + 1 (enough to tell that a view is over the limit)."""
+        min_x, min_y, max_x, max_y = bbox
+        segments = []
+        for cell in self._visited_cells(bbox):
+            for segment in self._cells.get(cell, ()):
+                x, y = self.positions[segment]
+                if min_x <= x <= max_x and min_y <= y <= max_y:
+                    segments.append(segment)
+                    if limit is not None and len(segments) > limit:
+                        return segments
+        return segments
+
+    def region(self, segments: List[str]) -> GraphData:
+        """The edges starting at the segments and the people located on them."""
+        return GraphData(
+            edges=[each_edge for segment in segments for each_edge in self.edges_by_segment.get(segment, ())],
+            people=[each_person for segment in segments for each_person in self.people_by_segment.get(segment, ())]
+        )
+
+    def districts_in(self, bbox: BoundingBox, max_districts: int) -> Tuple[List[District], Counter, float]:
+        """
+        Districts overlapping the bounding box, merged into squares of `factor` x `factor` districts so that
+        at most about `max_districts` are returned, and the links between them.
+
+        Returns:
+            (districts, links between district ids, size of the returned districts in metres)
+        """
+        min_x, min_y, max_x, max_y = bbox
+        columns = math.floor(max_x / self.district_size) - math.floor(min_x / self.district_size) + 1
+        rows = math.floor(max_y / self.district_size) - math.floor(min_y / self.district_size) + 1
+        factor = max(1, math.ceil(math.sqrt(columns * rows / max(1, max_districts))))
+
+        def merged_key(key: Tuple[int, int]) -> Tuple[int, int]:
+            return key[0] // factor, key[1] // factor
+
+        merged: Dict[Tuple[int, int], District] = {}
+        for key in self._district_keys_in(bbox, columns * rows):
+            district = self.districts.get(key)
+            if district is not None:
+                self._district(merged_key(key), merged).merge(district)
+        if factor > 1:
+            for key, district in merged.items():
+                district.id = f"district_{factor}_{key[0]}_{key[1]}"
+
+        links: Counter = Counter()
+        for (first, second), count in self._district_links.items():
+            first, second = merged_key(first), merged_key(second)
+            if first != second and first in merged and second in merged:
+                links[merged[first].id, merged[second].id] += count
+        return list(merged.values()), links, self.district_size * factor
+
+    def _district_keys_in(self, bbox: BoundingBox, cell_count: int) -> Iterator[Tuple[int, int]]:
+        if cell_count <= len(self.districts):
+            return self._cells_in(bbox, self.district_size)
+        min_x, min_y, max_x, max_y = bbox
+        first_column, first_row = self._cell(min_x, min_y, self.district_size)
+        last_column, last_row = self._cell(max_x, max_y, self.district_size)
+        return (key for key in self.districts
+                if first_column <= key[0] <= last_column and first_row <= key[1] <= last_row)
@@ -0,0 +1,204 @@
+import asyncio
+import itertools
+import logging
+from collections import OrderedDict
+from enum import Enum
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class OverflowPolicy(Enum):
+    DROP_OLDEST = "DropOldest"  # a full queue discards its oldest message
+    COALESCE = "Coalesce"       # a full queue replaces the queued message with the same key (e.g. patient)
+    BLOCK = "Block"             # a full queue makes the producer wait (see ChannelQueue.put_nowait)
+
+    def __str__(self):
+        return f"OverflowPolicy.{self.name}"
+
+
+class ChannelQueue:
+    """
+    Bounded queue between a broadcaster subscription and the consumers of a channel.
+
+    broadcaster's in-memory subscriptions are unbounded, so a consumer that falls behind lets messages pile up
+    without limit. A ChannelQueue holds at most `maxsize` messages and applies its OverflowPolicy when full.
+    With COALESCE, a message arriving at a full queue replaces the queued message with the same key in place.
+    Otherwise a full queue drops its oldest message. Messages for which `discardable` returns False
+    (e.g. they indicate an emergency) are neither replaced nor dropped while there is another message to
+    discard, the arriving message included. Discarded messages are passed to `on_discard`.
+    Depth, high-water mark and drop counters are available through `metrics()`.
+    Like asyncio.Queue, consumers call `task_done()` per message and `join()` waits until all are handled.
+    """
+    def __init__(self, channel: str, maxsize: int, policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+                 coalesce_key: Callable[[Any], Hashable] = None, on_discard: Callable[[Any], None] = None,
+                 discardable: Callable[[Any], bool] = None):
+        if maxsize < 1:
+            raise ValueError(f"maxsize must be at least 1. Got: {maxsize}")
+        if policy == OverflowPolicy.COALESCE and coalesce_key is None:
+            raise ValueError("OverflowPolicy.COALESCE requires a coalesce_key")
+        self.channel = channel
+        self.maxsize = maxsize
+        self.policy = policy
+        self.coalesce_key = coalesce_key
+        self.on_discard = on_discard
+        self.discardable = discardable
+        self._items: "OrderedDict[int, Any]" = OrderedDict()
+        # COALESCE: position (in _items) of the latest queued message per coalesce key
+        self._latest_by_key: Dict[Hashable, int] = {}
+        self._sequence = itertools.count()
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._unfinished = 0
+        self._all_done = asyncio.Event()
+        self._all_done.set()
+
+        self.enqueued_count = 0
+        self.dequeued_count = 0
+        self.dropped_count = 0
+        self.coalesced_count = 0
+        self.blocked_count = 0
+        self.overflowed_count = 0
+        self.high_water_mark = 0
+
+    def qsize(self) -> int:
+        return len(self._items)
+
+    def full(self) -> bool:
+        return len(self._items) >= self.maxsize
+
+    async def put(self, item):
+        """Enqueues a message, waiting for space only with OverflowPolicy.BLOCK."""
+        if self.policy == OverflowPolicy.BLOCK and self.full():
+            self.blocked_count += 1
+            while self.full():
+                await self._not_full.wait()
+        self.put_nowait(item)
+
+    def put_nowait(self, item):
+        """
+        Enqueues a message without waiting, for consumers of a subscription that must keep reading it.
+        With OverflowPolicy.BLOCK the producers are expected to wait through wait_for_capacity() before
+        publishing. A message arriving at a full queue anyway is accepted beyond `maxsize` and counted
+        as overflowed, so the backlog stays visible in metrics() instead of moving into the subscription.
+        """
+        key = self.coalesce_key(item) if self.policy == OverflowPolicy.COALESCE else None
+
+        if self.full():
+            if self.policy == OverflowPolicy.BLOCK:
+                self.overflowed_count += 1
+            elif self._coalesce(key, item):
+                return
+            elif not self._drop_oldest_discardable():
+                if self._may_discard(item):
+                    self.dropped_count += 1
+                    self._discard(item)
+                    return
+                logger.debug(f"Channel queue {self.channel} is full of messages that must be kept, "
+                             f"dropping the oldest")
+                self._drop(next(iter(self._items)))
+
+        position = next(self._sequence)
+        self._items[position] = item
+        if key is not None:
+            self._latest_by_key[key] = position
+        self.enqueued_count += 1
+        self._unfinished += 1
+        self._all_done.clear()
+        self.high_water_mark = max(self.high_water_mark, len(self._items))
+        self._not_empty.set()
+        if self.full():
+            self._not_full.clear()
+
+    def _coalesce(self, key: Optional[Hashable], item) -> bool:
+        """Replaces the queued message with the same key by `item`, if there is one that may be replaced."""
+        if self.policy != OverflowPolicy.COALESCE:
+            return False
+        position = self._latest_by_key.get(key)
+        if position is None:
+            return False
+        replaced = self._items[position]
+        if not self._may_discard(replaced):
+            return False
+        self._items[position] = item
+        self.coalesced_count += 1
+        self._discard(replaced)
+        return True
+
+    def _drop_oldest_discardable(self) -> bool:
+        """Drops the oldest queued message that may be discarded, returns whether there was one."""
+        for position, queued in self._items.items():
+            if self._may_discard(queued):
+                self._drop(position)
+                return True
+        return False
+
+    def _drop(self, position: int):
+        dropped = self._items.pop(position)
+        self._forget_position(position, dropped)
+        self.dropped_count += 1
+        self._unfinished -= 1
+        self._discard(dropped)
+
+    def _may_discard(self, item) -> bool:
+        return self.discardable is None or self.discardable(item)
+
+    def _forget_position(self, position: int, item):
+        if self.policy == OverflowPolicy.COALESCE:
+            key = self.coalesce_key(item)
+            if self._latest_by_key.get(key) == position:
+                del self._latest_by_key[key]
+
+    async def get(self):
+        while not self._items:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        position, item = self._items.popitem(last=False)
+        self._forget_position(position, item)
+        self.dequeued_count += 1
+        self._not_full.set()
+        return item
+
+    def task_done(self):
+        """Marks a message returned by get() as handled."""
+        if self._unfinished <= 0:
+            raise ValueError("task_done() called more times than messages were queued")
+        self._unfinished -= 1
+        if self._unfinished == 0:
+            self._all_done.set()
+
+    async def join(self):
+        """Waits until every queued message has been taken and marked as handled."""
+        await self._all_done.wait()
+
+    async def wait_for_capacity(self, item=None):
+        """
+        Lets a producer wait until a message would be accepted without blocking.
+        Returns immediately for the dropping policies, which never block.
+        """
+        if self.policy == OverflowPolicy.BLOCK:
+            while self.full():
+                await self._not_full.wait()
+
+    def _discard(self, item):
+        if self.on_discard is not None:
+            try:
+                self.on_discard(item)
+            except Exception:
+                logger.exception(f"on_discard of channel queue {self.channel} failed")
+
+    def metrics(self) -> dict:
+        return {
+            "channel": self.channel,
+            "policy": self.policy.value,
+            "maxsize": self.maxsize,
+            "depth": len(self._items),
+            "high_water_mark": self.high_water_mark,
+            "enqueued": self.enqueued_count,
+            "dequeued": self.dequeued_count,
+            "dropped": self.dropped_count,
+            "coalesced": self.coalesced_count,
+            "blocked_puts": self.blocked_count,
+            "overflowed": self.overflowed_count,
+        }
@@ -1,6 +1,6 @@
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, ClassVar
 from typing import Union
 
 
@@ -55,6 +55,10 @@ class Channel:
     HEALTH_RESPONDER_SELECTED_MESSAGE = "health_responder_selected_message"
     HEALTH_RESPONDER_RESPONSE = "health_responder_response"
     EMERGENCY_OVER = "emergency_over"
+    INIT_PROCESSED = "simulation_init_processed"
+    HEALTH_MEASUREMENT_PROCESSED = "health_measurement_processed"
+    EMERGENCY_RAISED = "emergency_raised"
+    PERSON_MOVED = "person_moved"
 
     def __str__(self):
         return f"Channel(class with constants: HEALTH_MEASUREMENT='{self.HEALTH_MEASUREMENT}', INIT='{self.INIT}')"
@@ -64,11 +68,14 @@ class Channel:
 
 
 
-@dataclass
+@dataclass(slots=True)
 class Edge:
     id: str
     target: str
     distance: int
+    # Position of the street segment in metres, set by generated cities (scenarios/city_generator.py)
+    x: Optional[float] = None
+    y: Optional[float] = None
 
     def to_dict(self):
         return {
@@ -85,7 +92,7 @@ class Edge:
         return f"Edge(id='{self.id}', target='{self.target}', distance={self.distance})"
 
 
-@dataclass
+@dataclass(slots=True)
 class MedicalHistory:
     note: str
     emergencyType: str
@@ -130,11 +137,12 @@ class MeasurementType(Enum):
         return f"<MeasurementType.{self.name}: '{self.value}'>"
 
 
-@dataclass
+@dataclass(slots=True)
 class HealthMeasurement:
     value: Union[int, float]
-    name: str = field(default="", init=False)
-    measurement_type: MeasurementType = field(default=None, init=False)
+    # Constants of the measurement class, the instances only hold their value
+    name: ClassVar[str] = ""
+    measurement_type: ClassVar[Optional[MeasurementType]] = None
 
     def __str__(self):
         return f"HealthMeasurement(type={self.measurement_type}, value={self.value}, name='{self.name}')"
@@ -143,13 +151,14 @@ class HealthMeasurement:
         return f"HealthMeasurement(value={self.value}, name='{self.name}', measurement_type={self.measurement_type})"
 
 
-@dataclass
+@dataclass(slots=True)
 class HeartRateMeasurement(HealthMeasurement):
+    name = "HeartRateMeasurement"
+    measurement_type = MeasurementType.HEART_RATE_MEASUREMENT
+
     def __post_init__(self):
         if not (0 <= self.value <= 300):
             raise ValueError(f"{self.__class__.__name__} value must be between 0 and 300. Got: {self.value}")
-        self.name = "HeartRateMeasurement"
-        self.measurement_type = MeasurementType.HEART_RATE_MEASUREMENT
 
     def __str__(self):
         return f"HeartRateMeasurement(value={self.value})"
@@ -158,13 +167,14 @@ class HeartRateMeasurement(HealthMeasurement):
         return f"HeartRateMeasurement(value={self.value})"
 
 
-@dataclass
+@dataclass(slots=True)
 class InflammatoryMeasurement(HealthMeasurement):
+    name = "InflammatoryMeasurement"
+    measurement_type = MeasurementType.INFLAMMATORY_MEASUREMENT
+
     def __post_init__(self):
         if not (0 <= self.value <= 50):
             raise ValueError(f"{self.__class__.__name__} value must be between 0 and 50. Got: {self.value}")
-        self.name = "InflammatoryMeasurement"
-        self.measurement_type = MeasurementType.INFLAMMATORY_MEASUREMENT
 
     def __str__(self):
         return f"InflammatoryMeasurement(value={self.value})"
@@ -173,13 +183,14 @@ class InflammatoryMeasurement(HealthMeasurement):
         return f"InflammatoryMeasurement(value={self.value})"
 
 
-@dataclass
+@dataclass(slots=True)
 class GroundHardnessMeasurement(HealthMeasurement):
+    name = "GroundHardnessMeasurement"
+    measurement_type = MeasurementType.GROUND_HARDNESS_MEASUREMENT
+
     def __post_init__(self):
         if not (1 <= self.value <= 10):
             raise ValueError(f"{self.__class__.__name__} value must be between 1 and 10. Got: {self.value}")
-        self.name = "GroundHardnessMeasurement"
-        self.measurement_type = MeasurementType.GROUND_HARDNESS_MEASUREMENT
 
     def __str__(self):
         return f"GroundHardnessMeasurement(value={self.value})"
@@ -188,13 +199,14 @@ class GroundHardnessMeasurement(HealthMeasurement):
         return f"GroundHardnessMeasurement(value={self.value})"
 
 
-@dataclass
+@dataclass(slots=True)
 class EKGReadingMeasurement(HealthMeasurement):
+    name = "EKGReadingMeasurement"
+    measurement_type = MeasurementType.EKG_READING_MEASUREMENT
+
     def __post_init__(self):
         if not (0 <= self.value <= 4):
             raise ValueError(f"{self.__class__.__name__} value must be between 0 and 4. Got: {self.value}")
-        self.name = "EKGReadingMeasurement"
-        self.measurement_type = MeasurementType.EKG_READING_MEASUREMENT
 
     def __str__(self):
         return f"EKGReadingMeasurement(value={self.value})"
@@ -203,13 +215,14 @@ class EKGReadingMeasurement(HealthMeasurement):
         return f"EKGReadingMeasurement(value={self.value})"
 
 
-@dataclass
+@dataclass(slots=True)
 class MuscleTensionMeasurement(HealthMeasurement):
+    name = "MuscleTensionMeasurement"
+    measurement_type = MeasurementType.MUSCLE_TENSION_MEASUREMENT
+
     def __post_init__(self):
         if not (1 <= self.value <= 10):
             raise ValueError(f"{self.__class__.__name__} value must be between 1 and 10. Got: {self.value}")
-        self.name = "MuscleTensionMeasurement"
-        self.measurement_type = MeasurementType.MUSCLE_TENSION_MEASUREMENT
 
     def __str__(self):
         return f"MuscleTensionMeasurement(value={self.value})"
@@ -218,13 +231,14 @@ class MuscleTensionMeasurement(HealthMeasurement):
         return f"MuscleTensionMeasurement(value={self.value})"
 
 
-@dataclass
+@dataclass(slots=True)
 class AirflowMeasurement(HealthMeasurement):
+    name = "AirflowMeasurement"
+    measurement_type = MeasurementType.AIRFLOW_MEASUREMENT
+
     def __post_init__(self):
         if not (0 <= self.value <= 1000):
             raise ValueError(f"{self.__class__.__name__} value must be between 0 and 1000. Got: {self.value}")
-        self.name = "AirflowMeasurement"
-        self.measurement_type = MeasurementType.AIRFLOW_MEASUREMENT
 
     def __str__(self):
         return f"AirflowMeasurement(value={self.value})"
@@ -233,13 +247,14 @@ class AirflowMeasurement(HealthMeasurement):
         return f"AirflowMeasurement(value={self.value})"
 
 
-@dataclass
+@dataclass(slots=True)
 class ChokingMeasurement(HealthMeasurement):
+    name = "ChokingMeasurement"
+    measurement_type = MeasurementType.CHOKING_MEASUREMENT
+
     def __post_init__(self):
         if not (1 <= self.value <= 10):
             raise ValueError(f"{self.__class__.__name__} value must be between 1 and 10. Got: {self.value}")
-        self.name = "ChokingMeasurement"
-        self.measurement_type = MeasurementType.CHOKING_MEASUREMENT
 
     def __str__(self):
         return f"ChokingMeasurement(value={self.value})"
@@ -248,13 +263,14 @@ class ChokingMeasurement(HealthMeasurement):
         return f"ChokingMeasurement(value={self.value})"
 
 
-@dataclass
+@dataclass(slots=True)
 class BreathingRateMeasurement(HealthMeasurement):
+    name = "BreathingRateMeasurement"
+    measurement_type = MeasurementType.BREATHING_RATE_MEASUREMENT
+
     def __post_init__(self):
         if not (0 <= self.value <= 60):
             raise ValueError(f"{self.__class__.__name__} value must be between 0 and 60. Got: {self.value}")
-        self.name = "BreathingRateMeasurement"
-        self.measurement_type = MeasurementType.BREATHING_RATE_MEASUREMENT
 
     def __str__(self):
         return f"BreathingRateMeasurement(value={self.value})"
@@ -263,13 +279,14 @@ class BreathingRateMeasurement(HealthMeasurement):
         return f"BreathingRateMeasurement(value={self.value})"
 
 
-@dataclass
+@dataclass(slots=True)
 class AsthmaAttackMeasurement(HealthMeasurement):
+    name = "AsthmaAttackMeasurement"
+    measurement_type = MeasurementType.ASTHMA_ATTACK_MEASUREMENT
+
     def __post_init__(self):
         if not (1 <= self.value <= 10):
             raise ValueError(f"{self.__class__.__name__} value must be between 1 and 10. Got: {self.value}")
-        self.name = "AsthmaAttackMeasurement"
-        self.measurement_type = MeasurementType.ASTHMA_ATTACK_MEASUREMENT
 
     def __str__(self):
         return f"AsthmaAttackMeasurement(value={self.value})"
@@ -278,13 +295,14 @@ class AsthmaAttackMeasurement(HealthMeasurement):
         return f"AsthmaAttackMeasurement(value={self.value})"
 
 
-@dataclass
+@dataclass(slots=True)
 class HyperventilationMeasurement(HealthMeasurement):
+    name = "HyperventilationMeasurement"
+    measurement_type = MeasurementType.HYPERVENTILATION_MEASUREMENT
+
     def __post_init__(self):
         if not (1 <= self.value <= 10):
             raise ValueError(f"{self.__class__.__name__} value must be between 1 and 10. Got: {self.value}")
-        self.name = "HyperventilationMeasurement"
-        self.measurement_type = MeasurementType.HYPERVENTILATION_MEASUREMENT
 
     def __str__(self):
         return f"HyperventilationMeasurement(value={self.value})"
@@ -325,7 +343,7 @@ class MeasurementSchedule:
         return f"MeasurementSchedule(items={self.schedule_items}, default={self.default_measurements})"
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class HealthMeasurementValuePair:
     measurement_type: MeasurementType
     category: MeasurementCategory
@@ -343,7 +361,7 @@ class HealthMeasurementValuePair:
         return f"HealthMeasurementValuePair(measurement_type={self.measurement_type}, category={self.category})"
 
 
-@dataclass
+@dataclass(slots=True)
 class Person:
     target: str
     ssn: int
@@ -377,7 +395,7 @@ class Person:
     def __repr__(self):
         return f"Person(ssn={self.ssn}, name='{self.name}', type='{self.type}', speciality={self.speciality}, target='{self.target}', hasEmergency={self.hasEmergency}, certificationLevel={self.certificationLevel})"
 
-@dataclass
+@dataclass(slots=True)
 class EmergencyHelpResponse:
     first_responder_ssn: int
     patient_ssn: int
@@ -390,11 +408,13 @@ class EmergencyHelpResponse:
         return f"EmergencyHelpResponse(first_responder_ssn={self.first_responder_ssn}, patient_ssn={self.patient_ssn}, help_accepted={self.help_accepted})"
 
 
-@dataclass
+@dataclass(slots=True)
 class HealthMessage:
     patient_ssn: int
     patient_edge: str
     measurements: List[HealthMeasurement]
+    # Set by senders that wait for a HealthMessageProcessed acknowledgement (headless simulation)
+    sequence: Optional[int] = None
 
     def __str__(self):
         measurements_count = len(self.measurements)
@@ -404,7 +424,31 @@ class HealthMessage:
         return f"HealthMessage(patient_ssn={self.patient_ssn}, patient_edge='{self.patient_edge}', measurements={self.measurements})"
 
 
-@dataclass
+@dataclass(slots=True)
+class HealthMessageProcessed:
+    patient_ssn: int
+    sequence: int
+    emergency_dispatched: bool
+
+    def __str__(self):
+        return f"HealthMessageProcessed(patient_ssn={self.patient_ssn}, sequence={self.sequence}, emergency_dispatched={self.emergency_dispatched})"
+
+    def __repr__(self):
+        return f"HealthMessageProcessed(patient_ssn={self.patient_ssn}, sequence={self.sequence}, emergency_dispatched={self.emergency_dispatched})"
+
+
+@dataclass(slots=True)
+class InitProcessedMessage:
+    success: bool
+
+    def __str__(self):
+        return f"InitProcessedMessage(success={self.success})"
+
+    def __repr__(self):
+        return f"InitProcessedMessage(success={self.success})"
+
+
+@dataclass(slots=True)
 class HealthResponderSelectedMessage:
     patient_ssn: int
     responder_ssn: int
@@ -418,7 +462,7 @@ class HealthResponderSelectedMessage:
         return f"HealthResponderSelectedMessage(patient_ssn={self.patient_ssn}, responder_ssn={self.responder_ssn}, allowed_to_decline={self.allowed_to_decline})"
 
 
-@dataclass
+@dataclass(slots=True)
 class EmergencyOverMessage:
     patient_ssn: int
 
@@ -430,7 +474,33 @@ class EmergencyOverMessage:
 
 
 
-@dataclass
+@dataclass(slots=True)
+class EmergencyRaisedMessage:
+    patient_ssn: int
+    patient_edge: str
+    level: str
+    speciality: str
+
+    def __str__(self):
+        return f"EmergencyRaisedMessage(patient_ssn={self.patient_ssn}, patient_edge={self.patient_edge}, level={self.level}, speciality={self.speciality})"
+
+    def __repr__(self):
+        return f"EmergencyRaisedMessage(patient_ssn={self.patient_ssn}, patient_edge={self.patient_edge}, level={self.level}, speciality={self.speciality})"
+
+
+@dataclass(slots=True)
+class PersonMovedMessage:
+    ssn: int
+    target: str
+
+    def __str__(self):
+        return f"PersonMovedMessage(ssn={self.ssn}, target={self.target})"
+
+    def __repr__(self):
+        return f"PersonMovedMessage(ssn={self.ssn}, target={self.target})"
+
+
+@dataclass(slots=True)
 class GraphData:
     edges: List[Edge]
     people: List[Person]
@@ -1,163 +1,119 @@
+import bisect
+import math
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
 from application_components.dataclasses import *
 import logging
 logger = logging.getLogger(__name__)
 
+# Category codes of the batch API are indices into CATEGORY_ORDER
+CATEGORY_ORDER: List[MeasurementCategory] = [
+    MeasurementCategory.VERY_LOW,
+    MeasurementCategory.LOW,
+    MeasurementCategory.MEDIUM,
+    MeasurementCategory.HIGH,
+    MeasurementCategory.VERY_HIGH,
+]
+UNCATEGORISED = -1
 
-class HealthMeasurementCategoriser:
-    @staticmethod
-    def process_measurements(measurements: List[HealthMeasurement]) -> List[HealthMeasurementValuePair]:
-        replacements = []
+# Measurement type codes of the batch API are indices into MEASUREMENT_TYPE_ORDER
+MEASUREMENT_TYPE_ORDER: List[MeasurementType] = list(MeasurementType)
+MEASUREMENT_TYPE_CODES: Dict[MeasurementType, int] = {
+    measurement_type: code for code, measurement_type in enumerate(MEASUREMENT_TYPE_ORDER)
+}
 
-        for measurement in measurements:
-            if isinstance(measurement, HeartRateMeasurement):
-                HealthMeasurementCategoriser._process_heartrate(measurement, replacements)
-            elif isinstance(measurement, InflammatoryMeasurement):
-                HealthMeasurementCategoriser._process_inflammatories(measurement, replacements)
-            elif isinstance(measurement, BreathingRateMeasurement):
-                HealthMeasurementCategoriser._process_breathing_rate(measurement, replacements)
-            elif isinstance(measurement, MuscleTensionMeasurement):
-                HealthMeasurementCategoriser._process_muscle_tension(measurement, replacements)
-            elif isinstance(measurement, ChokingMeasurement):
-                HealthMeasurementCategoriser._process_choking(measurement, replacements)
-            elif isinstance(measurement, AsthmaAttackMeasurement):
-                HealthMeasurementCategoriser._process_asthma_attack(measurement, replacements)
-            elif isinstance(measurement, GroundHardnessMeasurement):
-                HealthMeasurementCategoriser._process_ground_hardness(measurement, replacements)
-            elif isinstance(measurement, EKGReadingMeasurement):
-                HealthMeasurementCategoriser._process_ekg_reading(measurement, replacements)
-            elif isinstance(measurement, AirflowMeasurement):
-                HealthMeasurementCategoriser._process_airflow(measurement, replacements)
-            elif isinstance(measurement, HyperventilationMeasurement):
-                HealthMeasurementCategoriser._process_hyperventilation(measurement, replacements)
 
-        return replacements
+@dataclass(frozen=True)
+class CategoryBins:
+    """
+    Lower bound (inclusive) of every category in CATEGORY_ORDER, plus the highest value that is still categorised.
+    Values below the first lower bound or above the upper limit get no category.
+    """
+    lower_bounds: Tuple[float, float, float, float, float]
+    upper_limit: float = math.inf
 
-    @staticmethod
-    def _process_heartrate(measurement: HealthMeasurement, replacements: List[HealthMeasurementValuePair]) -> None:
-        if measurement.value < 40:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.VERY_LOW))
-        elif 40 <= measurement.value <= 60:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.LOW))
-        elif 61 <= measurement.value <= 100:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.MEDIUM))
-        elif 101 <= measurement.value <= 140:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.HIGH))
-        elif measurement.value > 140:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.VERY_HIGH))
 
-    @staticmethod
-    def _process_inflammatories(measurement: HealthMeasurement, replacements: List[HealthMeasurementValuePair]) -> None:
-        if measurement.value < 1:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.VERY_LOW))
-        elif 1 <= measurement.value <= 3:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.LOW))
-        elif 4 <= measurement.value <= 10:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.MEDIUM))
-        elif 11 <= measurement.value <= 20:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.HIGH))
-        elif measurement.value > 20:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.VERY_HIGH))
+CATEGORY_BINS: Dict[MeasurementType, CategoryBins] = {
+    MeasurementType.HEART_RATE_MEASUREMENT: CategoryBins((-math.inf, 40, 61, 101, 141)),
+    MeasurementType.INFLAMMATORY_MEASUREMENT: CategoryBins((-math.inf, 1, 4, 11, 21)),
+    MeasurementType.BREATHING_RATE_MEASUREMENT: CategoryBins((-math.inf, 8, 13, 21, 31)),
+    MeasurementType.MUSCLE_TENSION_MEASUREMENT: CategoryBins((1, 3, 5, 7, 9), upper_limit=10),
+    MeasurementType.CHOKING_MEASUREMENT: CategoryBins((1, 3, 5, 7, 9), upper_limit=10),
+    MeasurementType.ASTHMA_ATTACK_MEASUREMENT: CategoryBins((1, 3, 5, 7, 9), upper_limit=10),
+    MeasurementType.GROUND_HARDNESS_MEASUREMENT: CategoryBins((1, 3, 5, 7, 9), upper_limit=10),
+    MeasurementType.EKG_READING_MEASUREMENT: CategoryBins((0, 1, 2, 3, 4), upper_limit=4),
+    MeasurementType.AIRFLOW_MEASUREMENT: CategoryBins((-math.inf, 100, 201, 301, 401)),
+    MeasurementType.HYPERVENTILATION_MEASUREMENT: CategoryBins((1, 3, 5, 7, 9), upper_limit=10),
+}
 
-    @staticmethod
-    def _process_breathing_rate(measurement: HealthMeasurement, replacements: List[HealthMeasurementValuePair]) -> None:
-        if measurement.value < 8:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.VERY_LOW))
-        elif 8 <= measurement.value <= 12:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.LOW))
-        elif 13 <= measurement.value <= 20:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.MEDIUM))
-        elif 21 <= measurement.value <= 30:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.HIGH))
-        elif measurement.value > 30:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.VERY_HIGH))
+# Bin table as arrays indexed by measurement type code, for the batch API
+_LOWER_BOUNDS = np.array([CATEGORY_BINS[measurement_type].lower_bounds for measurement_type in MEASUREMENT_TYPE_ORDER],
+                         dtype=np.float64)
+_UPPER_LIMITS = np.array([CATEGORY_BINS[measurement_type].upper_limit for measurement_type in MEASUREMENT_TYPE_ORDER],
+                         dtype=np.float64)
 
-    @staticmethod
-    def _process_muscle_tension(measurement: HealthMeasurement, replacements: List[HealthMeasurementValuePair]) -> None:
-        if 1 <= measurement.value <= 2:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.VERY_LOW))
-        elif 3 <= measurement.value <= 4:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.LOW))
-        elif 5 <= measurement.value <= 6:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.MEDIUM))
-        elif 7 <= measurement.value <= 8:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.HIGH))
-        elif 9 <= measurement.value <= 10:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.VERY_HIGH))
+# One shared value pair per (measurement type, category), the pairs are never modified
+_VALUE_PAIRS: Dict[Tuple[MeasurementType, MeasurementCategory], HealthMeasurementValuePair] = {
+    (measurement_type, category): HealthMeasurementValuePair(measurement_type=measurement_type, category=category)
+    for measurement_type in MEASUREMENT_TYPE_ORDER for category in CATEGORY_ORDER
+}
 
-    @staticmethod
-    def _process_choking(measurement: HealthMeasurement, replacements: List[HealthMeasurementValuePair]) -> None:
-        if 1 <= measurement.value <= 2:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.VERY_LOW))
-        elif 3 <= measurement.value <= 4:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.LOW))
-        elif 5 <= measurement.value <= 6:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.MEDIUM))
-        elif 7 <= measurement.value <= 8:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.HIGH))
-        elif 9 <= measurement.value <= 10:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.VERY_HIGH))
 
+class HealthMeasurementCategoriser:
+    """
+    Converts raw sensor values into discrete MeasurementCategory values, using the per-type bin table CATEGORY_BINS.
+    -   process_measurements: list of HealthMeasurement -> list of HealthMeasurementValuePair (single message).
+    -   categorise_batch: arrays of type codes and values -> array of category codes (many readings at once).
+    """
     @staticmethod
-    def _process_asthma_attack(measurement: HealthMeasurement, replacements: List[HealthMeasurementValuePair]) -> None:
-        if 1 <= measurement.value <= 2:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.VERY_LOW))
-        elif 3 <= measurement.value <= 4:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.LOW))
-        elif 5 <= measurement.value <= 6:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.MEDIUM))
-        elif 7 <= measurement.value <= 8:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.HIGH))
-        elif 9 <= measurement.value <= 10:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.VERY_HIGH))
+    def categorise_value(measurement_type: MeasurementType, value) -> Optional[MeasurementCategory]:
+        bins = CATEGORY_BINS.get(measurement_type)
+        if bins is None or value > bins.upper_limit:
+            return None
+        index = bisect.bisect_right(bins.lower_bounds, value) - 1
+        return CATEGORY_ORDER[index] if index >= 0 else None
 
     @staticmethod
-    def _process_ground_hardness(measurement: HealthMeasurement, replacements: List[HealthMeasurementValuePair]) -> None:
-        if 1 <= measurement.value <= 2:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.VERY_LOW))
-        elif 3 <= measurement.value <= 4:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.LOW))
-        elif 5 <= measurement.value <= 6:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.MEDIUM))
-        elif 7 <= measurement.value <= 8:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.HIGH))
-        elif 9 <= measurement.value <= 10:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.VERY_HIGH))
+    def process_measurements(measurements: List[HealthMeasurement]) -> List[HealthMeasurementValuePair]:
+        replacements = []
+
+        for measurement in measurements:
+            category = HealthMeasurementCategoriser.categorise_value(measurement.measurement_type, measurement.value)
+            if category is not None:
+                replacements.append(_VALUE_PAIRS[(measurement.measurement_type, category)])
+
+        return replacements
 
     @staticmethod
-    def _process_ekg_reading(measurement: HealthMeasurement, replacements: List[HealthMeasurementValuePair]) -> None:
-        if measurement.value == 0:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.VERY_LOW))
-        elif measurement.value == 1:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.LOW))
-        elif measurement.value == 2:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.MEDIUM))
-        elif measurement.value == 3:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.HIGH))
-        elif measurement.value == 4:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.VERY_HIGH))
+    def categorise_batch(type_codes, values) -> np.ndarray:
+        """
+        Categorises many readings in one vectorised pass.
+
+        `type_codes` are indices into MEASUREMENT_TYPE_ORDER, `values` the raw readings (same length).
+        Returns an int8 array of indices into CATEGORY_ORDER, UNCATEGORISED where a reading falls outside its table.
+        """
+        type_codes = np.asarray(type_codes, dtype=np.intp)
+        values = np.asarray(values, dtype=np.float64)
+        categories = (values[:, np.newaxis] >= _LOWER_BOUNDS[type_codes]).sum(axis=1, dtype=np.int8) - 1
+        categories[values > _UPPER_LIMITS[type_codes]] = UNCATEGORISED
+        return categories
 
     @staticmethod
-    def _process_airflow(measurement: HealthMeasurement, replacements: List[HealthMeasurementValuePair]) -> None:
-        if measurement.value < 100:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.VERY_LOW))
-        elif 100 <= measurement.value <= 200:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.LOW))
-        elif 201 <= measurement.value <= 300:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.MEDIUM))
-        elif 301 <= measurement.value <= 400:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.HIGH))
-        elif measurement.value > 400:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.VERY_HIGH))
+    def encode_measurements(measurements: Iterable[HealthMeasurement]) -> Tuple[np.ndarray, np.ndarray]:
+        """Type codes and values of the measurements, as input for categorise_batch."""
+        measurements = list(measurements)
+        type_codes = np.fromiter((MEASUREMENT_TYPE_CODES[each.measurement_type] for each in measurements),
+                                 dtype=np.intp, count=len(measurements))
+        values = np.fromiter((each.value for each in measurements), dtype=np.float64, count=len(measurements))
+        return type_codes, values
 
     @staticmethod
-    def _process_hyperventilation(measurement: HealthMeasurement, replacements: List[HealthMeasurementValuePair]) -> None:
-        if 1 <= measurement.value <= 2:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.VERY_LOW))
-        elif 3 <= measurement.value <= 4:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.LOW))
-        elif 5 <= measurement.value <= 6:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.MEDIUM))
-        elif 7 <= measurement.value <= 8:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.HIGH))
-        elif 9 <= measurement.value <= 10:
-            replacements.append(HealthMeasurementValuePair(measurement_type=measurement.measurement_type, category=MeasurementCategory.VERY_HIGH))
\ No newline at end of file
+    def decode_categories(type_codes, categories) -> List[Optional[HealthMeasurementValuePair]]:
+        """Value pairs for the result of categorise_batch, None for uncategorised readings."""
+        return [
+            _VALUE_PAIRS[(MEASUREMENT_TYPE_ORDER[type_code], CATEGORY_ORDER[category])] if category >= 0 else None
+            for type_code, category in zip(np.asarray(type_codes).tolist(), np.asarray(categories).tolist())
+        ]
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from urllib.parse import urlencode
+
+import httpx
+
+from .graphdb_client import DEFAULT_POOL_SIZE, DEFAULT_TIMEOUT, DEFAULT_MAX_RETRIES, DEFAULT_BACKOFF_FACTOR, \
+    RETRY_STATUS_CODES, UPDATE_RETRY_STATUS_CODES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 8
+# Slots of max_concurrency that only priority (emergency) requests may use
+DEFAULT_RESERVED_PRIORITY_SLOTS = 2
+
+
+class AsyncGraphDBClient:
+    """
+    Client for GraphDB, encapsulating authentication and SPARQL query execution.
+
+    Offers ask_query/insert_query (returning (result, status_code) tuples) as coroutines on top of
+    a pooled httpx.AsyncClient, so Medicus can await GraphDB without blocking the shared event loop.
+    -   At most `max_concurrency` requests are in flight at once (semaphore). `reserved_priority_slots`
+        of them are kept free for requests sent with priority=True, so emergency handling never
+        waits behind a flood of measurement updates. Priority requests take a normal slot while one
+        is free and fall back to the reserved ones, so they can use every slot.
+    -   Every request has a (connect, read) timeout, which can be overridden per call.
+    -   Connect errors are retried with exponential backoff, as are 502/503/504 for queries. Updates are
+        not idempotent and a 502/504 does not mean they were not applied, so they are only retried on 503.
+    -   An expired token (401) is refreshed once before the request is repeated.
+    """
+    def __init__(self, base_url: str, repository_id: str, username: str = "admin", password: str = "root",
+                 pool_size: int = DEFAULT_POOL_SIZE, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 timeout=DEFAULT_TIMEOUT, max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff_factor: float = DEFAULT_BACKOFF_FACTOR, transport: httpx.AsyncBaseTransport = None,
+                 reserved_priority_slots: int = DEFAULT_RESERVED_PRIORITY_SLOTS):
+        self.base_url = base_url
+        self.repository_id = repository_id
+        self.username = username
+        self.password = password
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=self._to_httpx_timeout(timeout),
+            transport=transport
+        )
+        reserved_priority_slots = min(reserved_priority_slots, max_concurrency - 1)
+        self._semaphore = asyncio.Semaphore(max_concurrency - reserved_priority_slots)
+        self._priority_semaphore = asyncio.Semaphore(max(reserved_priority_slots, 1))
+        self._token_lock = asyncio.Lock()
+        self.token = None
+
+    @staticmethod
+    def _to_httpx_timeout(timeout) -> httpx.Timeout:
+        if isinstance(timeout, tuple):
+            connect_timeout, read_timeout = timeout
+            return httpx.Timeout(read_timeout, connect=connect_timeout)
+        return httpx.Timeout(timeout)
+
+    async def _request_auth_token(self):
+        url = f"{self.base_url}/rest/login"
+        headers = {
+            'accept': 'application/json',
+            'Content-Type': 'application/json'
+        }
+        payload = {
+            "username": self.username,
+            "password": self.password
+        }
+
+        try:
+            response = await self.http.post(url, headers=headers, json=payload)
+            response.raise_for_status()
+            token = response.headers.get("authorization")
+            if not token:
+                token = response.json().get('token') or response.text
+            logger.info("Successfully obtained GraphDB token")
+            return token
+        except (httpx.HTTPError, ValueError) as e:
+            logger.error(f"Error obtaining token: {e}")
+            return ""
+
+    async def _ensure_auth_token(self, expired_token: str = None):
+        """Logs in if no token exists yet, or if the given token was rejected and nobody replaced it meanwhile."""
+        async with self._token_lock:
+            if self.token is None or (expired_token is not None and self.token == expired_token):
+                self.token = await self._request_auth_token()
+        return self.token
+
+    async def insert_query(self, query: str, timeout=None, priority: bool = False):
+        """Executes a SPARQL UPDATE (INSERT/DELETE) query."""
+        return await self._do_query(query, "application/sparql-update", timeout, priority)
+
+    async def ask_query(self, query: str, timeout=None, priority: bool = False):
+        """Executes a SPARQL QUERY (SELECT/ASK) query."""
+        return await self._do_query(query, "application/sparql-query", timeout, priority)
+
+    async def upload_statements(self, data, content_type: str, timeout=None, context: str = None):
+        """
+        Adds RDF data (e.g. N-Triples) to the repository through the statements endpoint.
+        `data` is either bytes or an async iterator of bytes, which is streamed as the request body.
+        A streamed body cannot be replayed, so it is sent without retries.
+        With a `context` (graph IRI), the statements are added to that named graph.
+        """
+        headers = {
+            "Content-Type": content_type,
+            "Accept": "*/*"
+        }
+        path = f"{self.base_url}/repositories/{self.repository_id}/statements"
+        if context is not None:
+            path += "?" + urlencode({"context": f"<{context}>"})
+        return await self._do_request(path, headers, data, timeout, retry=isinstance(data, bytes),
+                                      retry_status_codes=UPDATE_RETRY_STATUS_CODES)
+
+    async def close(self):
+        await self.http.aclose()
+
+    async def _do_query(self, query: str, content_type: str, timeout=None, priority: bool = False):
+        headers = {
+            "Content-Type": content_type
+        }
+        if "sparql-query" in content_type:
+            path = f"{self.base_url}/repositories/{self.repository_id}"
+            headers["Accept"] = "application/sparql-results+json"
+            retry_status_codes = RETRY_STATUS_CODES
+        else:
+            path = f"{self.base_url}/repositories/{self.repository_id}/statements"
+            headers["Accept"] = "*/*"
+            retry_status_codes = UPDATE_RETRY_STATUS_CODES
+
+        return await self._do_request(path, headers, query.encode('utf-8'), timeout, priority=priority,
+                                      retry_status_codes=retry_status_codes)
+
+    @asynccontextmanager
+    async def _slot(self, priority: bool):
+        """One of the concurrency slots, priority requests prefer a free normal slot over a reserved one."""
+        semaphore = self._semaphore
+        if priority and self._semaphore.locked():
+            semaphore = self._priority_semaphore
+        async with semaphore:
+            yield
+
+    async def _do_request(self, path: str, headers: dict, content, timeout=None, retry: bool = True,
+                          priority: bool = False, retry_status_codes=RETRY_STATUS_CODES):
+        try:
+            async with self._slot(priority):
+                response = await self._post_with_retries(path, headers, content, timeout, retry, retry_status_codes)
+        except Exception as e:
+            logger.error(f"Connection to GraphDB failed: {e}")
+            return {"error": str(e)}, 500
+
+        try:
+            # Handle empty responses (common for updates) vs JSON responses
+            return_dic = {}
+            if response.text and response.text.strip():
+                return_dic = json.loads(response.text)
+            return return_dic, response.status_code
+        except json.JSONDecodeError:
+            # Fallback if response is text but not JSON
+            return {}, response.status_code
+
+    async def _post_with_retries(self, path: str, headers: dict, data, timeout=None, retry: bool = True,
+                                 retry_status_codes=RETRY_STATUS_CODES) -> httpx.Response:
+        request_timeout = self._to_httpx_timeout(timeout) if timeout is not None else httpx.USE_CLIENT_DEFAULT
+        token = self.token if self.token is not None else await self._ensure_auth_token()
+        reauthenticated = not retry
+        attempt = 0 if retry else self.max_retries
+
+        while True:
+            try:
+                response = await self.http.post(path, headers=headers | {"Authorization": token}, content=data,
+                                                timeout=request_timeout)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                if attempt >= self.max_retries:
+                    raise
+            else:
+                if response.status_code == 401 and not reauthenticated:
+                    reauthenticated = True
+                    token = await self._ensure_auth_token(expired_token=token)
+                    continue
+                if response.status_code not in retry_status_codes or attempt >= self.max_retries:
+                    return response
+
+            await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+            attempt += 1
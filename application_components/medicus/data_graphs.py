@@ -0,0 +1,29 @@
+from urllib.parse import quote
+
+
+class DataGraphs:
+    """
+    Named graphs partitioning the data Medicus writes to GraphDB, below one base IRI:
+    -   {base}/topology: street segments and their connections (Channel.INIT)
+    -   {base}/people: citizens and first responders with their certifications (Channel.INIT)
+    -   {base}/emergencies: detected emergencies and declined requests
+    -   {base}/measurements/{ssn}: the current health measurements of one patient
+
+    Replacing the measurements of a patient and resetting the dynamic data are DROP GRAPH operations,
+    whose cost does not depend on the ontology or on the history stored in the repository.
+    GraphDB retracts the inferred statements (e.g. matchesMedicalIssueMeasurementPair) with the dropped ones,
+    so the blank measurement value pairs of a patient no longer accumulate.
+    """
+    def __init__(self, base: str):
+        self.base = base.rstrip("/")
+        self.topology = f"{self.base}/topology"
+        self.people = f"{self.base}/people"
+        self.emergencies = f"{self.base}/emergencies"
+        self._measurements_prefix = f"{self.base}/measurements/"
+
+    def measurements(self, patient_ssn) -> str:
+        return f"{self._measurements_prefix}{quote(str(patient_ssn), safe='')}"
+
+    def __contains__(self, graph: str) -> bool:
+        """True for the graphs of this partitioning, graphs of other bases (e.g. {base}/scenario-1/...) excluded."""
+        return graph in (self.topology, self.people, self.emergencies) or graph.startswith(self._measurements_prefix)
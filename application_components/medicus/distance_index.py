@@ -0,0 +1,237 @@
+import hashlib
+import heapq
+import logging
+import pickle
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .street_network import StreetNetwork
+
+logger = logging.getLogger(__name__)
+
+# Street graphs up to this many segments get a full all-pairs matrix, larger ones landmark tables
+ALL_PAIRS_MAX_SEGMENTS = 1000
+DEFAULT_LANDMARK_COUNT = 16
+DISTANCE_INDEX_CACHE_DIR = Path(__file__).resolve().parents[2] / "cache" / "distance_index"
+DISTANCE_INDEX_FORMAT_VERSION = 1
+
+UNREACHABLE = -1
+
+
+class AllPairsDistanceIndex:
+    """
+    Precomputed street distance between every pair of segments (one Dijkstra per segment).
+    A lookup is a single array access; ranking candidates is a lookup plus a top-k selection.
+    """
+    def __init__(self, segments: List[str], rows: List[array]):
+        self.segments = segments
+        self.positions: Dict[str, int] = {segment: position for position, segment in enumerate(segments)}
+        self.rows = rows
+
+    @classmethod
+    def build(cls, network: StreetNetwork) -> "AllPairsDistanceIndex":
+        segments = sorted(network.lengths)
+        positions = {segment: position for position, segment in enumerate(segments)}
+        rows = []
+        for source in segments:
+            row = array('q', [UNREACHABLE]) * len(segments)
+            for segment, distance in network.iter_nearest(source):
+                row[positions[segment]] = distance
+            rows.append(row)
+        return cls(segments, rows)
+
+    def __contains__(self, segment: str) -> bool:
+        return segment in self.positions
+
+    def distance(self, source: str, target: str) -> Optional[int]:
+        distance = self.rows[self.positions[source]][self.positions[target]]
+        return None if distance == UNREACHABLE else distance
+
+    def rank(self, source: str, targets: Iterable[str], k: int) -> List[Tuple[str, int]]:
+        """The k closest reachable targets as (segment, distance), closest first."""
+        row = self.rows[self.positions[source]]
+        reachable = []
+        for target in set(targets):
+            position = self.positions.get(target)
+            if position is not None and row[position] != UNREACHABLE:
+                reachable.append((row[position], target))
+        return [(target, distance) for distance, target in heapq.nsmallest(k, reachable)]
+
+
+class LandmarkDistanceIndex:
+    """
+    ALT (A*, landmarks, triangle inequality) index for street graphs too large for an all-pairs matrix.
+
+    Stores the distance from a few well spread landmarks to every segment. These give a lower bound
+    for any pair of segments, so candidates can be ordered by lower bound and only the most
+    promising ones need an exact (landmark-guided A*) search.
+
+    The segment distance (lengths of the segments passed in between) is not a metric by itself.
+    Internally the index works with the metric D(a, b) = d(a, b) + (len(a) + len(b)) / 2, i.e. each
+    link between two segments weighs half of both lengths, and converts back when returning.
+    """
+    def __init__(self, network: StreetNetwork, segments: List[str], landmarks: List[str], tables: List[array]):
+        self.network = network
+        self.segments = segments
+        self.positions: Dict[str, int] = {segment: position for position, segment in enumerate(segments)}
+        self.landmarks = landmarks
+        self.tables = tables
+
+    def __getstate__(self):
+        # The street network is rebuilt from Channel.INIT, only the landmark tables are persisted
+        return {"segments": self.segments, "landmarks": self.landmarks, "tables": self.tables}
+
+    def __setstate__(self, state):
+        self.__init__(None, state["segments"], state["landmarks"], state["tables"])
+
+    @classmethod
+    def build(cls, network: StreetNetwork, landmark_count: int = DEFAULT_LANDMARK_COUNT) -> "LandmarkDistanceIndex":
+        """Chooses landmarks by farthest-point selection, starting from an arbitrary segment."""
+        segments = sorted(network.lengths)
+        positions = {segment: position for position, segment in enumerate(segments)}
+        landmarks: List[str] = []
+        tables: List[array] = []
+        closest_landmark_distance = array('d', [float("inf")]) * len(segments)
+
+        next_landmark = segments[0] if segments else None
+        while next_landmark is not None and len(landmarks) < landmark_count:
+            table = cls._metric_distances_from(network, next_landmark, positions)
+            landmarks.append(next_landmark)
+            tables.append(table)
+
+            for position, distance in enumerate(table):
+                if distance < closest_landmark_distance[position]:
+                    closest_landmark_distance[position] = distance
+            for landmark in landmarks:
+                closest_landmark_distance[positions[landmark]] = -1.0
+            # Prefer unreached components (infinite distance), then the segment farthest away from all landmarks
+            farthest = max(range(len(segments)), key=closest_landmark_distance.__getitem__)
+            next_landmark = segments[farthest] if closest_landmark_distance[farthest] > 0 else None
+        return cls(network, segments, landmarks, tables)
+
+    @staticmethod
+    def _metric_distances_from(network: StreetNetwork, source: str, positions: Dict[str, int]) -> array:
+        table = array('d', [float("inf")]) * len(positions)
+        source_length = network.lengths[source]
+        for segment, distance in network.iter_nearest(source):
+            table[positions[segment]] = 0 if segment == source else distance + (source_length + network.lengths[segment]) / 2
+        return table
+
+    def __contains__(self, segment: str) -> bool:
+        return segment in self.positions
+
+    def _metric_lower_bound(self, a: str, b: str) -> float:
+        position_a, position_b = self.positions[a], self.positions[b]
+        bound = 0.0
+        for table in self.tables:
+            distance_a, distance_b = table[position_a], table[position_b]
+            if distance_a == float("inf") or distance_b == float("inf"):
+                if distance_a != distance_b:
+                    return float("inf")  # the landmark reaches only one of both: different components
+                continue
+            bound = max(bound, abs(distance_a - distance_b))
+        return bound
+
+    def _to_segment_distance(self, a: str, b: str, metric_distance: float) -> int:
+        if a == b:
+            return 0
+        return round(metric_distance - (self.network.lengths[a] + self.network.lengths[b]) / 2)
+
+    def distance(self, source: str, target: str) -> Optional[int]:
+        metric_distance = self._metric_a_star(source, target)
+        if metric_distance is None:
+            return None
+        return self._to_segment_distance(source, target, metric_distance)
+
+    def _metric_a_star(self, source: str, target: str) -> Optional[float]:
+        lengths = self.network.lengths
+        best = {source: 0.0}
+        queue = [(self._metric_lower_bound(source, target), 0.0, source)]
+        settled = set()
+        while queue:
+            _, distance, segment = heapq.heappop(queue)
+            if segment == target:
+                return distance
+            if segment in settled:
+                continue
+            settled.add(segment)
+            for neighbour in self.network.adjacency.get(segment, ()):
+                candidate = distance + (lengths[segment] + lengths[neighbour]) / 2
+                if neighbour not in settled and candidate < best.get(neighbour, float("inf")):
+                    best[neighbour] = candidate
+                    heapq.heappush(queue, (candidate + self._metric_lower_bound(neighbour, target), candidate,
+                                           neighbour))
+        return None
+
+    def rank(self, source: str, targets: Iterable[str], k: int) -> List[Tuple[str, int]]:
+        """
+        The k closest reachable targets as (segment, distance), closest first.
+        Targets are searched exactly in lower-bound order, until no remaining lower bound can beat the k-th result.
+        Equally distant targets are ordered by segment id, like AllPairsDistanceIndex.rank.
+        """
+        bounded = []
+        for target in set(targets):
+            if target not in self.positions:
+                continue
+            metric_bound = self._metric_lower_bound(source, target)
+            if metric_bound != float("inf"):
+                bounded.append((max(0, self._to_segment_distance(source, target, metric_bound)), target))
+        bounded.sort()
+
+        best: List[Tuple[int, str]] = []
+        for lower_bound, target in bounded:
+            if len(best) >= k and (lower_bound, target) > best[-1]:
+                break
+            distance = self.distance(source, target)
+            if distance is not None:
+                best.append((distance, target))
+                best.sort()
+                del best[k:]
+        return [(target, distance) for distance, target in best]
+
+
+def graph_fingerprint(network: StreetNetwork) -> str:
+    digest = hashlib.sha256()
+    for segment in sorted(network.lengths):
+        neighbours = ",".join(sorted(network.adjacency.get(segment, ())))
+        digest.update(f"{segment}|{network.lengths[segment]}|{neighbours}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def load_or_build_distance_index(network: StreetNetwork, cache_dir: Optional[Path] = DISTANCE_INDEX_CACHE_DIR):
+    """
+    Returns the distance index for the street network, preferring a previously persisted one.
+    Small graphs get an AllPairsDistanceIndex, large ones a LandmarkDistanceIndex.
+    The index is cached on disk under the fingerprint of the graph, so restarts with the same
+    street graph do not recompute it. Pass cache_dir=None to disable persistence.
+    """
+    kind = "all_pairs" if len(network) <= ALL_PAIRS_MAX_SEGMENTS else "landmarks"
+    cache_file = None
+    if cache_dir is not None:
+        cache_file = Path(cache_dir) / f"{kind}_v{DISTANCE_INDEX_FORMAT_VERSION}_{graph_fingerprint(network)}.pickle"
+        if cache_file.exists():
+            try:
+                with open(cache_file, 'rb') as file:
+                    index = pickle.load(file)
+                if isinstance(index, LandmarkDistanceIndex):
+                    index.network = network
+                logger.info(f"Loaded distance index from {cache_file}")
+                return index
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+                logger.warning(f"Ignoring unreadable distance index cache {cache_file}: {e}")
+
+    if kind == "all_pairs":
+        index = AllPairsDistanceIndex.build(network)
+    else:
+        index = LandmarkDistanceIndex.build(network)
+    logger.info(f"Built {kind} distance index for {len(network)} street segments")
+
+    if cache_file is not None:
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(cache_file, 'wb') as file:
+                pickle.dump(index, file, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError as e:
+            logger.warning(f"Could not persist distance index to {cache_file}: {e}")
+    return index
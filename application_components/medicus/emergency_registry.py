@@ -0,0 +1,104 @@
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import AbstractSet, Dict, Optional
+
+
+class EmergencyStatus(Enum):
+    REPORTED = "ReportedStatus"
+    DISPATCHED = "DispatchedStatus"
+
+    def __str__(self):
+        return f"EmergencyStatus.{self.name}"
+
+
+@dataclass
+class ActiveEmergency:
+    patient_ssn: int
+    patient_edge: str
+    details: dict
+    status: EmergencyStatus = EmergencyStatus.REPORTED
+    responder_ssn: Optional[int] = None
+    detected_at: float = field(default_factory=time.monotonic)
+
+    def __str__(self):
+        return f"ActiveEmergency(patient_ssn={self.patient_ssn}, status={self.status}, responder_ssn={self.responder_ssn})"
+
+
+class EmergencyRegistry:
+    """
+    In-memory registry of the active emergency of every patient.
+
+    Replaces the global "does any emergency exist" ASK query: whether a patient already has an
+    emergency is an O(1) lookup, and emergencies of different patients are independent of each other.
+    The registry is mirrored to GraphDB (insert_emergency.rq) and can be rebuilt from it on startup.
+    It also tracks the assigned responders, so concurrent emergencies do not dispatch the same person.
+    The set of unavailable people is maintained as emergencies open, change responder and close.
+    """
+    def __init__(self):
+        self._emergencies: Dict[int, ActiveEmergency] = {}
+        # Number of active emergencies every unavailable ssn is a patient of or assigned to
+        self._unavailable: Counter = Counter()
+
+    def __contains__(self, patient_ssn) -> bool:
+        return int(patient_ssn) in self._emergencies
+
+    def __len__(self) -> int:
+        return len(self._emergencies)
+
+    def get(self, patient_ssn) -> Optional[ActiveEmergency]:
+        return self._emergencies.get(int(patient_ssn))
+
+    def open(self, patient_ssn, patient_edge: str, details: dict) -> ActiveEmergency:
+        self.close(patient_ssn)
+        emergency = ActiveEmergency(patient_ssn=int(patient_ssn), patient_edge=patient_edge, details=details)
+        self._emergencies[emergency.patient_ssn] = emergency
+        self._mark_unavailable(emergency.patient_ssn)
+        return emergency
+
+    def assign_responder(self, patient_ssn, responder_ssn: int):
+        emergency = self._emergencies[int(patient_ssn)]
+        self._release(emergency)
+        emergency.responder_ssn = int(responder_ssn)
+        emergency.status = EmergencyStatus.DISPATCHED
+        self._mark_unavailable(emergency.responder_ssn)
+
+    def release_responder(self, patient_ssn):
+        """Frees the assigned responder, e.g. after they declined."""
+        emergency = self.get(patient_ssn)
+        if emergency is not None:
+            self._release(emergency)
+            emergency.status = EmergencyStatus.REPORTED
+
+    def _release(self, emergency: ActiveEmergency):
+        if emergency.responder_ssn is not None:
+            self._mark_available(emergency.responder_ssn)
+            emergency.responder_ssn = None
+
+    def _mark_unavailable(self, ssn: int):
+        self._unavailable[str(ssn)] += 1
+
+    def _mark_available(self, ssn: int):
+        key = str(ssn)
+        self._unavailable[key] -= 1
+        if self._unavailable[key] <= 0:
+            del self._unavailable[key]
+
+    def unavailable_ssns(self) -> AbstractSet[str]:
+        """
+        Patients of active emergencies and the responders assigned to them, who cannot be dispatched.
+        A live view, it follows later changes of the registry.
+        """
+        return self._unavailable.keys()
+
+    def close(self, patient_ssn):
+        """Ends the emergency of a patient, the patient and their responder can be dispatched again."""
+        emergency = self._emergencies.pop(int(patient_ssn), None)
+        if emergency is not None:
+            self._release(emergency)
+            self._mark_available(emergency.patient_ssn)
+
+    def clear(self):
+        self._emergencies.clear()
+        self._unavailable.clear()
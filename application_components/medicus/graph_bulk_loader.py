@@ -0,0 +1,121 @@
+import logging
+import uuid
+from typing import Callable, Iterator, Optional
+
+from application_components.dataclasses import *
+from .rdf_terms import RDF_TYPE, csa_iri, string_literal, integer_literal, quad
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 5000  # graph elements (edges or people) per request
+NTRIPLES_CONTENT_TYPE = "application/n-triples"
+NQUADS_CONTENT_TYPE = "application/n-quads"
+
+
+class GraphBulkLoader:
+    """
+    Bulk loader for the street graph and the people received on Channel.INIT.
+
+    Serialises a GraphData into N-Triples (the same statements insert_graph_edge.rq and
+    insert_graph_person.rq used to write) and pushes them to GraphDB's statements endpoint:
+    -   Chunked mode: one request per `chunk_size` graph elements.
+    -   Streaming mode: a single request whose body is generated chunk by chunk while it is sent.
+    In both modes only one chunk is held in memory at a time.
+    All statements of an element are kept in the same chunk, so blank nodes never span requests.
+    With an `edge_graph` and `person_graph`, the street graph and the people are sent as N-Quads
+    into these named graphs instead of the default graph, still in one request per chunk.
+    """
+    def __init__(self, graphdb_client, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 progress_callback: Optional[Callable[[int, int], None]] = None,
+                 edge_graph: Optional[str] = None, person_graph: Optional[str] = None):
+        self.graphdb_client = graphdb_client
+        self.edge_graph = edge_graph
+        self.person_graph = person_graph
+        self.content_type = NTRIPLES_CONTENT_TYPE if edge_graph is None and person_graph is None \
+            else NQUADS_CONTENT_TYPE
+        self.chunk_size = chunk_size
+        self.progress_callback = progress_callback
+
+    @staticmethod
+    def edge_to_ntriples(edge: Edge, graph: Optional[str] = None) -> str:
+        subject = csa_iri(edge.id)
+        return (quad(subject, RDF_TYPE, csa_iri("StreetSegment"), graph)
+                + quad(subject, csa_iri("hasStreetName"), string_literal(f"Edge {edge.id}"), graph)
+                + quad(subject, csa_iri("hasLengthMeters"), integer_literal(edge.distance), graph)
+                + quad(subject, csa_iri("connectedTo"), csa_iri(edge.target), graph))
+
+    @staticmethod
+    def person_to_ntriples(person: Person, graph: Optional[str] = None) -> str:
+        person_id = uuid.uuid4().hex
+        subject = csa_iri(person_id)
+        certification = f"_:certification{person_id}"
+        return (quad(subject, RDF_TYPE, csa_iri("FirstResponder"), graph)
+                + quad(subject, csa_iri("hasSSN"), string_literal(person.ssn), graph)
+                + quad(subject, csa_iri("hasName"), string_literal(person.name), graph)
+                + quad(subject, csa_iri("locatedAt"), csa_iri(person.target), graph)
+                + quad(subject, csa_iri("holdsCertification"), certification, graph)
+                + quad(certification, RDF_TYPE, csa_iri("Certification"), graph)
+                + quad(certification, csa_iri("hasCertificationLevel"), csa_iri(person.certificationLevel.value), graph)
+                + quad(certification, csa_iri("certificationSpecialty"), csa_iri(person.speciality.value), graph))
+
+    def iter_chunks(self, graph: GraphData) -> Iterator[tuple]:
+        """Yields (N-Triples chunk, number of elements in the chunk) for the whole graph."""
+        lines = []
+        for element in self._iter_elements(graph):
+            lines.append(element)
+            if len(lines) >= self.chunk_size:
+                yield "".join(lines), len(lines)
+                lines = []
+        if lines:
+            yield "".join(lines), len(lines)
+
+    def _iter_elements(self, graph: GraphData) -> Iterator[str]:
+        for each_edge in graph.edges:
+            yield self.edge_to_ntriples(each_edge, self.edge_graph)
+        for each_person in graph.people:
+            yield self.person_to_ntriples(each_person, self.person_graph)
+
+    async def load(self, graph: GraphData, streaming: bool = False) -> bool:
+        """
+        Loads the whole graph into GraphDB.
+
+        Returns:
+            bool: True if every request was accepted by GraphDB.
+        """
+        total = len(graph.edges) + len(graph.people)
+        if streaming:
+            return await self._load_streaming(graph, total)
+        return await self._load_chunked(graph, total)
+
+    async def _load_chunked(self, graph: GraphData, total: int) -> bool:
+        loaded = 0
+        for chunk, size in self.iter_chunks(graph):
+            result, status_code = await self.graphdb_client.upload_statements(chunk.encode('utf-8'),
+                                                                              self.content_type)
+            if status_code != 200 and status_code != 204:
+                logger.error(f"Bulk loading graph chunk failed after {loaded}/{total} elements: {status_code} - {result}")
+                return False
+            loaded += size
+            self._report_progress(loaded, total)
+        return True
+
+    async def _load_streaming(self, graph: GraphData, total: int) -> bool:
+        loaded = 0
+
+        async def body():
+            nonlocal loaded
+            for chunk, size in self.iter_chunks(graph):
+                yield chunk.encode('utf-8')
+                loaded += size
+                self._report_progress(loaded, total)
+
+        result, status_code = await self.graphdb_client.upload_statements(body(), self.content_type)
+        if status_code != 200 and status_code != 204:
+            logger.error(f"Streaming graph load failed after {loaded}/{total} elements: {status_code} - {result}")
+            return False
+        return True
+
+    def _report_progress(self, loaded: int, total: int):
+        logger.info(f"Bulk loaded {loaded}/{total} graph elements")
+        if self.progress_callback:
+            self.progress_callback(loaded, total)
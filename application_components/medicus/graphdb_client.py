@@ -1,22 +1,74 @@
 import requests
 import json
 import logging
-from flask import jsonify
+import threading
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = (3.05, 30)  # (connect, read) in seconds
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.3
+# Gateway errors after which a query is retried
+RETRY_STATUS_CODES = (502, 503, 504)
+# A 502/504 from a proxy does not mean GraphDB did not apply an update, and updates are not idempotent
+# (blank nodes, UUID()), so they are only retried when GraphDB reports itself unavailable
+UPDATE_RETRY_STATUS_CODES = (503,)
+
+
 class GraphDBClient:
     """
-    Client for interacting with GraphDB.
+    Blocking client for interacting with GraphDB, for scripts and tools outside the event loop
+    (Medicus uses AsyncGraphDBClient, which shares these defaults).
     Encapsulates authentication and raw SPARQL query execution.
+
+    All requests go through one pooled keep-alive session, so consecutive queries reuse
+    the same TCP connections instead of opening a new one per request.
+    Connection failures and gateway errors (for updates only 503) are retried with exponential backoff
+    and an expired token (401) is refreshed once before the request is repeated.
     """
-    def __init__(self, base_url: str, repository_id: str, username: str = "admin", password: str = "root"):
+    def __init__(self, base_url: str, repository_id: str, username: str = "admin", password: str = "root",
+                 pool_size: int = DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT,
+                 max_retries: int = DEFAULT_MAX_RETRIES, backoff_factor: float = DEFAULT_BACKOFF_FACTOR):
         self.base_url = base_url
         self.repository_id = repository_id
         self.username = username
         self.password = password
+        self.timeout = timeout
+        self.session = self._create_session(pool_size, max_retries, backoff_factor)
+        # Updates go to the statements endpoint, which gets the adapter with the update retry policy
+        self.session.mount(f"{base_url}/repositories/{repository_id}/statements",
+                           self._create_adapter(pool_size, max_retries, backoff_factor, UPDATE_RETRY_STATUS_CODES))
+        self._token_lock = threading.Lock()
         self.token = self._request_auth_token()
 
+    @staticmethod
+    def _create_session(pool_size: int, max_retries: int, backoff_factor: float) -> requests.Session:
+        adapter = GraphDBClient._create_adapter(pool_size, max_retries, backoff_factor, RETRY_STATUS_CODES)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers["Connection"] = "keep-alive"
+        return session
+
+    @staticmethod
+    def _create_adapter(pool_size: int, max_retries: int, backoff_factor: float, status_codes) -> HTTPAdapter:
+        # Only retry when the request never reached GraphDB (connect errors) or GraphDB reported it
+        # as not processed (status_codes), never after a read error.
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=status_codes,
+            allowed_methods=frozenset({"POST"}),
+            raise_on_status=False
+        )
+        return HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
     def _request_auth_token(self):
         url = f"{self.base_url}/rest/login"
         headers = {
@@ -29,7 +81,7 @@ class GraphDBClient:
         }
 
         try:
-            response = requests.post(url, headers=headers, json=payload)
+            response = self.session.post(url, headers=headers, json=payload, timeout=self.timeout)
             response.raise_for_status()
 
             if response.status_code == 200:
@@ -46,6 +98,13 @@ class GraphDBClient:
             print(f"Error obtaining token: {e}")
             return ""
 
+    def _refresh_auth_token(self, expired_token: str):
+        """Requests a new token, unless another caller already replaced the expired one."""
+        with self._token_lock:
+            if self.token == expired_token:
+                logger.info("GraphDB token was rejected, re-authenticating")
+                self.token = self._request_auth_token()
+
     def insert_query(self, query: str):
         """Executes a SPARQL UPDATE (INSERT/DELETE) query."""
         content_type = "application/sparql-update"
@@ -56,10 +115,12 @@ class GraphDBClient:
         content_type = "application/sparql-query"
         return self._do_query(query, content_type)
 
+    def close(self):
+        self.session.close()
+
     def _do_query(self, query: str, content_type: str):
         headers = {
-            "Content-Type": content_type,
-            "Authorization": self.token
+            "Content-Type": content_type
         }
         path = ""
         if "sparql-query" in content_type:
@@ -70,11 +131,7 @@ class GraphDBClient:
             path = f"{self.base_url}/repositories/{self.repository_id}/statements"
 
         try:
-            response = requests.post(
-                path,
-                headers=headers,
-                data=query.encode('utf-8')
-            )
+            response = self._post_authorized(path, headers, query.encode('utf-8'))
 
             try:
                 # Handle empty responses (common for updates) vs JSON responses
@@ -89,3 +146,12 @@ class GraphDBClient:
         except Exception as e:
             logger.error(f"Connection to GraphDB failed: {e}")
             return {"error": str(e)}, 500
+
+    def _post_authorized(self, path: str, headers: dict, data: bytes) -> requests.Response:
+        token = self.token
+        response = self.session.post(path, headers=headers | {"Authorization": token}, data=data, timeout=self.timeout)
+        if response.status_code == 401:
+            self._refresh_auth_token(token)
+            response = self.session.post(path, headers=headers | {"Authorization": self.token}, data=data,
+                                         timeout=self.timeout)
+        return response
@@ -0,0 +1,135 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from rdflib import Graph, Namespace, RDF
+
+from application_components.dataclasses import *
+from .rdf_terms import CSA_NAMESPACE
+from .responder_index import CERTIFICATION_LEVEL_ORDER
+
+MEDICAL_ISSUE_DEFINITIONS_PATH = Path(__file__).resolve().parents[2] / "graphdb_input" / "rdf_ver3.ttl"
+
+CSA = Namespace(CSA_NAMESPACE)
+
+
+@dataclass(frozen=True)
+class TreatmentRule:
+    """One csa:TreatmentLevel of a csa:MedicalIssue with its required (measurement, value) pairs as bitmask."""
+    medical_issue: str
+    speciality: str
+    level: str
+    required_pairs: Tuple[Tuple[str, str], ...]
+    mask: int
+
+
+class MedicalIssueMatcher:
+    """
+    In-process equivalent of the `measurement_match` rule (rdf.pie) and query_medical_issue_to_person.rq.
+
+    A treatment level matches when every one of its required (measurement, value) pairs is among the
+    patient's categorised measurements. The definitions are read from rdf_ver3.ttl once: every distinct
+    required pair gets a bit, every treatment level the bitmask of its required pairs, so matching is
+    a few integer operations on the treatment levels sharing at least one pair with the patient.
+
+    If several treatment levels match, the one requiring the highest certification level wins,
+    then the one with more required pairs.
+    """
+    def __init__(self, rules: List[TreatmentRule], pair_bits: Dict[Tuple[str, str], int]):
+        self.rules = rules
+        self.pair_bits = pair_bits
+        self._rules_by_pair: Dict[Tuple[str, str], List[TreatmentRule]] = defaultdict(list)
+        for rule in rules:
+            for pair in rule.required_pairs:
+                self._rules_by_pair[pair].append(rule)
+
+    @classmethod
+    def from_turtle(cls, path: Path = MEDICAL_ISSUE_DEFINITIONS_PATH) -> "MedicalIssueMatcher":
+        graph = Graph()
+        graph.parse(str(path), format="turtle")
+        return cls.from_rdf_graph(graph)
+
+    @classmethod
+    def from_rdf_graph(cls, graph: Graph) -> "MedicalIssueMatcher":
+        pair_bits: Dict[Tuple[str, str], int] = {}
+        rules: List[TreatmentRule] = []
+        for medical_issue in sorted(graph.subjects(RDF.type, CSA.MedicalIssue)):
+            speciality = graph.value(medical_issue, CSA.medicalIssueSpecialty)
+            if speciality is None:
+                continue
+            for treatment_level in graph.objects(medical_issue, CSA.hasTreatmentLevel):
+                level = graph.value(treatment_level, CSA.requiresCertificationLevel)
+                if level is None:
+                    continue
+                required_pairs = []
+                for pair in graph.objects(treatment_level, CSA.hasMeasurementValuePair):
+                    measurement = graph.value(pair, CSA.hasMeasurement)
+                    value = graph.value(pair, CSA.hasValue)
+                    if measurement is not None and value is not None:
+                        required_pairs.append((_local_name(measurement), _local_name(value)))
+                # A treatment level without requirements would match every patient, GraphDB data never has one
+                if not required_pairs:
+                    continue
+
+                mask = 0
+                for pair in required_pairs:
+                    mask |= 1 << pair_bits.setdefault(pair, len(pair_bits))
+                rules.append(TreatmentRule(
+                    medical_issue=_local_name(medical_issue),
+                    speciality=_local_name(speciality),
+                    level=_local_name(level),
+                    required_pairs=tuple(sorted(set(required_pairs))),
+                    mask=mask
+                ))
+        return cls(rules, pair_bits)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def mask_of(self, pairs: Iterable[Tuple[str, str]]) -> int:
+        mask = 0
+        for pair in pairs:
+            bit = self.pair_bits.get(pair)
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+    def matching_rules(self, pairs: Iterable[Tuple[str, str]]) -> List[TreatmentRule]:
+        pairs = set(pairs)
+        patient_mask = self.mask_of(pairs)
+        matches = []
+        seen = set()
+        for pair in pairs:
+            for rule in self._rules_by_pair.get(pair, ()):
+                if id(rule) not in seen and rule.mask & patient_mask == rule.mask:
+                    seen.add(id(rule))
+                    matches.append(rule)
+        return matches
+
+    def match(self, measurements: Iterable[HealthMeasurementValuePair]) -> Optional[dict]:
+        """
+        Returns the emergency details of the best matching treatment level, in the format of
+        MedicusService._detect_medical_issue_in_graphdb, or None if the measurements match no medical issue.
+        """
+        matches = self.matching_rules((each.measurement_type.value, each.category.value) for each in measurements)
+        if not matches:
+            return None
+
+        best = max(matches, key=lambda rule: (_level_rank(rule.level), len(rule.required_pairs), rule.medical_issue))
+        measurement, value = best.required_pairs[0]
+        return {
+            "value": value,
+            "measurement": measurement,
+            "level": best.level,
+            "speciality": best.speciality,
+            "medical_issue": best.medical_issue
+        }
+
+
+def _local_name(term) -> str:
+    return str(term).split("#")[-1]
+
+
+def _level_rank(level: str) -> int:
+    return CERTIFICATION_LEVEL_ORDER.index(level) if level in CERTIFICATION_LEVEL_ORDER else -1
@@ -1,22 +1,53 @@
 import asyncio
-import uuid
-import json
-import requests
 import uvicorn
+from typing import Set
 from broadcaster import Broadcast
 from fastapi import FastAPI
-from flask import jsonify
-import os
 from pathlib import Path
 
 from .HealthMeasurementCategoriser import HealthMeasurementCategoriser
-from .graphdb_client import GraphDBClient
+from .async_graphdb_client import AsyncGraphDBClient
+from .update_batcher import UpdateBatcher, merge_sparql_updates
+from .graph_bulk_loader import GraphBulkLoader
+from .data_graphs import DataGraphs
+from .street_network import StreetNetwork
+from .distance_index import load_or_build_distance_index
+from .responder_index import ResponderIndex
+from .emergency_registry import EmergencyRegistry
+from .medical_issue_matcher import MedicalIssueMatcher
+from .sensor_stream_aggregator import SensorStreamAggregator
+from .sparql_templates import SparqlTemplate, SparqlTemplateRegistry, SparqlFragment
 from application_components.dataclasses import *
+from application_components.channel_queue import OverflowPolicy
+from application_components.worker_pool import ShardedWorkerPool
 import logging
 
 logger = logging.getLogger(__name__)
 current_file = Path(__file__).resolve()
 
+# Graphs with more elements than this are streamed to GraphDB in a single request
+STREAMING_GRAPH_LOAD_THRESHOLD = 100_000
+# Number of closest responders ranked per dispatch
+RESPONDER_SHORTLIST_SIZE = 3
+# Up to this many qualified responders city-wide are ranked by distance index lookups instead of a search
+SMALL_RESPONDER_POOL_SIZE = 256
+# Bounded queues in front of the health message handlers (split across the shards)
+HEALTH_MEASUREMENT_QUEUE_SIZE = 10_000
+HEALTH_MEASUREMENT_OVERFLOW_POLICY = OverflowPolicy.COALESCE
+# Health message workers, each handles the patients of one shard
+HEALTH_MEASUREMENT_SHARDS = 16
+# Longest time (seconds) stop() waits for queued health messages
+SHUTDOWN_DRAIN_TIMEOUT = 10
+# Base IRI of the named graphs holding everything Medicus writes (see DataGraphs),
+# resets drop these graphs instead of deleting the dynamic data pattern by pattern
+DATA_GRAPH = "https://omilab.org/experiments/city-swift-aid/graphs/simulation"
+
+MEASUREMENT_VALUE_PAIR_TEMPLATE = SparqlTemplate.compile("""[
+        a csa:MeasurementValuePair ;
+        csa:hasMeasurement csa:{measurement_type} ;
+        csa:hasValue csa:{category}
+    ]""", "measurement_value_pair")
+
 
 class MedicusService:
     """
@@ -35,19 +66,57 @@ class MedicusService:
         -   Calculate shortest paths (Pathfinding).
     5.  Dispatch: Select the best responder and send alerts.
     """
-    def __init__(self, broadcast: Broadcast, loop):
+    def __init__(self, broadcast: Broadcast, loop, graphdb_client: AsyncGraphDBClient = None,
+                 precompute_distances: bool = True, local_reasoning: bool = True,
+                 aggregate_sensor_streams: bool = True,
+                 health_measurement_policy: OverflowPolicy = HEALTH_MEASUREMENT_OVERFLOW_POLICY,
+                 health_measurement_queue_size: int = HEALTH_MEASUREMENT_QUEUE_SIZE,
+                 health_measurement_shards: int = HEALTH_MEASUREMENT_SHARDS, data_graph: str = DATA_GRAPH):
         self.broadcast = broadcast
         self.loop = loop
         self.app = FastAPI(title="Medicus API")
-        self.websocket_connections = []
-        self.setup_routes()
         self.setup_routes()
-        self.graphdb_client = GraphDBClient(
+        self.graphdb_client = graphdb_client or AsyncGraphDBClient(
             base_url="http://localhost:7200",
             repository_id="semtec"
         )
-        self.GRAPHDB_BASE_URL = self.graphdb_client.base_url # Keep for now if needed, or remove
-        self.REPOSITORY_ID = self.graphdb_client.repository_id # Keep for now if needed, or remove
+        # Every template of graphdb_queries/, read and compiled once
+        self.query_templates = SparqlTemplateRegistry.load(current_file.parent / "graphdb_queries")
+        self.data_graphs = DataGraphs(data_graph)
+        self.update_batcher = UpdateBatcher(self.graphdb_client)
+        self.graph_loader = GraphBulkLoader(self.graphdb_client, edge_graph=self.data_graphs.topology,
+                                            person_graph=self.data_graphs.people)
+        # Adjacency index of the street graph, built from the GraphData received on Channel.INIT
+        self.street_network: Optional[StreetNetwork] = None
+        # Optional precomputed distance tables of the street network, built in the background after INIT
+        self.precompute_distances = precompute_distances
+        self.distance_index = None
+        # Running precomputation of the distance index, cancelled when the street network is replaced
+        self._distance_index_task: Optional[asyncio.Task] = None
+        # Responders by street segment and (speciality, certification level), built on INIT
+        self.responder_index: Optional[ResponderIndex] = None
+        # Active emergency per patient, mirrored to GraphDB
+        self.emergency_registry = EmergencyRegistry()
+        # In-process evaluation of the measurement_match rule, None leaves emergency detection to GraphDB
+        self.medical_issue_matcher: Optional[MedicalIssueMatcher] = MedicalIssueMatcher.from_turtle() if local_reasoning else None
+        # Drops health messages whose categorised readings did not change, None reasons about every message
+        self.sensor_stream_aggregator: Optional[SensorStreamAggregator] = \
+            SensorStreamAggregator() if aggregate_sensor_streams else None
+        # Health messages are sharded by patient: patients are handled in parallel, the messages
+        # of one patient strictly in order. A full shard applies the overflow policy instead of growing,
+        # messages indicating an emergency are only discarded when a shard holds nothing else to discard.
+        self.health_message_pool = ShardedWorkerPool(
+            Channel.HEALTH_MEASUREMENT, self._handle_health_message,
+            shard_key=lambda message: message.patient_ssn, shard_count=health_measurement_shards,
+            queue_size=health_measurement_queue_size, policy=health_measurement_policy,
+            coalesce_key=lambda message: message.patient_ssn, on_discard=self._discard_health_message,
+            discardable=self._health_message_discardable
+        )
+        # Set once listen_to_events is subscribed to all channels, messages published earlier are not received
+        self.listening = asyncio.Event()
+        self._pending_subscriptions = 0
+        # Acknowledgements of dropped health messages still being published, referenced until they are sent
+        self._acknowledgement_tasks: Set[asyncio.Task] = set()
 
 
 
@@ -56,35 +125,69 @@ class MedicusService:
         async def root():
             return {"service": "Medicus", "status": "running"}
 
-    def _emergency_already_exists(self):
+        @self.app.get("/metrics/queues")
+        async def queue_metrics():
+            return [self.health_message_pool.metrics()]
+
+    async def _restore_emergency_registry(self):
         """
-        Checks the GraphDB knowledge base to see if an emergency is already currently recorded.
-        This prevents processing new health messages as emergencies if the system is already handling one.
-        
-        Returns:
-            bool: True if an emergency exists, False otherwise.
+        Rebuilds the in-memory emergency registry from the emergencies recorded in GraphDB,
+        so a restarted Medicus does not report ongoing emergencies a second time.
         """
-        query = self._load_query_template("graphdb_queries/query_if_emergency_exists.rq")
-        response, status_code = self.graphdb_client.ask_query(query)
-        emergency_already_exists = response['boolean']
-        return emergency_already_exists
-
-    def delete_patient_health_measurements(self, patient_ssn):
-        replacement = {
-            "ssn": str(patient_ssn)
-        }
-        query = self._load_query_template("graphdb_queries/delete_person_measurements.rq", replacement)
-        result, status_code = self.graphdb_client.insert_query(query)
+        query = self._load_query_template("graphdb_queries/query_active_emergencies.rq", {
+            "graph": self.data_graphs.emergencies, "people_graph": self.data_graphs.people
+        })
+        response, status_code = await self.graphdb_client.ask_query(query, priority=True)
+        if status_code != 200:
+            logging.error(f"Error querying active emergencies: {response}")
+            return
+
+        for binding in response['results']['bindings']:
+            try:
+                details = {
+                    "value": binding['value']['value'].split("#")[1],
+                    "measurement": binding['measurement']['value'].split("#")[1],
+                    "level": binding['level']['value'].split("#")[1],
+                    "speciality": binding['speciality']['value'].split("#")[1]
+                }
+                patient_edge = binding['location']['value'].split("#")[1] if 'location' in binding else None
+                self.emergency_registry.open(binding['ssn']['value'], patient_edge, details)
+            except (IndexError, KeyError, ValueError):
+                logging.error(f"Ignoring malformed emergency: {binding}")
+        logging.info(f"Restored {len(self.emergency_registry)} active emergencies from GraphDB")
+
+    async def delete_patient_health_measurements(self, patient_ssn):
+        query = self._drop_measurements_query(patient_ssn)
+        result, status_code = await self.graphdb_client.insert_query(query)
         if status_code == 200 or status_code == 204:
             logging.info(f"Successfully deleted health measurements of patient with ssn {patient_ssn}")
         else:
             logging.error(f"Error deleting health measurements: {status_code}, {result}")
 
-    def reset_database(self):
-        query = self._load_query_template("graphdb_queries/delete_dynamicly_generated_data.rq")
-        result, status_code = self.graphdb_client.insert_query(query)
+    def _drop_measurements_query(self, patient_ssn) -> str:
+        return self._load_query_template("graphdb_queries/drop_graph.rq",
+                                         {"graph": self.data_graphs.measurements(patient_ssn)})
+
+    async def reset_database(self):
+        """Drops the named graphs of this service (see DataGraphs), one DROP GRAPH per graph in a single update."""
+        query = self._load_query_template("graphdb_queries/query_named_graphs.rq")
+        response, status_code = await self.graphdb_client.ask_query(query)
+        if status_code != 200:
+            logging.error(f"Error listing the named graphs to reset: {status_code}, {response}")
+            return
+        graphs = [binding['graph']['value'] for binding in response['results']['bindings']]
+        drop_queries = [self._load_query_template("graphdb_queries/drop_graph.rq", {"graph": graph})
+                        for graph in graphs if graph in self.data_graphs]
+        if drop_queries:
+            result, status_code = await self.graphdb_client.insert_query(merge_sparql_updates(drop_queries))
+        else:
+            result, status_code = {}, 204
         if status_code == 200 or status_code == 204:
             logging.info("Successfully deleted all dynamically generated data")
+            self._cancel_distance_index_precompute()
+            self.emergency_registry.clear()
+            if self.sensor_stream_aggregator is not None:
+                self.sensor_stream_aggregator.reset()
         else:
             logging.error(f"Error deleting dynamically generated data: {status_code}, {result}")
 
@@ -120,32 +223,71 @@ class MedicusService:
         print("Starting Medicus service on port 8001")
         await server.serve()
 
+    async def stop(self, timeout: float = SHUTDOWN_DRAIN_TIMEOUT):
+        """Graceful shutdown: handles the already queued health messages, then closes the GraphDB connections."""
+        await self.health_message_pool.drain(timeout)
+        self._cancel_distance_index_precompute()
+        if self._acknowledgement_tasks:
+            await asyncio.wait(self._acknowledgement_tasks, timeout=timeout)
+        await self.graphdb_client.close()
+
     async def listen_to_events(self):
         """
         Event Listener Setup.
         Subscribes to relevant channels on the Message Bus to react to:
-        -   INIT: System startup and graph loading.
-        -   HEALTH_MEASUREMENT: Incoming sensor data from citizens.
+        -   INIT: System startup and graph loading, acknowledged on INIT_PROCESSED.
+        -   HEALTH_MEASUREMENT: Incoming sensor data from citizens, handled by the sharded health message pool.
+            Messages with a sequence number are acknowledged on HEALTH_MEASUREMENT_PROCESSED.
         -   HEALTH_RESPONDER_RESPONSE: Accept/Decline responses from dispatched responders.
+            Each channel has its own subscription, so responses are never queued behind measurements.
+        -   PERSON_MOVED: A person moved to another street segment.
         """
-        await asyncio.gather(
-            self._listen_channel(Channel.INIT, self._add_graph_to_vectordatabase),
+        await self._restore_emergency_registry()
+        listeners = [
+            self._listen_channel(Channel.INIT, self._handle_init),
             self._listen_channel(Channel.HEALTH_RESPONDER_RESPONSE, self._handle_first_responder_response),
-            self._listen_channel(Channel.HEALTH_MEASUREMENT, self._process_health_message)
-        )
+            self._listen_channel(Channel.PERSON_MOVED, self._handle_person_moved),
+            self._listen_channel(Channel.HEALTH_MEASUREMENT, self._handle_health_message,
+                                 pool=self.health_message_pool, admit=self._admit_health_message)
+        ]
+        self._pending_subscriptions = len(listeners)
+        await asyncio.gather(*listeners)
+
+    def _subscribed(self):
+        self._pending_subscriptions -= 1
+        if self._pending_subscriptions == 0:
+            self.listening.set()
+
+    async def _listen_channel(self, channel, handler, pool: ShardedWorkerPool = None, admit=None):
+        """
+        Feeds every event of a channel to its handler.
+        With a `pool`, events are submitted to its bounded shard queues and handled by its workers,
+        so a slow handler neither holds back the subscription nor lets events pile up without limit.
+        The subscription never waits for the pool: a waiting subscriber only moves the backlog into
+        broadcaster's unbounded per-subscriber queue. With OverflowPolicy.BLOCK the producers wait instead.
+        Events rejected by `admit` are dropped before they are queued.
+        """
+        if pool is None:
+            async with self.broadcast.subscribe(channel=channel) as subscriber:
+                self._subscribed()
+                async for event in subscriber:
+                    if asyncio.iscoroutinefunction(handler):
+                        await handler(event.message)
+                    else:
+                        handler(event.message)
+            return
 
-    async def _listen_channel(self, channel, handler):
+        pool.start()
         async with self.broadcast.subscribe(channel=channel) as subscriber:
+            self._subscribed()
             async for event in subscriber:
-                if asyncio.iscoroutinefunction(handler):
-                    await handler(event.message)
-                else:
-                    handler(event.message)
+                if admit is None or admit(event.message):
+                    pool.submit_nowait(event.message)
 
-    def get_current_medical_issue(self, patient_ssn):
+    async def get_current_medical_issue(self, patient_ssn):
         replacements = {"patient_ssn": str(patient_ssn)}
         query = self._load_query_template("graphdb_queries/query_active_emergency_details.rq", replacements)
-        response, status_code = self.graphdb_client.ask_query(query)
+        response, status_code = await self.graphdb_client.ask_query(query, priority=True)
         if status_code == 200 and response['results']['bindings']:
             binding = response['results']['bindings'][0]
             try:
@@ -157,10 +299,10 @@ class MedicusService:
                 return None
         return None
 
-    def _get_person_location(self, ssn):
+    async def _get_person_location(self, ssn):
         replacements = {"ssn": str(ssn)}
         query = self._load_query_template("graphdb_queries/query_person_location.rq", replacements)
-        response, status_code = self.graphdb_client.ask_query(query)
+        response, status_code = await self.graphdb_client.ask_query(query, priority=True)
         if status_code == 200 and response['results']['bindings']:
             try:
                 location_uri = response['results']['bindings'][0]['location']['value']
@@ -171,18 +313,25 @@ class MedicusService:
 
     async def _handle_first_responder_response(self, message: EmergencyHelpResponse):
         if message.help_accepted:
+            # The emergency is over once a responder accepted, it is closed right away
             patient_ssn = message.patient_ssn
             logger.info(f"Confirmed Selection of first responder with ssn {str(message.first_responder_ssn)}")
             await self.broadcast.publish(
                 Channel.EMERGENCY_OVER,
                 EmergencyOverMessage(patient_ssn=patient_ssn)
             )
+            await self._close_emergency(patient_ssn)
         else:
+            if self.responder_index is not None:
+                self.responder_index.remove(message.first_responder_ssn)
+            self.emergency_registry.release_responder(message.patient_ssn)
+
             replacements = {
-                "ssn": str(message.first_responder_ssn)
+                "ssn": str(message.first_responder_ssn),
+                "graph": self.data_graphs.emergencies
             }
             query = self._load_query_template("graphdb_queries/insert_responder_declined.rq", replacements)
-            result, status_code = self.graphdb_client.insert_query(query)
+            result, status_code = await self.graphdb_client.insert_query(query, priority=True)
             if status_code == 200 or status_code == 204:
                 logging.info(
                     f"Successfully inserted, that potential first responder with ssn {str(message.first_responder_ssn)}, declined")
@@ -190,15 +339,20 @@ class MedicusService:
                 logging.error(
                     f"Unsuccessfully tried inserting, that potential first responder with ssn {str(message.first_responder_ssn)}, declined ")
             
-            # Re-Dispatch Logic
+            # Re-Dispatch Logic, GraphDB is only asked if the emergency is not in the registry
             patient_ssn = message.patient_ssn
-            emergency_details = self.get_current_medical_issue(patient_ssn)
-            patient_edge = self._get_person_location(patient_ssn)
+            emergency = self.emergency_registry.get(patient_ssn)
+            if emergency is not None and emergency.patient_edge:
+                emergency_details = emergency.details
+                patient_edge = emergency.patient_edge
+            else:
+                emergency_details = await self.get_current_medical_issue(patient_ssn)
+                patient_edge = await self._get_person_location(patient_ssn)
 
             if emergency_details and patient_edge:
                 # We skip _record_emergency_in_graphdb because the emergency is already recorded.
                 
-                responder = self._find_best_responder_in_graphdb(
+                responder = await self._find_best_responder_in_graphdb(
                     patient_edge=patient_edge,
                     required_level=emergency_details['level'],
                     speciality=emergency_details['speciality'],
@@ -206,11 +360,7 @@ class MedicusService:
                 )
                 
                 if responder:
-                    await self.notify_closest_responder(
-                        patient_ssn=patient_ssn,
-                        first_responder_ssn=int(responder['person_ssn']),
-                        responder_can_decline=(emergency_details['level'] == "BasicLevel")
-                    )
+                    await self._dispatch_responder(patient_ssn, patient_edge, emergency_details, responder)
                 else:
                     logger.warning(f"No alternative responder found for patient {patient_ssn}")
             else:
@@ -218,66 +368,153 @@ class MedicusService:
 
 
 
-    async def _process_health_message(self, data: HealthMessage):
+    def _admit_health_message(self, data: HealthMessage) -> bool:
+        """Decided on arrival, so the sensor stream sees the messages of a patient in order."""
+        if self.sensor_stream_aggregator is not None and not self.sensor_stream_aggregator.should_forward(data):
+            logging.debug(f"Skipped health message without category change: {data}")
+            self._acknowledge_health_message_soon(data)
+            return False
+        return True
+
+    def _health_message_discardable(self, data: HealthMessage) -> bool:
+        """
+        Whether a full shard may replace or drop this message: only if its readings indicate no emergency.
+        Without the local matcher emergencies are detected by GraphDB, so every message counts as one to keep.
+        """
+        if self.medical_issue_matcher is None:
+            return False
+        replacements = HealthMeasurementCategoriser.process_measurements(data.measurements)
+        return not self.medical_issue_matcher.match(replacements)
+
+    def _discard_health_message(self, data: HealthMessage):
+        logging.debug(f"Health measurement queue overflow, discarded health message: {data}")
+        # The discarded message may have carried a category change, the next one must be reasoned about again
+        if self.sensor_stream_aggregator is not None:
+            self.sensor_stream_aggregator.forget(data.patient_ssn)
+        self._acknowledge_health_message_soon(data)
+
+    async def _handle_health_message(self, data: HealthMessage):
+        emergency_dispatched = False
+        try:
+            emergency_dispatched = await self._process_health_message(data)
+        except Exception:
+            logger.exception(f"Processing of health message failed: {data}")
+            if self.sensor_stream_aggregator is not None:
+                self.sensor_stream_aggregator.forget(data.patient_ssn)
+        await self._acknowledge_health_message(data, emergency_dispatched)
+
+    async def _acknowledge_health_message(self, data: HealthMessage, emergency_dispatched: bool = False):
+        """Tells senders waiting for it (headless simulation) that the message was handled."""
+        if data.sequence is None:
+            return
+        await self.broadcast.publish(
+            Channel.HEALTH_MEASUREMENT_PROCESSED,
+            HealthMessageProcessed(patient_ssn=data.patient_ssn, sequence=data.sequence,
+                                   emergency_dispatched=emergency_dispatched)
+        )
+
+    def _acknowledge_health_message_soon(self, data: HealthMessage):
+        """Acknowledgement for messages that are dropped without being handled."""
+        if data.sequence is not None:
+            task = asyncio.get_running_loop().create_task(self._acknowledge_health_message(data))
+            self._acknowledgement_tasks.add(task)
+            task.add_done_callback(self._acknowledgement_done)
+
+    def _acknowledgement_done(self, task: asyncio.Task):
+        self._acknowledgement_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Acknowledging a dropped health message failed", exc_info=task.exception())
+
+    async def _process_health_message(self, data: HealthMessage) -> bool:
         """
         Core Reasoning Pipeline: From Sensor Data to Action.
+        Returns whether a responder was dispatched.
         
         Steps:
-        1.  Check if an emergency already exists (to avoid duplicate processing).
-        2.  Categorize & Store: Convert raw sensor numbers to semantic categories and store in GraphDB.
-        3.  Infer Emergency: Query GraphDB for medical issues.
+        1.  Check if the patient already has an emergency (to avoid duplicate processing).
+            This is a lookup in the in-memory emergency registry, emergencies of other patients do not block.
+        2.  Categorize: Convert raw sensor numbers to semantic categories.
+        3.  Infer Emergency: Match the categories against the medical issue definitions in process.
+            Without local reasoning, replace the patient's stored measurements (one update request)
+            and query GraphDB for medical issues instead.
         4.  Action (If Emergency):
-            -   Record emergency in GraphDB.
+            -   Register the emergency, record it in GraphDB and clear the measurements.
             -   Find best responder (Certification & Distance).
             -   Dispatch (notify_closest_responder).
         """
-        if self._emergency_already_exists():
+        if data.patient_ssn in self.emergency_registry:
             logging.info(
-                f"Rejected processing health message, since an emergency already exists. Health message: {data}")
-            return
+                f"Rejected processing health message, since the patient already has an emergency. Health message: {data}")
+            return False
 
-        self._store_health_measurements_in_graphdb(data)
-        
-        emergency_details = self._detect_medical_issue_in_graphdb(data.patient_ssn)
+        replacements: List[HealthMeasurementValuePair] = HealthMeasurementCategoriser.process_measurements(
+            data.measurements)
+        logging.info(f"Health message: {data} was transformed into {replacements}")
+
+        if self.medical_issue_matcher is not None:
+            emergency_details = self.medical_issue_matcher.match(replacements)
+            logging.info(f"Person {data.patient_ssn} {'HAS' if emergency_details else 'has NOT'} an emergency.")
+        else:
+            await self._store_health_measurements_in_graphdb(data, replacements)
+            emergency_details = await self._detect_medical_issue_in_graphdb(data.patient_ssn)
         
         if emergency_details:
-            self._record_emergency_in_graphdb(data, emergency_details)
+            self.emergency_registry.open(data.patient_ssn, data.patient_edge, emergency_details)
+            await self.broadcast.publish(Channel.EMERGENCY_RAISED, EmergencyRaisedMessage(
+                patient_ssn=data.patient_ssn, patient_edge=data.patient_edge,
+                level=emergency_details['level'], speciality=emergency_details['speciality']
+            ))
+            await self._record_emergency_in_graphdb(data, emergency_details)
             
-            responder = self._find_best_responder_in_graphdb(
+            responder = await self._find_best_responder_in_graphdb(
                 patient_edge=data.patient_edge,
                 required_level=emergency_details['level'],
                 speciality=emergency_details['speciality'],
                 exclude_ssn=str(data.patient_ssn)
             )
             
-            await self.notify_closest_responder(
-                patient_ssn=data.patient_ssn,
-                first_responder_ssn=int(responder['person_ssn']),
-                responder_can_decline=(emergency_details['level'] == "BasicLevel")
-            )
-        else:
-            self.delete_patient_health_measurements(data.patient_ssn)
+            if responder:
+                await self._dispatch_responder(data.patient_ssn, data.patient_edge, emergency_details, responder)
+                return True
+        return False
+
+    async def _dispatch_responder(self, patient_ssn, patient_edge: str, emergency_details: dict, responder: dict):
+        """Assigns the responder to the patient's emergency and notifies them."""
+        self.emergency_registry.assign_responder(patient_ssn, int(responder['person_ssn']))
+        await self.notify_closest_responder(
+            patient_ssn=patient_ssn,
+            first_responder_ssn=int(responder['person_ssn']),
+            responder_can_decline=(emergency_details['level'] == "BasicLevel")
+        )
 
-    def _store_health_measurements_in_graphdb(self, data: HealthMessage):
+    async def _store_health_measurements_in_graphdb(self, data: HealthMessage,
+                                                    replacements: List[HealthMeasurementValuePair]):
         """
-        Categorizes raw continuous measurements and inserts them as discrete measurementsinto GraphDB.
-        """
-        replacements: List[HealthMeasurementValuePair] = HealthMeasurementCategoriser.process_measurements(
-            data.measurements)
-        logging.info(f"Health message: {data} was transformed into {replacements}")
+        Stores the categorized measurements of a health message as discrete measurements in GraphDB.
 
-        for each_entry in replacements:
-            input = each_entry.to_dict() | {"ssn": str(data.patient_ssn)}
-            query = self._load_query_template("graphdb_queries/insert_sensor_measurement.rq", input)
-            result, status_code = self.graphdb_client.insert_query(query)
-            if status_code == 200 or status_code == 204:
-                query_line = query.replace('\n', "")
-                logging.info(f"Health message: {input} was successfully inserted as query {query_line}")
-            else:
-                logging.error(
-                    f"Error inserting sensor measurement of person: {status_code} - {result}. Person ssn: {data.patient_ssn}. Measurement: {each_entry}")
+        The measurement graph of the patient is dropped and refilled with the new measurements within
+        one SPARQL update, so a message costs one request no matter how many sensors it carries.
+        The update batcher may merge that request with the updates of other patients.
+        """
+        queries = [self._drop_measurements_query(data.patient_ssn)]
+        if replacements:
+            value_pairs = SparqlFragment(" , ".join(
+                MEASUREMENT_VALUE_PAIR_TEMPLATE.bind(each_entry.to_dict()) for each_entry in replacements
+            ))
+            queries.append(self._load_query_template("graphdb_queries/insert_sensor_measurement.rq", {
+                "ssn": str(data.patient_ssn),
+                "measurement_value_pairs": value_pairs,
+                "graph": self.data_graphs.measurements(data.patient_ssn)
+            }))
+
+        result, status_code = await self.update_batcher.submit(merge_sparql_updates(queries))
+        if status_code == 200 or status_code == 204:
+            logging.info(f"Health message: {data} was successfully inserted with {len(replacements)} measurements")
+        else:
+            logging.error(
+                f"Error inserting sensor measurements of person: {status_code} - {result}. Person ssn: {data.patient_ssn}. Measurements: {replacements}")
 
-    def _detect_medical_issue_in_graphdb(self, patient_ssn: int):
+    async def _detect_medical_issue_in_graphdb(self, patient_ssn: int):
         """
         Detects if the patient has a medical issue based on stored measurements.
         
@@ -292,15 +529,14 @@ class MedicusService:
             "ssn": str(patient_ssn),
         }
         query = self._load_query_template("graphdb_queries/query_medical_issue_to_person.rq", replacements)
-        response, status_code = self.graphdb_client.ask_query(query)
-        is_emergency = len(response['results']['bindings']) >= 1
-
-        if status_code == 200:
-            logging.info(f"Person {patient_ssn} {'HAS' if is_emergency else 'has NOT'} an emergency.")
-        else:
-            logging.error(f"Error querying medical issue: {response}")
+        response, status_code = await self.graphdb_client.ask_query(query)
+        if status_code != 200:
+            logging.error(f"Error querying medical issue: {status_code}, {response}")
             return None
 
+        is_emergency = len(response['results']['bindings']) >= 1
+        logging.info(f"Person {patient_ssn} {'HAS' if is_emergency else 'has NOT'} an emergency.")
+
         if is_emergency:
             binding = response['results']['bindings'][0]
             return {
@@ -311,9 +547,9 @@ class MedicusService:
             }
         return None
 
-    def _record_emergency_in_graphdb(self, data: HealthMessage, details: dict):
+    async def _record_emergency_in_graphdb(self, data: HealthMessage, details: dict):
         """
-        Inserts the detected emergency into GraphDB and cleans up raw measurements.
+        Inserts the detected emergency into GraphDB and cleans up raw measurements (one update request).
         """
         replacements = {
             "patient_ssn": str(data.patient_ssn), 
@@ -322,42 +558,136 @@ class MedicusService:
             "level": details['level'], 
             "speciality": details['speciality']
         }
-        query = self._load_query_template("graphdb_queries/insert_emergency.rq", replacements)
-        result, status_code = self.graphdb_client.insert_query(query)
+        query = merge_sparql_updates([
+            self._load_query_template("graphdb_queries/insert_emergency.rq",
+                                      replacements | {"graph": self.data_graphs.emergencies}),
+            self._drop_measurements_query(data.patient_ssn)
+        ])
+        result, status_code = await self.graphdb_client.insert_query(query, priority=True)
         if status_code == 200 or status_code == 204:
             logging.info(f"Successfully inserted emergency: {replacements}")
         else:
             logging.error(f"Error inserting emergency {replacements} with result: {result}")
 
-        self.delete_patient_health_measurements(data.patient_ssn)
+    async def _close_emergency(self, patient_ssn):
+        """
+        Ends the emergency of a patient once it is over: the patient can have new emergencies, the responder
+        can be dispatched again, and a restarted Medicus does not restore it.
+        """
+        self.emergency_registry.close(patient_ssn)
+        query = self._load_query_template("graphdb_queries/delete_emergency.rq", {
+            "patient_ssn": str(patient_ssn), "graph": self.data_graphs.emergencies
+        })
+        result, status_code = await self.graphdb_client.insert_query(query, priority=True)
+        if status_code == 200 or status_code == 204:
+            logging.info(f"Successfully closed the emergency of patient {patient_ssn}")
+        else:
+            logging.error(f"Error closing the emergency of patient {patient_ssn}: {status_code}, {result}")
 
-    def _find_best_responder_in_graphdb(self, patient_edge: str, required_level: str, speciality: str, exclude_ssn: str):
+    async def _find_best_responder_in_graphdb(self, patient_edge: str, required_level: str, speciality: str, exclude_ssn: str):
         """
         Finds the closest qualified responder.
-        
+
+        If the street network and responder index are loaded, the search runs in memory
+        (see _find_closest_responders_in_index). Otherwise:
         1. Queries GraphDB for all responders with Certification >= Required Level in the Specialty.
-        2. Calculates the shortest path distance for each candidate.
+        2. Calculates the shortest path distance for each candidate, using one traversal of the
+           in-memory street network (or one GraphDB query per candidate if no network is loaded).
         3. Returns the candidate with the minimum distance.
+        Patients and responders of other active emergencies are never selected.
         """
+        if self.responder_index is not None and self.street_network is not None and patient_edge in self.street_network:
+            contestants = self._find_closest_responders_in_index(patient_edge, required_level, speciality, exclude_ssn)
+        else:
+            contestants = await self._find_closest_responders_in_graphdb(patient_edge, required_level, speciality,
+                                                                         exclude_ssn)
+
+        if not contestants:
+            # Fallback or error handling if no one is reachable/found
+            logging.warning(f"No reachable qualified responders found for patient {exclude_ssn}")
+            return None
+
+        contestants_sorted = sorted(contestants, key=lambda x: x['distance'])
+        return contestants_sorted[0]
+
+    def _find_closest_responders_in_index(self, patient_edge: str, required_level: str, speciality: str,
+                                          exclude_ssn: str) -> List[dict]:
+        """
+        Nearest-qualified-responder search on the in-memory responder index.
+        If only few qualified responders exist city-wide and the distance index is ready, they are ranked
+        by table lookups. Otherwise the search expands outward from the patient's edge until the closest
+        responders are found.
+        """
+        excluded = {str(exclude_ssn)} | self.emergency_registry.unavailable_ssns()
+        if (self.distance_index is not None and patient_edge in self.distance_index
+                and self.responder_index.count_qualified(speciality, required_level) <= SMALL_RESPONDER_POOL_SIZE):
+            candidates = [{"person_id": None, "street_id": segment, "person_ssn": ssn} for ssn, segment in
+                          self.responder_index.qualified_responders(speciality, required_level, excluded)]
+            return self._rank_contestants_in_street_network(patient_edge, candidates)
+
+        nearest = self.responder_index.nearest(self.street_network, patient_edge, speciality, required_level,
+                                               RESPONDER_SHORTLIST_SIZE, excluded)
+        logging.info(f"Closest qualified responders for patient {exclude_ssn}: {nearest}")
+        return [{"person_id": None, "person_ssn": ssn, "distance": distance} for ssn, _, distance in nearest]
+
+    async def _find_closest_responders_in_graphdb(self, patient_edge: str, required_level: str, speciality: str,
+                                                  exclude_ssn: str) -> List[dict]:
         replacements = {
             "level": required_level,
             "speciality": speciality,
             "ssn": str(exclude_ssn)
         }
         query = self._load_query_template("graphdb_queries/query_qualified_responders.rq", replacements)
-        response, status_code = self.graphdb_client.ask_query(query)
+        response, status_code = await self.graphdb_client.ask_query(query, priority=True)
         
         if status_code == 200:
             logging.info(f"Successfully found qualified responders: {response['results']['bindings']}")
         else:
             logging.error(f"Error query closest responder to patient {exclude_ssn} with result: {response}")
-            return None # Or handle error appropriately
+            return [] # Or handle error appropriately
 
-        contestants = []
+        unavailable = self.emergency_registry.unavailable_ssns()
+        candidates = []
         for each_entry in response['results']['bindings']:
-            person_id = each_entry['person']['value'].split("#")[1]
-            street_id = each_entry['street']['value'].split("#")[1]
-            person_ssn = each_entry['ssn']['value']
+            if each_entry['ssn']['value'] in unavailable:
+                continue
+            candidates.append({
+                "person_id": each_entry['person']['value'].split("#")[1],
+                "street_id": each_entry['street']['value'].split("#")[1],
+                "person_ssn": each_entry['ssn']['value']
+            })
+
+        if self.street_network is not None and patient_edge in self.street_network:
+            return self._rank_contestants_in_street_network(patient_edge, candidates)
+        return await self._rank_contestants_in_graphdb(patient_edge, candidates, exclude_ssn)
+
+    def _rank_contestants_in_street_network(self, patient_edge: str, candidates: List[dict]) -> List[dict]:
+        """
+        Computes the distance of the closest candidates.
+        Uses a table lookup plus top-k selection if the distance index is ready, otherwise a single
+        Dijkstra run from the patient's edge.
+        """
+        streets = {c['street_id'] for c in candidates}
+        if self.distance_index is not None and patient_edge in self.distance_index:
+            distances = dict(self.distance_index.rank(patient_edge, streets, RESPONDER_SHORTLIST_SIZE))
+        else:
+            distances = self.street_network.shortest_distances(patient_edge, streets)
+
+        contestants = []
+        for candidate in candidates:
+            if candidate['street_id'] in distances:
+                contestants.append({"person_id": candidate['person_id'], "person_ssn": candidate['person_ssn'],
+                                    "distance": distances[candidate['street_id']]})
+            else:
+                logging.debug(f"Responder (ssn {candidate['person_ssn']}) is not among the closest to edge {patient_edge}")
+        return contestants
+
+    async def _rank_contestants_in_graphdb(self, patient_edge: str, candidates: List[dict], exclude_ssn: str) -> List[dict]:
+        contestants = []
+        for candidate in candidates:
+            person_id = candidate['person_id']
+            street_id = candidate['street_id']
+            person_ssn = candidate['person_ssn']
 
             replacements = {
                 "edge_from": street_id,
@@ -367,7 +697,7 @@ class MedicusService:
             query = self._load_query_template(
                 "graphdb_queries/query_minum_distance_between_patient_and_prospect.rq",
                 replacements)
-            dist_response, dist_status_code = self.graphdb_client.ask_query(query)
+            dist_response, dist_status_code = await self.graphdb_client.ask_query(query, priority=True)
             
             if dist_status_code == 200:
                 logging.info(f"Successfully found minimal path between (ssn {exclude_ssn}) and (ssn {person_ssn})")
@@ -376,63 +706,94 @@ class MedicusService:
             else:
                 logging.error(
                     f"Error querying minum-distance between patient (ssn {exclude_ssn} and prospect (ssn {person_ssn}) with result: {dist_response}")
-
-        if not contestants:
-            # Fallback or error handling if no one is reachable/found
-            logging.warning(f"No reachable qualified responders found for patient {exclude_ssn}")
-            return None
-
-        contestants_sorted = sorted(contestants, key=lambda x: x['distance'])
-        return contestants_sorted[0]
-
-    def _add_graph_to_vectordatabase(self, graph: GraphData):
-
-        query = self._load_query_template("graphdb_queries/query_database_not_empty.rq")
-        response, status_code = self.graphdb_client.ask_query(query)
+        return contestants
+
+    async def _handle_init(self, graph: GraphData):
+        success = False
+        try:
+            success = await self._add_graph_to_vectordatabase(graph)
+        except Exception:
+            logger.exception("Loading the graph failed")
+        await self.broadcast.publish(Channel.INIT_PROCESSED, InitProcessedMessage(success=success))
+
+    async def _add_graph_to_vectordatabase(self, graph: GraphData) -> bool:
+        if self.sensor_stream_aggregator is not None:
+            self.sensor_stream_aggregator.reset()
+        self.street_network = StreetNetwork.from_graph(graph)
+        self.responder_index = ResponderIndex.from_graph(graph)
+        self._cancel_distance_index_precompute()
+        self.distance_index = None
+        if self.precompute_distances:
+            self._distance_index_task = asyncio.create_task(self._precompute_distance_index(self.street_network))
+            self._distance_index_task.add_done_callback(self._distance_index_precomputed)
+
+        query = self._load_query_template("graphdb_queries/query_database_not_empty.rq",
+                                          {"graph": self.data_graphs.topology})
+        response, status_code = await self.graphdb_client.ask_query(query)
+        if status_code != 200:
+            logging.error(f"Error checking whether the graph is already loaded: {status_code}, {response}")
+            return False
 
         elements_exist_in_database: bool = response['boolean']
 
         if elements_exist_in_database:
             logging.info(
                 f"Rejected adding graph to vectordatabase, since it already has elements. Rejected graph: {graph} ")
-            return
+            return True
         else:
-            for each_edge in graph.edges:
-                self._insert_graph_edge(each_edge)
-
-            for each_person in graph.people:
-                self._insert_graph_person(each_person)
+            streaming = len(graph.edges) + len(graph.people) > STREAMING_GRAPH_LOAD_THRESHOLD
+            if await self.graph_loader.load(graph, streaming=streaming):
+                logging.info(f"Succesfully inserted graph: {graph}")
+                return True
+            else:
+                logging.error(f"Failed to insert graph: {graph}")
+                return False
 
-    def _insert_graph_edge(self, each_edge: Edge):
+    def update_responder_location(self, ssn, segment: str):
+        """Keeps the responder index in sync when a responder moves to another street segment."""
+        if self.responder_index is not None:
+            self.responder_index.move(ssn, segment)
 
-        replacements = each_edge.to_dict()
-        query = self._load_query_template("graphdb_queries/insert_graph_edge.rq", replacements)
-        result, status_code = self.graphdb_client.insert_query(query)
+    async def _handle_person_moved(self, message: PersonMovedMessage):
+        self.update_responder_location(message.ssn, message.target)
+        replacements = {
+            "ssn": str(message.ssn),
+            "target": message.target,
+            "graph": self.data_graphs.people
+        }
+        query = self._load_query_template("graphdb_queries/update_person_location.rq", replacements)
+        result, status_code = await self.graphdb_client.insert_query(query)
         if status_code == 200 or status_code == 204:
-            logging.info(f"Succesfully inserted graph edge: {each_edge}")
+            logging.info(f"Moved person with ssn {message.ssn} to {message.target}")
         else:
-            logging.error(f"Failed to insert graph edge: {each_edge}")
+            logging.error(f"Error moving person with ssn {message.ssn} to {message.target}: {status_code}, {result}")
+
+    async def _precompute_distance_index(self, network: StreetNetwork):
+        """Builds (or loads the persisted) distance index off the event loop."""
+        try:
+            index = await asyncio.get_running_loop().run_in_executor(None, load_or_build_distance_index, network)
+        except Exception:
+            logger.exception("Precomputing the distance index failed, falling back to per-dispatch searches")
+            return
+        # A newer INIT may have replaced the network while the index was being built
+        if network is self.street_network:
+            self.distance_index = index
 
-    def delete_all_inserts(self):
-        return
+    def _distance_index_precomputed(self, task: asyncio.Task):
+        if task is self._distance_index_task:
+            self._distance_index_task = None
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Precomputing the distance index failed", exc_info=task.exception())
 
-    def _insert_graph_person(self, each_person: Person):
-        replacements = each_person.to_dict()
-        replacements["id"] = str(uuid.uuid4())
-        query = self._load_query_template("graphdb_queries/insert_graph_person.rq", replacements)
-        result, status_code = self.graphdb_client.insert_query(query)
-        if status_code == 200 or status_code == 204:
-            logging.info(f"Succesfully inserted graph person: {each_person}")
-        else:
-            logging.error(f"Failed to insert graph person: {each_person}")
+    def _cancel_distance_index_precompute(self):
+        """
+        Stops waiting for a running precomputation, so its index cannot replace the one of a newer street network.
+        The executor thread finishes in the background, its result is discarded.
+        """
+        if self._distance_index_task is not None:
+            self._distance_index_task.cancel()
+            self._distance_index_task = None
 
     def _load_query_template(self, template_path, replacements=None):
-        query_path = current_file.parent / template_path
-        with open(query_path, 'r') as file:
-            template = file.read()
-
-        if replacements:
-            for placeholder, value in replacements.items():
-                template = template.replace(f"{{{placeholder}}}", value)
-
-        return template
+        """Binds the replacements to the precompiled template, escaping every value for its position in the query."""
+        return self.query_templates.render(template_path, replacements)
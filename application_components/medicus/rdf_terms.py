@@ -0,0 +1,47 @@
+"""
+Helpers for writing RDF terms of the City Swift Aid vocabulary in N-Triples (and N-Quads) syntax.
+"""
+from typing import Optional
+
+CSA_NAMESPACE = "https://omilab.org/experiments/city-swift-aid#"
+RDF_TYPE = "<http://www.w3.org/1999/02/22-rdf-syntax-ns#type>"
+XSD_STRING = "<http://www.w3.org/2001/XMLSchema#string>"
+XSD_INTEGER = "<http://www.w3.org/2001/XMLSchema#integer>"
+
+_STRING_ESCAPES = str.maketrans({
+    "\\": "\\\\",
+    "\"": "\\\"",
+    "\n": "\\n",
+    "\r": "\\r",
+    "\t": "\\t",
+    "\b": "\\b",
+    "\f": "\\f",
+})
+
+
+def escape_string(value: str) -> str:
+    """Escapes a string for use inside a double-quoted N-Triples/Turtle/SPARQL literal."""
+    return value.translate(_STRING_ESCAPES)
+
+
+def csa_iri(local_name: str) -> str:
+    return f"<{CSA_NAMESPACE}{local_name}>"
+
+
+def string_literal(value) -> str:
+    return f"\"{escape_string(str(value))}\"^^{XSD_STRING}"
+
+
+def integer_literal(value) -> str:
+    return f"\"{int(value)}\"^^{XSD_INTEGER}"
+
+
+def triple(subject: str, predicate: str, obj: str) -> str:
+    return f"{subject} {predicate} {obj} .\n"
+
+
+def quad(subject: str, predicate: str, obj: str, graph: Optional[str]) -> str:
+    """N-Quads statement in the named graph `graph`, a plain N-Triples statement if graph is None."""
+    if graph is None:
+        return triple(subject, predicate, obj)
+    return f"{subject} {predicate} {obj} <{graph}> .\n"
@@ -0,0 +1,111 @@
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from application_components.dataclasses import *
+from .street_network import StreetNetwork
+
+# Certification levels in ascending order, a higher level also qualifies for every lower one
+# (mirrors rdfs:subClassOf between the levels in rdf_ver3.ttl)
+CERTIFICATION_LEVEL_ORDER = [level.value for level in
+                             (CertificationLevel.BASIC, CertificationLevel.INTERMEDIATE, CertificationLevel.ADVANCED)]
+
+
+class ResponderIndex:
+    """
+    In-memory spatial index of potential first responders by street segment.
+
+    For every segment it keeps the responders located there, grouped by
+    (speciality, certification level), e.g. ("TraumaSpeciality", "BasicLevel").
+    A nearest-qualified-responder search expands outward from the patient's segment over the
+    StreetNetwork and stops as soon as the k best responders are known, so its cost depends on the
+    neighbourhood searched and not on the size of the population.
+    The index is updated incrementally when a responder declines or moves.
+    """
+    def __init__(self):
+        self._by_segment: Dict[str, Dict[Tuple[str, str], Set[str]]] = defaultdict(lambda: defaultdict(set))
+        self._responders: Dict[str, Tuple[str, Tuple[str, str]]] = {}
+        self._counts: Counter = Counter()
+
+    @classmethod
+    def from_graph(cls, graph: GraphData) -> "ResponderIndex":
+        index = cls()
+        for each_person in graph.people:
+            index.add(each_person.ssn, each_person.target, each_person.speciality.value,
+                      each_person.certificationLevel.value)
+        return index
+
+    def __contains__(self, ssn) -> bool:
+        return str(ssn) in self._responders
+
+    def __len__(self) -> int:
+        return len(self._responders)
+
+    def add(self, ssn, segment: str, speciality: str, certification_level: str):
+        ssn = str(ssn)
+        self.remove(ssn)
+        key = (speciality, certification_level)
+        self._by_segment[segment][key].add(ssn)
+        self._responders[ssn] = (segment, key)
+        self._counts[key] += 1
+
+    def remove(self, ssn):
+        """Removes a responder, e.g. after they declined a request."""
+        entry = self._responders.pop(str(ssn), None)
+        if entry is None:
+            return
+        segment, key = entry
+        responders_by_key = self._by_segment[segment]
+        responders_by_key[key].discard(str(ssn))
+        if not responders_by_key[key]:
+            del responders_by_key[key]
+            if not responders_by_key:
+                del self._by_segment[segment]
+        self._counts[key] -= 1
+
+    def move(self, ssn, segment: str):
+        entry = self._responders.get(str(ssn))
+        if entry is not None:
+            _, (speciality, certification_level) = entry
+            self.add(ssn, segment, speciality, certification_level)
+
+    @staticmethod
+    def qualified_keys(speciality: str, required_level: str) -> List[Tuple[str, str]]:
+        if required_level not in CERTIFICATION_LEVEL_ORDER:
+            return []
+        return [(speciality, level) for level in
+                CERTIFICATION_LEVEL_ORDER[CERTIFICATION_LEVEL_ORDER.index(required_level):]]
+
+    def count_qualified(self, speciality: str, required_level: str) -> int:
+        return sum(self._counts[key] for key in self.qualified_keys(speciality, required_level))
+
+    def qualified_responders(self, speciality: str, required_level: str,
+                             exclude: Iterable = ()) -> List[Tuple[str, str]]:
+        """All qualified responders as (ssn, segment), for when only few of them exist city-wide."""
+        keys = set(self.qualified_keys(speciality, required_level))
+        excluded = {str(ssn) for ssn in exclude}
+        return [(ssn, segment) for ssn, (segment, key) in self._responders.items()
+                if key in keys and ssn not in excluded]
+
+    def nearest(self, network: StreetNetwork, source: str, speciality: str, required_level: str, k: int,
+                exclude: Iterable = ()) -> List[Tuple[str, str, int]]:
+        """
+        The k closest qualified responders as (ssn, segment, distance), closest first.
+        Responders at the same distance as the k-th one are included as well.
+        """
+        keys = self.qualified_keys(speciality, required_level)
+        excluded = {str(ssn) for ssn in exclude}
+        found: List[Tuple[str, str, int]] = []
+        if self.count_qualified(speciality, required_level) == 0:
+            return found
+
+        for segment, distance in network.iter_nearest(source):
+            if len(found) >= k and distance > found[k - 1][2]:
+                break
+            responders_by_key: Optional[dict] = self._by_segment.get(segment)
+            if not responders_by_key:
+                continue
+            for key in keys:
+                for ssn in sorted(responders_by_key.get(key, ())):
+                    if ssn not in excluded:
+                        found.append((ssn, segment, distance))
+        return found
@@ -0,0 +1,102 @@
+from collections import deque
+from typing import Deque, Dict, FrozenSet, Optional, Tuple
+
+from application_components.dataclasses import *
+from .HealthMeasurementCategoriser import HealthMeasurementCategoriser, CATEGORY_BINS
+
+# Number of recent readings kept per patient and sensor
+DEFAULT_WINDOW_SIZE = 8
+# Readings needed before a trend is estimated
+MIN_TREND_READINGS = 3
+# How many ticks ahead the trend is projected
+DEFAULT_TREND_HORIZON = 3
+
+CategorySignature = FrozenSet[Tuple[MeasurementType, MeasurementCategory]]
+
+
+class _PatientStream:
+    def __init__(self, window_size: int):
+        self.window_size = window_size
+        self.readings: Dict[MeasurementType, Deque[float]] = {}
+        self.forwarded_signature: Optional[CategorySignature] = None
+        self.trend_signature: Optional[CategorySignature] = None
+
+    def append(self, measurement_type: MeasurementType, value) -> Deque[float]:
+        readings = self.readings.get(measurement_type)
+        if readings is None:
+            readings = self.readings[measurement_type] = deque(maxlen=self.window_size)
+        readings.append(value)
+        return readings
+
+
+class SensorStreamAggregator:
+    """
+    Streaming stage in front of the reasoning pipeline.
+
+    Keeps a ring buffer of the recent readings of every patient and sensor and decides per HealthMessage
+    whether it has to be reasoned about. A message is forwarded when
+    -   the set of categorised readings differs from the last forwarded one (a category changed,
+        a sensor appeared or disappeared), or
+    -   the least-squares trend of a sensor's window, projected `trend_horizon` ticks ahead,
+        crosses into another category than the current reading (forwarded once per projected change).
+    A patient whose readings stay in the same categories is forwarded once and then costs a
+    few appends and lookups per message.
+    """
+    def __init__(self, window_size: int = DEFAULT_WINDOW_SIZE, trend_horizon: int = DEFAULT_TREND_HORIZON):
+        self.window_size = window_size
+        self.trend_horizon = trend_horizon
+        self._streams: Dict[int, _PatientStream] = {}
+        self.forwarded_count = 0
+        self.suppressed_count = 0
+
+    def should_forward(self, message: HealthMessage) -> bool:
+        stream = self._streams.get(message.patient_ssn)
+        if stream is None:
+            stream = self._streams[message.patient_ssn] = _PatientStream(self.window_size)
+
+        signature = set()
+        trend = set()
+        for measurement in message.measurements:
+            readings = stream.append(measurement.measurement_type, measurement.value)
+            category = HealthMeasurementCategoriser.categorise_value(measurement.measurement_type, measurement.value)
+            if category is None:
+                continue
+            signature.add((measurement.measurement_type, category))
+            projected_category = self._projected_category(measurement.measurement_type, readings)
+            if projected_category is not None and projected_category != category:
+                trend.add((measurement.measurement_type, projected_category))
+        signature = frozenset(signature)
+        trend = frozenset(trend)
+
+        forward = signature != stream.forwarded_signature or (bool(trend) and trend != stream.trend_signature)
+        stream.trend_signature = trend
+        if forward:
+            stream.forwarded_signature = signature
+            self.forwarded_count += 1
+        else:
+            self.suppressed_count += 1
+        return forward
+
+    def _projected_category(self, measurement_type: MeasurementType,
+                            readings: Deque[float]) -> Optional[MeasurementCategory]:
+        count = len(readings)
+        if count < MIN_TREND_READINGS or max(readings) == min(readings):
+            return None
+        # Least-squares slope over the positions 0..count-1
+        mean_x = (count - 1) / 2
+        mean_y = sum(readings) / count
+        numerator = sum((x - mean_x) * (y - mean_y) for x, y in enumerate(readings))
+        denominator = sum((x - mean_x) ** 2 for x in range(count))
+        slope = numerator / denominator
+        if slope == 0:
+            return None
+        bins = CATEGORY_BINS[measurement_type]
+        projected = min(max(readings[-1] + slope * self.trend_horizon, bins.lower_bounds[0]), bins.upper_limit)
+        return HealthMeasurementCategoriser.categorise_value(measurement_type, projected)
+
+    def forget(self, patient_ssn):
+        """Drops the state of a patient, so their next message is forwarded (e.g. after processing failed)."""
+        self._streams.pop(patient_ssn, None)
+
+    def reset(self):
+        self._streams.clear()
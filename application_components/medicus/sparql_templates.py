@@ -0,0 +1,128 @@
+import re
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .rdf_terms import escape_string
+
+PLACEHOLDER_PATTERN = re.compile(r"\{([A-Za-z_][A-Za-z0-9_]*)\}")
+LOCAL_NAME_PATTERN = re.compile(r"[A-Za-z0-9_](?:[A-Za-z0-9_.\-]*[A-Za-z0-9_\-])?")
+NUMBER_PATTERN = re.compile(r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+FORBIDDEN_IRI_CHARACTERS = set("<>\"{}|^`\\ ") | {chr(code) for code in range(0x21)}
+
+
+class SlotKind(Enum):
+    STRING = "String"         # inside a double-quoted literal: "{ssn}"
+    LOCAL_NAME = "LocalName"  # local part of a prefixed name: csa:{level}
+    IRI = "Iri"               # inside an IRI reference: <{iri}>
+    FRAGMENT = "Fragment"     # anywhere else: a SparqlFragment or a number
+
+    def __str__(self):
+        return f"SlotKind.{self.name}"
+
+
+class SparqlFragment(str):
+    """
+    Trusted piece of SPARQL (e.g. the result of binding another template), which is inserted as is.
+    Plain strings are never inserted into FRAGMENT slots, they have to be wrapped explicitly.
+    """
+
+
+@dataclass(frozen=True)
+class SparqlTemplate:
+    """
+    A parsed .rq template: the constant text between placeholders plus the name and kind of every slot.
+    Binding checks and escapes each value according to its slot and joins the pieces in one pass.
+    """
+    name: str
+    parts: Tuple[str, ...]
+    slots: Tuple[Tuple[str, SlotKind], ...]
+
+    @classmethod
+    def compile(cls, text: str, name: str = "<inline>") -> "SparqlTemplate":
+        parts: List[str] = []
+        slots: List[Tuple[str, SlotKind]] = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            parts.append(text[position:match.start()])
+            slots.append((match.group(1), cls._slot_kind(text, match.start(), match.end())))
+            position = match.end()
+        parts.append(text[position:])
+        return cls(name=name, parts=tuple(parts), slots=tuple(slots))
+
+    @staticmethod
+    def _slot_kind(text: str, start: int, end: int) -> SlotKind:
+        before, after = text[start - 1:start], text[end:end + 1]
+        if before == "\"" and after == "\"":
+            return SlotKind.STRING
+        if before == "<" and after == ">":
+            return SlotKind.IRI
+        if before == ":":
+            return SlotKind.LOCAL_NAME
+        return SlotKind.FRAGMENT
+
+    @property
+    def slot_names(self) -> set:
+        return {slot_name for slot_name, _ in self.slots}
+
+    def bind(self, bindings: Optional[Dict[str, object]] = None) -> SparqlFragment:
+        bindings = bindings or {}
+        pieces = [self.parts[0]]
+        for (slot_name, kind), part in zip(self.slots, self.parts[1:]):
+            if slot_name not in bindings:
+                raise KeyError(f"Template {self.name} has no value for placeholder {{{slot_name}}}")
+            pieces.append(self._render(slot_name, kind, bindings[slot_name]))
+            pieces.append(part)
+        return SparqlFragment("".join(pieces))
+
+    def _render(self, slot_name: str, kind: SlotKind, value) -> str:
+        if kind == SlotKind.STRING:
+            return escape_string(str(value))
+        if kind == SlotKind.LOCAL_NAME:
+            value = str(value)
+            if not LOCAL_NAME_PATTERN.fullmatch(value):
+                raise ValueError(f"Invalid local name for {{{slot_name}}} in template {self.name}: {value!r}")
+            return value
+        if kind == SlotKind.IRI:
+            value = str(value)
+            if any(character in FORBIDDEN_IRI_CHARACTERS for character in value):
+                raise ValueError(f"Invalid IRI for {{{slot_name}}} in template {self.name}: {value!r}")
+            return value
+        if isinstance(value, SparqlFragment):
+            return value
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and NUMBER_PATTERN.fullmatch(str(value)):
+            return str(value)
+        raise ValueError(f"Placeholder {{{slot_name}}} in template {self.name} needs a SparqlFragment or a number, "
+                         f"got {value!r}")
+
+
+class SparqlTemplateRegistry:
+    """
+    All .rq templates of a directory, read and compiled once.
+    Templates are addressed by their path relative to the parent of that directory,
+    e.g. "graphdb_queries/insert_emergency.rq", matching the paths used by MedicusService.
+    """
+    def __init__(self, templates: Dict[str, SparqlTemplate]):
+        self.templates = templates
+
+    @classmethod
+    def load(cls, directory: Path) -> "SparqlTemplateRegistry":
+        directory = Path(directory)
+        templates = {}
+        for query_path in sorted(directory.glob("*.rq")):
+            name = query_path.relative_to(directory.parent).as_posix()
+            templates[name] = SparqlTemplate.compile(query_path.read_text(encoding="utf-8"), name)
+        return cls(templates)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.templates
+
+    def get(self, name: str) -> SparqlTemplate:
+        try:
+            return self.templates[name]
+        except KeyError:
+            raise KeyError(f"Unknown query template {name}") from None
+
+    def render(self, name: str, bindings: Optional[Dict[str, object]] = None) -> SparqlFragment:
+        return self.get(name).bind(bindings)
@@ -0,0 +1,80 @@
+import heapq
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from application_components.dataclasses import *
+
+
+class StreetNetwork:
+    """
+    In-memory adjacency index of the street segments (Edge) received on Channel.INIT.
+
+    Street segments are the nodes of this graph and `connectedTo` links are traversable in
+    both directions. The distance between two segments follows the convention of
+    query_minum_distance_between_patient_and_prospect.rq: the summed length of the segments
+    passed in between (0 for the same or directly connected segments).
+    """
+    def __init__(self, edges: List[Edge]):
+        self.lengths: Dict[str, int] = {}
+        self.adjacency: Dict[str, set] = defaultdict(set)
+
+        for each_edge in edges:
+            self.lengths[each_edge.id] = each_edge.distance
+            self.lengths.setdefault(each_edge.target, 0)
+            if each_edge.id != each_edge.target:
+                self.adjacency[each_edge.id].add(each_edge.target)
+                self.adjacency[each_edge.target].add(each_edge.id)
+
+    @classmethod
+    def from_graph(cls, graph: GraphData) -> "StreetNetwork":
+        return cls(graph.edges)
+
+    def __contains__(self, segment: str) -> bool:
+        return segment in self.lengths
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def iter_nearest(self, source: str) -> Iterator[Tuple[str, int]]:
+        """
+        Single-source Dijkstra.
+        Yields (segment, distance) pairs in non-decreasing distance order, starting with the source itself.
+        """
+        if source not in self.lengths:
+            return
+
+        distances = {source: 0}
+        settled = set()
+        queue = [(0, source)]
+        while queue:
+            distance, segment = heapq.heappop(queue)
+            if segment in settled:
+                continue
+            settled.add(segment)
+            yield segment, distance
+
+            # Passing through a segment costs its length, leaving the source is free
+            step = 0 if segment == source else self.lengths[segment]
+            for neighbour in self.adjacency.get(segment, ()):
+                candidate = distance + step
+                if neighbour not in settled and candidate < distances.get(neighbour, float("inf")):
+                    distances[neighbour] = candidate
+                    heapq.heappush(queue, (candidate, neighbour))
+
+    def shortest_distances(self, source: str, targets: Iterable[str]) -> Dict[str, int]:
+        """
+        Distances from the source to every reachable target, computed in one traversal
+        that stops as soon as all targets are settled. Unreachable targets are left out.
+        """
+        remaining = set(targets)
+        distances = {}
+        if not remaining:
+            return distances
+
+        for segment, distance in self.iter_nearest(source):
+            if segment in remaining:
+                distances[segment] = distance
+                remaining.discard(segment)
+                if not remaining:
+                    break
+        return distances
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from typing import List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_WINDOW = 0.005  # seconds
+DEFAULT_MAX_BATCH_SIZE = 64
+
+
+def merge_sparql_updates(queries: List[str]) -> str:
+    """
+    Joins several SPARQL updates into one multi-operation update request.
+    SPARQL 1.1 allows every operation after a ';' to carry its own prologue,
+    so each query keeps its PREFIX declarations unchanged.
+    """
+    return " ;\n".join(query.strip() for query in queries)
+
+
+class UpdateBatcher:
+    """
+    Micro-batcher for SPARQL updates.
+
+    Updates submitted within `window` seconds of each other (e.g. the measurements of many
+    patients arriving at the same time) are merged into a single GraphDB request.
+    Every caller awaits the (result, status_code) of the request its update was part of.
+    If a merged request fails, its updates are re-sent one by one, so a single bad update
+    cannot fail the updates of other patients.
+    """
+    def __init__(self, graphdb_client, window: float = DEFAULT_BATCH_WINDOW,
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE):
+        self.graphdb_client = graphdb_client
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle = None
+        # Running flushes, referenced until they finish so the event loop cannot garbage-collect them
+        self._flush_tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, query: str):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((query, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._schedule_flush(delay=0)
+        elif self._flush_handle is None:
+            self._schedule_flush(delay=self.window)
+
+        return await future
+
+    def _schedule_flush(self, delay: float):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        self._flush_handle = asyncio.get_running_loop().call_later(
+            delay, self._start_flush
+        )
+
+    def _start_flush(self):
+        task = asyncio.get_running_loop().create_task(self._flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_done)
+
+    def _flush_done(self, task: asyncio.Task):
+        self._flush_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Flushing batched SPARQL updates failed", exc_info=task.exception())
+
+    async def _flush(self):
+        self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        # Callers must not wait forever for a batch that will never be sent
+        try:
+            await self._send(batch)
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as error:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            raise
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]]):
+        result, status_code = await self.graphdb_client.insert_query(merge_sparql_updates([q for q, _ in batch]))
+        if status_code in (200, 204) or len(batch) == 1:
+            logger.debug(f"Flushed {len(batch)} SPARQL updates in one request with status {status_code}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_result((result, status_code))
+            return
+
+        logger.warning(f"Batched update of {len(batch)} queries failed with {status_code}, retrying one by one")
+        for query, future in batch:
+            single_result = await self.graphdb_client.insert_query(query)
+            if not future.done():
+                future.set_result(single_result)
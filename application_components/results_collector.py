@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Dict, List, Optional
+
+from broadcaster import Broadcast
+
+from .dataclasses import *
+
+logger = logging.getLogger(__name__)
+
+
+class DispatchEvent(Enum):
+    SELECTED = "Selected"            # Medicus asked a responder to help
+    ACCEPTED = "Accepted"            # the responder accepted
+    DECLINED = "Declined"            # the responder declined
+    EMERGENCY_OVER = "EmergencyOver"  # Medicus confirmed the dispatch and closed the emergency
+
+    def __str__(self):
+        return f"DispatchEvent.{self.name}"
+
+
+@dataclass
+class DispatchRecord:
+    event: DispatchEvent
+    patient_ssn: int
+    responder_ssn: Optional[int]
+    timestamp: float  # time.monotonic()
+
+    def __str__(self):
+        return f"DispatchRecord(event={self.event}, patient_ssn={self.patient_ssn}, responder_ssn={self.responder_ssn})"
+
+
+@dataclass
+class EmergencyOutcome:
+    """Everything that happened to the emergency of one patient, in order."""
+    patient_ssn: int
+    records: List[DispatchRecord] = field(default_factory=list)
+
+    @property
+    def selected_responders(self) -> List[int]:
+        return [record.responder_ssn for record in self.records if record.event == DispatchEvent.SELECTED]
+
+    @property
+    def declined_responders(self) -> List[int]:
+        return [record.responder_ssn for record in self.records if record.event == DispatchEvent.DECLINED]
+
+    @property
+    def is_over(self) -> bool:
+        return any(record.event == DispatchEvent.EMERGENCY_OVER for record in self.records)
+
+    @property
+    def confirmed_responder_ssn(self) -> Optional[int]:
+        """The responder whose acceptance ended the emergency, None while it is not over."""
+        if not self.is_over:
+            return None
+        accepted = [record.responder_ssn for record in self.records if record.event == DispatchEvent.ACCEPTED]
+        return accepted[-1] if accepted else None
+
+
+@dataclass
+class ScenarioVerdict:
+    scenario_name: str
+    passed: bool
+    skipped: bool
+    message: str
+
+    def __str__(self):
+        status = "SKIPPED" if self.skipped else ("PASSED" if self.passed else "FAILED")
+        return f"TEST {status}: {self.scenario_name}: {self.message}"
+
+
+class ResultsCollector:
+    """
+    Records the dispatch outcomes of a run from the message bus.
+
+    Subscribes to HEALTH_RESPONDER_SELECTED_MESSAGE, HEALTH_RESPONDER_RESPONSE and EMERGENCY_OVER and keeps
+    a timestamped DispatchRecord per message, so scenarios are verified against what happened on the bus
+    instead of against log output. Every bus (and therefore every scenario run in parallel) gets its own collector.
+    """
+    def __init__(self, broadcast: Broadcast):
+        self.broadcast = broadcast
+        self.records: List[DispatchRecord] = []
+        self._listeners: List[asyncio.Task] = []
+        self._changed = asyncio.Event()
+
+    async def start(self):
+        """Subscribes to the channels and returns once all subscriptions are open."""
+        handlers = {
+            Channel.HEALTH_RESPONDER_SELECTED_MESSAGE: self._handle_responder_selected,
+            Channel.HEALTH_RESPONDER_RESPONSE: self._handle_responder_response,
+            Channel.EMERGENCY_OVER: self._handle_emergency_over,
+        }
+        subscribed = [asyncio.Event() for _ in handlers]
+        self._listeners = [asyncio.create_task(self._listen_channel(channel, handler, ready))
+                           for (channel, handler), ready in zip(handlers.items(), subscribed)]
+        await asyncio.gather(*(ready.wait() for ready in subscribed))
+
+    async def stop(self):
+        for listener in self._listeners:
+            listener.cancel()
+        await asyncio.gather(*self._listeners, return_exceptions=True)
+        self._listeners = []
+
+    def reset(self):
+        self.records = []
+
+    async def _listen_channel(self, channel, handler, ready: asyncio.Event):
+        async with self.broadcast.subscribe(channel=channel) as subscriber:
+            ready.set()
+            async for event in subscriber:
+                handler(event.message)
+
+    def _record(self, event: DispatchEvent, patient_ssn: int, responder_ssn: Optional[int]):
+        self.records.append(DispatchRecord(event=event, patient_ssn=patient_ssn, responder_ssn=responder_ssn,
+                                           timestamp=time.monotonic()))
+        self._changed.set()
+
+    def _handle_responder_selected(self, message: HealthResponderSelectedMessage):
+        self._record(DispatchEvent.SELECTED, message.patient_ssn, message.responder_ssn)
+
+    def _handle_responder_response(self, message: EmergencyHelpResponse):
+        event = DispatchEvent.ACCEPTED if message.help_accepted else DispatchEvent.DECLINED
+        self._record(event, message.patient_ssn, message.first_responder_ssn)
+
+    def _handle_emergency_over(self, message: EmergencyOverMessage):
+        self._record(DispatchEvent.EMERGENCY_OVER, message.patient_ssn, None)
+
+    def outcomes(self) -> Dict[int, EmergencyOutcome]:
+        outcomes: Dict[int, EmergencyOutcome] = {}
+        for record in self.records:
+            outcome = outcomes.get(record.patient_ssn)
+            if outcome is None:
+                outcome = outcomes[record.patient_ssn] = EmergencyOutcome(patient_ssn=record.patient_ssn)
+            outcome.records.append(record)
+        return outcomes
+
+    def confirmed_responders(self) -> List[int]:
+        return [outcome.confirmed_responder_ssn for outcome in self.outcomes().values()
+                if outcome.confirmed_responder_ssn is not None]
+
+    async def wait_for_confirmation(self, timeout: float) -> bool:
+        """Waits until some emergency is over. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        while not any(record.event == DispatchEvent.EMERGENCY_OVER for record in self.records):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    def verify(self, scenario: Scenario) -> ScenarioVerdict:
+        """Checks that the expected responder (goal_ssn_to_select) was confirmed for an emergency."""
+        if scenario.goal_ssn_to_select == -1:
+            return ScenarioVerdict(scenario.name, passed=True, skipped=True,
+                                   message="No goal SSN defined for this scenario")
+        confirmed = self.confirmed_responders()
+        if scenario.goal_ssn_to_select in confirmed:
+            return ScenarioVerdict(scenario.name, passed=True, skipped=False,
+                                   message=f"Confirmed selection of first responder with ssn "
+                                           f"{scenario.goal_ssn_to_select}")
+        return ScenarioVerdict(scenario.name, passed=False, skipped=False,
+                               message=f"Expected confirmed first responder {scenario.goal_ssn_to_select}, "
+                                       f"confirmed: {confirmed or 'none'}")
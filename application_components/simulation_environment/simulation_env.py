@@ -2,6 +2,8 @@ from application_components.dataclasses import *
 from broadcaster import Broadcast
 import simpy
 import asyncio
+import concurrent.futures
+import itertools
 import threading
 from threading import Lock
 import logging
@@ -9,6 +11,12 @@ import simpy.rt
 logger = logging.getLogger(__name__)
 
 REAL_TIME_FACTOR = 0.1
+# Simulation time between the sensor readings of two people
+SIMULATION_STEP = 20
+# Longest time (seconds) a sensor reading waits for room in Medicus' health measurement queue
+BACKPRESSURE_TIMEOUT = 30
+# Longest time (seconds) the headless simulation waits for an acknowledgement of Medicus
+HEADLESS_ACK_TIMEOUT = 10
 
 class Simpy:
     """
@@ -19,19 +27,39 @@ class Simpy:
     1.  Events: Emergencies occurring (sensor data generation).
     2.  Citizens: Their location, health status, and decisions (e.g., accepting/declining help).
     3.  Time: Managing the flow of time in the simulation.
+
+    By default time runs in real time (scaled by REAL_TIME_FACTOR). In headless mode the simulation runs in
+    virtual time on a plain simpy.Environment: instead of sleeping, every step waits until Medicus has
+    acknowledged the published message (and, if it dispatched a responder, until the emergency is over),
+    so scenarios run as fast as the pipeline can absorb them.
     """
-    def __init__(self, broadcast: Broadcast, loop):
+    def __init__(self, broadcast: Broadcast, loop, headless: bool = False):
         self.broadcast = broadcast
         self.loop = loop
-        self.env = simpy.rt.RealtimeEnvironment(factor=REAL_TIME_FACTOR, strict=
-                                                False)
+        self.headless = headless
+        self.env = self._new_environment()
         self.simulation_stopped_event = self.env.event()
         self._simulation_lock = Lock()
         self.simulation_thread = None
         self.graph_data: GraphData = None
+        # Bumped whenever graph_data changes, lets readers (e.g. the GUI) cache what they derive from it
+        self.graph_version = 0
         self.simulation_config: Simulation = None
         self.number_of_people = 0
+        # Optional consumer queue (e.g. Medicus' ShardedWorkerPool), sensor readings wait while it is full
+        # (OverflowPolicy.BLOCK)
+        self.health_measurement_backpressure = None
+        # Headless mode: acknowledgements awaited per health message sequence number
+        self._message_sequence = itertools.count()
+        self._pending_acknowledgements: Dict[int, asyncio.Future] = {}
+        self._init_processed: Optional[asyncio.Future] = None
+        # Headless mode: set per patient ssn when their emergency is over
+        self._emergencies_over: Dict[int, asyncio.Event] = {}
 
+    def _new_environment(self) -> simpy.Environment:
+        if self.headless:
+            return simpy.Environment()
+        return simpy.rt.RealtimeEnvironment(factor=REAL_TIME_FACTOR, strict=False)
 
     async def start(self):
         """
@@ -44,7 +72,9 @@ class Simpy:
     async def listen_to_bus_messages(self):
         await asyncio.gather(
             self._listen_channel(Channel.HEALTH_RESPONDER_SELECTED_MESSAGE, self._handle_health_responder_selected),
-            self._listen_channel(Channel.EMERGENCY_OVER, self._handle_emergency_over)
+            self._listen_channel(Channel.EMERGENCY_OVER, self._handle_emergency_over),
+            self._listen_channel(Channel.HEALTH_MEASUREMENT_PROCESSED, self._handle_health_message_processed),
+            self._listen_channel(Channel.INIT_PROCESSED, self._handle_init_processed)
         )
 
     async def _listen_channel(self, channel, handler):
@@ -82,9 +112,24 @@ class Simpy:
         
     def _handle_emergency_over(self, message: EmergencyOverMessage):
         self.stop()
+        self._emergency_over(message.patient_ssn).set()
+
+    def _emergency_over(self, patient_ssn) -> asyncio.Event:
+        return self._emergencies_over.setdefault(int(patient_ssn), asyncio.Event())
+
+    def _handle_health_message_processed(self, message: HealthMessageProcessed):
+        acknowledgement = self._pending_acknowledgements.get(message.sequence)
+        if acknowledgement is not None and not acknowledgement.done():
+            acknowledgement.set_result(message)
+
+    def _handle_init_processed(self, message: InitProcessedMessage):
+        if self._init_processed is not None and not self._init_processed.done():
+            self._init_processed.set_result(message)
 
 
     def run_simulation(self):
+        if self.headless:
+            asyncio.run_coroutine_threadsafe(self._publish_init_and_wait(), self.loop).result()
         self.env.process(self.simulation_loop())
 
         try:
@@ -95,10 +140,11 @@ class Simpy:
     def monitor_simulation_state(self):
         """
         Monitors the simulation time and enforces a timeout.
-        The timeout is calculated based on the number of people, configured iterations, and a safety factor.
+        The timeout is the simulation time of all configured iterations (one SIMULATION_STEP per person),
+        times a safety factor, so it means the same in real time and in headless virtual time.
         If the simulation exceeds this time, it is forcibly stopped to prevent infinite loops.
         """
-        yield self.env.timeout(1/REAL_TIME_FACTOR * self.number_of_people * self.simulation_config.number_data_iterations * self.simulation_config.timeout_factor)
+        yield self.env.timeout(SIMULATION_STEP * self.number_of_people * self.simulation_config.number_data_iterations * self.simulation_config.timeout_factor)
         logging.warning(f"Stopping Simpy due to time timeout!")
         self.simulation_stopped_event.succeed()
 
@@ -107,13 +153,15 @@ class Simpy:
         """
         Triggers the start of the simulation.
         1. Publishes the initial graph state to the message bus (Channel.INIT).
+           In headless mode the simulation thread does this and waits until Medicus has loaded the graph.
         2. Starts the timeout monitor process.
         3. Spawns the main simulation loop in a separate thread.
         """
-        asyncio.run_coroutine_threadsafe(
-            self.broadcast.publish(channel=Channel.INIT, message=self.graph_data),
-            self.loop
-        )
+        if not self.headless:
+            asyncio.run_coroutine_threadsafe(
+                self.broadcast.publish(channel=Channel.INIT, message=self.graph_data),
+                self.loop
+            )
         self.env.process(self.monitor_simulation_state())
 
         self.simulation_thread = threading.Thread(target=self.run_simulation)
@@ -141,7 +189,7 @@ class Simpy:
             logger.info(f"Simpy simulation round: {str(iteration_round)}")
 
             for eachPerson in self.graph_data.people:
-                yield self.env.timeout(20)
+                yield self.env.timeout(SIMULATION_STEP)
                 self.send_health_message(eachPerson, iteration_round)
 
             iteration_round += 1
@@ -163,11 +211,70 @@ class Simpy:
                 measurements=measurements
         )
 
+        if self.headless:
+            message.sequence = next(self._message_sequence)
+            asyncio.run_coroutine_threadsafe(self._publish_and_wait_for_acknowledgement(message), self.loop).result()
+            return
+
+        if self.health_measurement_backpressure is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(
+                    self.health_measurement_backpressure.wait_for_capacity(message), self.loop
+                ).result(timeout=BACKPRESSURE_TIMEOUT)
+            except concurrent.futures.TimeoutError:
+                logger.warning(f"Health measurement queue still full after {BACKPRESSURE_TIMEOUT}s, publishing anyway")
+
         asyncio.run_coroutine_threadsafe(
             self.broadcast.publish(channel=Channel.HEALTH_MEASUREMENT, message=message),
             self.loop
         )
 
+    def move_person(self, ssn: int, target: str):
+        """
+        Moves a person to another street segment and publishes a PERSON_MOVED message,
+        so Medicus and the GUI follow the new location.
+        """
+        person = self.graph_data.get_person_by_ssn(ssn)
+        if person is None:
+            logger.warning(f"Cannot move unknown person with ssn {ssn}")
+            return
+        person.target = target
+        self.graph_version += 1
+        asyncio.run_coroutine_threadsafe(
+            self.broadcast.publish(channel=Channel.PERSON_MOVED, message=PersonMovedMessage(ssn=ssn, target=target)),
+            self.loop
+        )
+
+    async def _publish_init_and_wait(self):
+        self._init_processed = self.loop.create_future()
+        try:
+            await self.broadcast.publish(channel=Channel.INIT, message=self.graph_data)
+            result: InitProcessedMessage = await asyncio.wait_for(self._init_processed, HEADLESS_ACK_TIMEOUT)
+            if not result.success:
+                logger.error("Medicus failed to load the graph of the scenario")
+        except asyncio.TimeoutError:
+            logger.warning(f"No acknowledgement for the scenario graph within {HEADLESS_ACK_TIMEOUT}s, starting anyway")
+        finally:
+            self._init_processed = None
+
+    async def _publish_and_wait_for_acknowledgement(self, message: HealthMessage):
+        """
+        Publishes a health message and waits until Medicus has handled it.
+        If Medicus dispatched a responder, also waits until the emergency of this patient is over.
+        """
+        acknowledgement = self.loop.create_future()
+        self._pending_acknowledgements[message.sequence] = acknowledgement
+        try:
+            await self.broadcast.publish(channel=Channel.HEALTH_MEASUREMENT, message=message)
+            result: HealthMessageProcessed = await asyncio.wait_for(acknowledgement, HEADLESS_ACK_TIMEOUT)
+            if result.emergency_dispatched:
+                await asyncio.wait_for(self._emergency_over(message.patient_ssn).wait(), HEADLESS_ACK_TIMEOUT)
+                self._emergencies_over.pop(int(message.patient_ssn), None)
+        except asyncio.TimeoutError:
+            logger.warning(f"No acknowledgement for health message {message.sequence} within {HEADLESS_ACK_TIMEOUT}s")
+        finally:
+            self._pending_acknowledgements.pop(message.sequence, None)
+
     def load_scenario(self, graph_data: GraphData, simulation_config: Simulation):
         """
         Loads a specific scenario into the simulation environment.
@@ -177,11 +284,13 @@ class Simpy:
             simulation_config (Simulation): Configuration parameters for simulation runtime/timeout.
         """
         self.graph_data = graph_data
+        self.graph_version += 1
         self.simulation_config = simulation_config
         self.number_of_people = len(self.graph_data.people)
         
         # Re-initialize environment
-        self.env = simpy.rt.RealtimeEnvironment(factor=REAL_TIME_FACTOR, strict=False)
+        self.env = self._new_environment()
         self.simulation_stopped_event = self.env.event()
+        self._emergencies_over.clear()
 
 
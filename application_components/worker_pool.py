@@ -0,0 +1,110 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Hashable, List, Optional
+
+from .channel_queue import ChannelQueue, OverflowPolicy
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARD_COUNT = 16
+
+
+class ShardedWorkerPool:
+    """
+    Pool of asyncio worker tasks with messages sharded by key (e.g. patient_ssn).
+
+    Every shard has its own bounded ChannelQueue and exactly one worker, and all messages with the same key
+    land in the same shard. Messages of one key are therefore handled strictly in order, one at a time,
+    while different keys are handled in parallel by up to `shard_count` workers.
+    `drain()` stops accepting messages, lets the workers finish everything already queued and stops them.
+    """
+    def __init__(self, name: str, handler: Callable[[Any], Awaitable], shard_key: Callable[[Any], Hashable],
+                 shard_count: int = DEFAULT_SHARD_COUNT, queue_size: int = 10_000,
+                 policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+                 coalesce_key: Callable[[Any], Hashable] = None, on_discard: Callable[[Any], None] = None,
+                 discardable: Callable[[Any], bool] = None):
+        if shard_count < 1:
+            raise ValueError(f"shard_count must be at least 1. Got: {shard_count}")
+        self.name = name
+        self.handler = handler
+        self.shard_key = shard_key
+        shard_queue_size = max(1, queue_size // shard_count)
+        self.queues: List[ChannelQueue] = [
+            ChannelQueue(f"{name}[{shard}]", shard_queue_size, policy, coalesce_key=coalesce_key,
+                         on_discard=on_discard, discardable=discardable)
+            for shard in range(shard_count)
+        ]
+        self._workers: List[asyncio.Task] = []
+        self.accepting = True
+
+    @property
+    def shard_count(self) -> int:
+        return len(self.queues)
+
+    def shard_of(self, item) -> int:
+        return hash(self.shard_key(item)) % len(self.queues)
+
+    def start(self):
+        if not self._workers:
+            self.accepting = True
+            self._workers = [asyncio.create_task(self._run_worker(queue)) for queue in self.queues]
+
+    async def submit(self, item) -> bool:
+        """Queues a message in its shard. Returns False if the pool is draining."""
+        if not self.accepting:
+            logger.warning(f"Worker pool {self.name} is draining, rejected message: {item}")
+            return False
+        await self.queues[self.shard_of(item)].put(item)
+        return True
+
+    def submit_nowait(self, item) -> bool:
+        """Queues a message in its shard without waiting (see ChannelQueue.put_nowait)."""
+        if not self.accepting:
+            logger.warning(f"Worker pool {self.name} is draining, rejected message: {item}")
+            return False
+        self.queues[self.shard_of(item)].put_nowait(item)
+        return True
+
+    async def wait_for_capacity(self, item):
+        """Lets a producer wait until the shard of the message has room (only blocks with OverflowPolicy.BLOCK)."""
+        await self.queues[self.shard_of(item)].wait_for_capacity()
+
+    async def _run_worker(self, queue: ChannelQueue):
+        while True:
+            item = await queue.get()
+            try:
+                await self.handler(item)
+            except Exception:
+                logger.exception(f"Worker of pool {self.name} failed to handle message: {item}")
+            finally:
+                queue.task_done()
+
+    async def drain(self, timeout: Optional[float] = None):
+        """Stops accepting messages, waits until the queued ones are handled and stops the workers."""
+        self.accepting = False
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self.queues)), timeout)
+        except asyncio.TimeoutError:
+            remaining = sum(queue.qsize() for queue in self.queues)
+            logger.warning(f"Worker pool {self.name} did not drain within {timeout}s, {remaining} messages dropped")
+        finally:
+            for worker in self._workers:
+                worker.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
+            self._workers = []
+
+    def metrics(self) -> dict:
+        shards = [queue.metrics() for queue in self.queues]
+        return {
+            "pool": self.name,
+            "shards": len(shards),
+            "accepting": self.accepting,
+            "depth": sum(shard["depth"] for shard in shards),
+            "enqueued": sum(shard["enqueued"] for shard in shards),
+            "dequeued": sum(shard["dequeued"] for shard in shards),
+            "dropped": sum(shard["dropped"] for shard in shards),
+            "coalesced": sum(shard["coalesced"] for shard in shards),
+            "blocked_puts": sum(shard["blocked_puts"] for shard in shards),
+            "overflowed": sum(shard["overflowed"] for shard in shards),
+            "shard_metrics": shards,
+        }
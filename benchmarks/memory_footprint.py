@@ -0,0 +1,95 @@
+"""
+Memory footprint of the simulation data model.
+
+Measures with tracemalloc how much memory and how many allocations (blocks) it takes to hold
+-   a generated city (scenarios/city_generator.py): its Edge and Person objects with their measurements,
+-   a batch of sensor readings: HealthMessages with their HealthMeasurements,
+-   the categorised readings: the HealthMeasurementValuePairs of those messages,
+and how long building them takes (in a separate run, without tracing).
+
+    python -m benchmarks.memory_footprint --edges 20000 --citizens 100000 --responders 10000 --readings 200000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, List, Tuple
+
+from application_components.dataclasses import *
+from application_components.medicus.HealthMeasurementCategoriser import HealthMeasurementCategoriser
+from scenarios.city_generator import PopulationConfig, generate_city_scenario
+
+
+@dataclass
+class Footprint:
+    name: str
+    objects: int
+    bytes: int
+    blocks: int
+    seconds: float
+
+    def __str__(self):
+        return (f"  {self.name:<22} {self.objects:>9} objects  {self.bytes / 2 ** 20:8.1f} MiB  "
+                f"{self.bytes / self.objects:6.1f} B/object  {self.blocks / self.objects:5.2f} blocks/object  "
+                f"{self.seconds:6.2f} s")
+
+
+def measure(name: str, build: Callable[[], Tuple[object, int]]) -> Tuple[object, Footprint]:
+    """Memory and blocks still allocated after `build`, which returns (result, number of objects)."""
+    gc.collect()
+    started = time.perf_counter()
+    build()
+    seconds = time.perf_counter() - started
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result, objects = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    statistics = after.compare_to(before, "filename")
+    size = sum(statistic.size_diff for statistic in statistics)
+    blocks = sum(statistic.count_diff for statistic in statistics)
+    return result, Footprint(name, objects, size, blocks, seconds)
+
+
+def readings(people: List[Person], count: int) -> List[HealthMessage]:
+    """`count` health messages of the people in turn, each with a fresh heart rate and breathing rate reading."""
+    return [
+        HealthMessage(patient_ssn=people[index % len(people)].ssn, patient_edge=people[index % len(people)].target,
+                      measurements=[HeartRateMeasurement(value=60 + index % 100),
+                                    BreathingRateMeasurement(value=float(10 + index % 20))],
+                      sequence=index)
+        for index in range(count)
+    ]
+
+
+def main(edges: int, citizens: int, responders: int, reading_count: int):
+    def build_city():
+        scenario = generate_city_scenario("Footprint", edges, PopulationConfig(citizens=citizens, responders=responders))
+        return scenario, len(scenario.graph.edges) + len(scenario.graph.people)
+
+    def build_readings():
+        messages = readings(scenario.graph.people, reading_count)
+        return messages, len(messages)
+
+    def build_value_pairs():
+        pairs = [HealthMeasurementCategoriser.process_measurements(message.measurements) for message in messages]
+        return pairs, sum(len(each) for each in pairs)
+
+    scenario, city = measure("city (edges + people)", build_city)
+    messages, messages_footprint = measure("health messages", build_readings)
+    _, value_pairs = measure("value pairs", build_value_pairs)
+    print(f"Memory footprint: {edges} edges, {citizens} citizens, {responders} responders, {reading_count} readings")
+    for footprint in (city, messages_footprint, value_pairs):
+        print(footprint)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory and allocations of the simulation data model")
+    parser.add_argument("--edges", type=int, default=20000)
+    parser.add_argument("--citizens", type=int, default=100000)
+    parser.add_argument("--responders", type=int, default=10000)
+    parser.add_argument("--readings", type=int, default=200000)
+    arguments = parser.parse_args()
+    main(arguments.edges, arguments.citizens, arguments.responders, arguments.readings)
@@ -0,0 +1,310 @@
+"""
+End-to-end benchmark of Medicus.
+
+Drives a generated city (scenarios/city_generator.py) through a MedicusService connected to the
+in-memory GraphDB stand-in, so it runs offline:
+1.  Publishes the graph on Channel.INIT and waits until Medicus acknowledges it.
+2.  Publishes the health message of every person for every tick, keeping at most `in_flight`
+    messages unacknowledged, and answers responder selections like Simpy does.
+3.  Waits until every message is acknowledged and every dispatched emergency is over.
+
+Reports throughput (messages/sec), the latency percentiles of message processing, emergency detection
+(message sent -> responder selected) and dispatch (message sent -> emergency over), and the
+GraphDB round trips per message.
+
+    python -m benchmarks.run_benchmark --edges 2000 --citizens 500 --responders 100 --ticks 20
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from broadcaster import Broadcast
+
+from application_components.dataclasses import *
+from application_components.medicus.async_graphdb_client import AsyncGraphDBClient
+from application_components.medicus.medicus_server import MedicusService
+from application_components.wire_format import WireFormatBroadcast
+from scenarios.city_generator import PopulationConfig, generate_city_scenario
+from stand_ins.bus_stand_in import BusStandIn
+from stand_ins.graphdb_stand_in import DEFAULT_REPOSITORY_ID, GraphDBStandIn
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 90, 99)
+# Longest time (seconds) to wait for outstanding acknowledgements and emergencies at the end of a run
+SETTLE_TIMEOUT = 60
+
+
+@dataclass
+class BenchmarkConfig:
+    layout: str = "grid"
+    edges: int = 2000
+    citizens: int = 500
+    responders: int = 100
+    ticks: int = 20
+    emergency_rate: float = 0.005
+    decline_rate: float = 0.1
+    seed: int = 0
+    in_flight: int = 256
+    local_reasoning: bool = True
+    aggregate_sensor_streams: bool = True
+    precompute_distances: bool = True
+    # Send the messages in the wire format over a byte-carrying broker stand-in instead of memory://
+    wire_format: bool = False
+
+
+@dataclass
+class BenchmarkResult:
+    config: BenchmarkConfig
+    messages: int = 0
+    elapsed_seconds: float = 0.0
+    messages_per_second: float = 0.0
+    graph_load_seconds: float = 0.0
+    round_trips: int = 0
+    round_trips_per_message: float = 0.0
+    emergencies_dispatched: int = 0
+    emergencies_over: int = 0
+    processing_latency_ms: Dict[str, float] = field(default_factory=dict)
+    detection_latency_ms: Dict[str, float] = field(default_factory=dict)
+    dispatch_latency_ms: Dict[str, float] = field(default_factory=dict)
+    bus_messages: int = 0
+    bus_bytes_per_message: float = 0.0
+
+    def format_report(self) -> str:
+        def latencies(values: Dict[str, float]) -> str:
+            return ", ".join(f"{name} {value:.1f}" for name, value in values.items()) or "-"
+
+        return "\n".join([
+            f"Benchmark: {self.config.layout} city, {self.config.edges} edges, {self.config.citizens} citizens, "
+            f"{self.config.responders} responders, {self.config.ticks} ticks, seed {self.config.seed}",
+            f"  graph load:             {self.graph_load_seconds:.2f} s",
+            f"  messages:               {self.messages} in {self.elapsed_seconds:.2f} s "
+            f"({self.messages_per_second:.0f} msgs/sec)",
+            f"  processing latency ms:  {latencies(self.processing_latency_ms)}",
+            f"  detection latency ms:   {latencies(self.detection_latency_ms)}",
+            f"  dispatch latency ms:    {latencies(self.dispatch_latency_ms)}",
+            f"  emergencies:            {self.emergencies_dispatched} dispatched, {self.emergencies_over} over",
+            f"  GraphDB round trips:    {self.round_trips} ({self.round_trips_per_message:.3f} per message)",
+        ] + ([f"  bus (wire format):      {self.bus_messages} messages, "
+              f"{self.bus_bytes_per_message:.1f} bytes per message"] if self.config.wire_format else []))
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """Nearest-rank percentiles (and the maximum) of latencies in seconds, as milliseconds."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    result = {f"p{percentile}": ordered[max(0, math.ceil(percentile / 100 * len(ordered)) - 1)] * 1000
+              for percentile in PERCENTILES}
+    result["max"] = ordered[-1] * 1000
+    return result
+
+
+class BenchmarkDriver:
+    """
+    Plays the simulation side of a benchmark on the bus: sends sensor readings, answers responder selections
+    and timestamps the acknowledgements, selections and EMERGENCY_OVER messages of Medicus.
+    """
+    def __init__(self, broadcast: Broadcast, scenario: Scenario, in_flight: int):
+        self.broadcast = broadcast
+        self.scenario = scenario
+        self.people: Dict[int, Person] = {person.ssn: person for person in scenario.graph.people}
+        self._in_flight = asyncio.Semaphore(in_flight)
+        self._sent_at: Dict[int, float] = {}
+        self._all_acknowledged = asyncio.Event()
+        self._all_acknowledged.set()
+        self._init_processed: Optional[asyncio.Future] = None
+        self._listeners: List[asyncio.Task] = []
+
+        self.processing_latencies: List[float] = []
+        self.triggered_at: Dict[int, float] = {}
+        self.selected_at: Dict[int, float] = {}
+        self.over_at: Dict[int, float] = {}
+
+    async def start(self):
+        handlers = {
+            Channel.INIT_PROCESSED: self._handle_init_processed,
+            Channel.HEALTH_MEASUREMENT_PROCESSED: self._handle_health_message_processed,
+            Channel.HEALTH_RESPONDER_SELECTED_MESSAGE: self._handle_responder_selected,
+            Channel.EMERGENCY_OVER: self._handle_emergency_over,
+        }
+        subscribed = [asyncio.Event() for _ in handlers]
+        self._listeners = [asyncio.create_task(self._listen_channel(channel, handler, ready))
+                           for (channel, handler), ready in zip(handlers.items(), subscribed)]
+        await asyncio.gather(*(ready.wait() for ready in subscribed))
+
+    async def stop(self):
+        for listener in self._listeners:
+            listener.cancel()
+        await asyncio.gather(*self._listeners, return_exceptions=True)
+
+    async def _listen_channel(self, channel, handler, ready: asyncio.Event):
+        async with self.broadcast.subscribe(channel=channel) as subscriber:
+            ready.set()
+            async for event in subscriber:
+                await handler(event.message)
+
+    async def load_graph(self) -> bool:
+        self._init_processed = asyncio.get_running_loop().create_future()
+        await self.broadcast.publish(channel=Channel.INIT, message=self.scenario.graph)
+        result: InitProcessedMessage = await self._init_processed
+        return result.success
+
+    async def send_ticks(self, ticks: int) -> int:
+        sequence = 0
+        for tick in range(ticks):
+            for person in self.scenario.graph.people:
+                measurements = person.measurements
+                if person.measurement_schedule:
+                    measurements = person.measurement_schedule.get_measurements_at_tick(tick)
+                await self._in_flight.acquire()
+                self._sent_at[sequence] = time.perf_counter()
+                self._all_acknowledged.clear()
+                await self.broadcast.publish(
+                    channel=Channel.HEALTH_MEASUREMENT,
+                    message=HealthMessage(patient_ssn=person.ssn, patient_edge=person.target,
+                                          measurements=measurements, sequence=sequence)
+                )
+                sequence += 1
+        return sequence
+
+    async def settle(self, timeout: float = SETTLE_TIMEOUT):
+        """Waits until all messages are acknowledged and all dispatched emergencies are over."""
+        deadline = time.perf_counter() + timeout
+        try:
+            await asyncio.wait_for(self._all_acknowledged.wait(), timeout)
+            while set(self.triggered_at) - set(self.over_at) and time.perf_counter() < deadline:
+                await asyncio.sleep(0.01)
+        except asyncio.TimeoutError:
+            logger.warning(f"{len(self._sent_at)} messages still unacknowledged after {timeout}s")
+
+    async def _handle_init_processed(self, message: InitProcessedMessage):
+        if self._init_processed is not None and not self._init_processed.done():
+            self._init_processed.set_result(message)
+
+    async def _handle_health_message_processed(self, message: HealthMessageProcessed):
+        sent_at = self._sent_at.pop(message.sequence, None)
+        if sent_at is None:
+            return
+        self.processing_latencies.append(time.perf_counter() - sent_at)
+        if message.emergency_dispatched:
+            self.triggered_at[message.patient_ssn] = sent_at
+        self._in_flight.release()
+        if not self._sent_at:
+            self._all_acknowledged.set()
+
+    async def _handle_responder_selected(self, message: HealthResponderSelectedMessage):
+        self.selected_at.setdefault(message.patient_ssn, time.perf_counter())
+        person_declines = self.people[message.responder_ssn].declines_request
+        await self.broadcast.publish(
+            channel=Channel.HEALTH_RESPONDER_RESPONSE,
+            message=EmergencyHelpResponse(first_responder_ssn=message.responder_ssn, patient_ssn=message.patient_ssn,
+                                          help_accepted=not (message.allowed_to_decline and person_declines))
+        )
+
+    async def _handle_emergency_over(self, message: EmergencyOverMessage):
+        self.over_at.setdefault(message.patient_ssn, time.perf_counter())
+
+
+async def run_benchmark(config: BenchmarkConfig) -> BenchmarkResult:
+    scenario = generate_city_scenario(
+        "Benchmark", config.edges,
+        PopulationConfig(citizens=config.citizens, responders=config.responders, decline_rate=config.decline_rate,
+                         emergency_rate=config.emergency_rate, horizon=config.ticks),
+        layout=config.layout, seed=config.seed
+    )
+    stand_in = GraphDBStandIn()
+    bus = BusStandIn() if config.wire_format else None
+    broadcast = WireFormatBroadcast(backend=bus, text_frames=False) if bus is not None else Broadcast("memory://")
+    await broadcast.connect()
+    medicus = MedicusService(
+        broadcast, asyncio.get_running_loop(),
+        graphdb_client=AsyncGraphDBClient("http://graphdb-stand-in", DEFAULT_REPOSITORY_ID,
+                                          transport=stand_in.transport()),
+        precompute_distances=config.precompute_distances, local_reasoning=config.local_reasoning,
+        aggregate_sensor_streams=config.aggregate_sensor_streams
+    )
+    driver = BenchmarkDriver(broadcast, scenario, config.in_flight)
+    await driver.start()
+    medicus_task = asyncio.create_task(medicus.listen_to_events())
+    await medicus.listening.wait()
+
+    result = BenchmarkResult(config=config)
+    started = time.perf_counter()
+    if not await driver.load_graph():
+        logger.error("Medicus failed to load the benchmark graph")
+    result.graph_load_seconds = time.perf_counter() - started
+
+    round_trips_before = stand_in.round_trips()
+    started = time.perf_counter()
+    result.messages = await driver.send_ticks(config.ticks)
+    await driver.settle()
+    result.elapsed_seconds = time.perf_counter() - started
+
+    result.messages_per_second = result.messages / result.elapsed_seconds if result.elapsed_seconds else 0.0
+    result.round_trips = stand_in.round_trips() - round_trips_before
+    result.round_trips_per_message = result.round_trips / result.messages if result.messages else 0.0
+    result.emergencies_dispatched = len(driver.triggered_at)
+    result.emergencies_over = len(set(driver.triggered_at) & set(driver.over_at))
+    result.processing_latency_ms = percentiles(driver.processing_latencies)
+    result.detection_latency_ms = percentiles([driver.selected_at[ssn] - sent_at
+                                               for ssn, sent_at in driver.triggered_at.items()
+                                               if ssn in driver.selected_at])
+    result.dispatch_latency_ms = percentiles([driver.over_at[ssn] - sent_at
+                                              for ssn, sent_at in driver.triggered_at.items()
+                                              if ssn in driver.over_at])
+    if bus is not None:
+        result.bus_messages = sum(bus.messages.values())
+        result.bus_bytes_per_message = bus.bytes_per_message()
+
+    await driver.stop()
+    await medicus.stop()
+    medicus_task.cancel()
+    await asyncio.gather(medicus_task, return_exceptions=True)
+    await broadcast.disconnect()
+    return result
+
+
+def parse_arguments() -> Tuple[BenchmarkConfig, Optional[str]]:
+    defaults = BenchmarkConfig()
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of Medicus against an in-memory GraphDB")
+    parser.add_argument("--layout", choices=["grid", "planar"], default=defaults.layout)
+    parser.add_argument("--edges", type=int, default=defaults.edges)
+    parser.add_argument("--citizens", type=int, default=defaults.citizens)
+    parser.add_argument("--responders", type=int, default=defaults.responders)
+    parser.add_argument("--ticks", type=int, default=defaults.ticks)
+    parser.add_argument("--emergency-rate", type=float, default=defaults.emergency_rate)
+    parser.add_argument("--decline-rate", type=float, default=defaults.decline_rate)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--in-flight", type=int, default=defaults.in_flight)
+    parser.add_argument("--graphdb-reasoning", action="store_true",
+                        help="Detect emergencies with GraphDB queries instead of the local matcher")
+    parser.add_argument("--no-aggregation", action="store_true", help="Reason about every health message")
+    parser.add_argument("--no-distance-index", action="store_true", help="Do not precompute street distances")
+    parser.add_argument("--wire-format", action="store_true",
+                        help="Send the bus messages in the wire format over a broker stand-in")
+    parser.add_argument("--json", dest="json_path", help="Also write the result as JSON to this file")
+    arguments = parser.parse_args()
+    config = BenchmarkConfig(
+        layout=arguments.layout, edges=arguments.edges, citizens=arguments.citizens,
+        responders=arguments.responders, ticks=arguments.ticks, emergency_rate=arguments.emergency_rate,
+        decline_rate=arguments.decline_rate, seed=arguments.seed, in_flight=arguments.in_flight,
+        local_reasoning=not arguments.graphdb_reasoning, aggregate_sensor_streams=not arguments.no_aggregation,
+        precompute_distances=not arguments.no_distance_index, wire_format=arguments.wire_format
+    )
+    return config, arguments.json_path
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    benchmark_config, json_path = parse_arguments()
+    benchmark_result = asyncio.run(run_benchmark(benchmark_config))
+    print(benchmark_result.format_report())
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(asdict(benchmark_result), f, indent=2)
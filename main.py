@@ -19,12 +19,15 @@ import asyncio
 from application_components.medicus.medicus_server import MedicusService
 from application_components.GUI.gui_server import GUIServer
 from application_components.simulation_environment.simulation_env import Simpy
+from application_components.results_collector import ResultsCollector
 from broadcaster import Broadcast
 from scenarios.Scenarios import get_scenarios
 import logging
 import time
 
 AUTO_START_SIMULATION = False
+# Run the simulation in virtual time, as fast as Medicus acknowledges the messages (requires AUTO_START_SIMULATION)
+HEADLESS = False
 # Scenarios to run in sequence
 SCENARIOS_TO_RUN = ["Scenario 1"]
 
@@ -37,9 +40,11 @@ async def main():
     medicus_service = MedicusService(broadcast, loop=loop)
     
     # 3. Initialize GUI Server
-    simpy = Simpy(broadcast, loop=loop)
-    gui_server = GUIServer(simpy)
+    simpy = Simpy(broadcast, loop=loop, headless=HEADLESS)
+    gui_server = GUIServer(simpy, broadcast)
     simpy.gui_server = gui_server
+    # Sensor readings wait while Medicus' health measurement queue is full (only with OverflowPolicy.BLOCK)
+    simpy.health_measurement_backpressure = medicus_service.health_message_pool
 
     # Start Services
     # We start them once. They will persist across scenarios.
@@ -50,6 +55,10 @@ async def main():
     # Give services a moment to start
     await asyncio.sleep(2)
 
+    # Records the dispatch outcomes from the bus, scenarios are verified against them
+    results_collector = ResultsCollector(broadcast)
+    await results_collector.start()
+
     scenarios = get_scenarios()
     selected_scenarios = [scenarios.get_scenario_by_name(name) for name in SCENARIOS_TO_RUN]
 
@@ -66,7 +75,8 @@ async def main():
         logger.info(f"--- Starting Scenario: {selected_scenario.name} ---")
 
         # Reset Database
-        medicus_service.reset_database()
+        await medicus_service.reset_database()
+        results_collector.reset()
 
         # Load Scenario into Simpy
         simpy.load_scenario(selected_scenario.graph, selected_scenario.simulation)
@@ -86,22 +96,11 @@ async def main():
     
             
             # --- Result Verification ---
-            if selected_scenario.goal_ssn_to_select != -1:
-                log_file_name = f"scenario_{selected_scenario.name}.log"
-                expected_phrase = f"Confirmed Selection of first responder with ssn {selected_scenario.goal_ssn_to_select}"
-                
-                try:
-                    with open(log_file_name, 'r', encoding='utf-8') as f:
-                        log_content = f.read()
-                        
-                    if expected_phrase in log_content:
-                        logger.info(f"TEST PASSED: Found expected confirmation for SSN {selected_scenario.goal_ssn_to_select}")
-                    else:
-                        logger.error(f"TEST FAILED: Did not find '{expected_phrase}' in logs.")
-                except Exception as e:
-                    logger.error(f"TEST FAILED: Error reading log file for verification: {e}")
+            verdict = results_collector.verify(selected_scenario)
+            if verdict.passed:
+                logger.info(str(verdict))
             else:
-                logger.info("TEST SKIPPED: No goal SSN defined for this scenario.")
+                logger.error(str(verdict))
         else:
             logger.info(f"--- Scenario {selected_scenario.name} Loaded. Ready for Manual Start ---")
             logger.info("Please start the simulation via the GUI HERE: http://localhost:8000/simulation/start")
@@ -118,6 +117,8 @@ async def main():
             logger.info(f"--- Scenario {selected_scenario.name} Provided Manual Run Completed ---")
 
     logger.info("All scenarios completed.")
+    await results_collector.stop()
+    await medicus_service.stop()
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,267 @@
+"""
+Synthetic cities for scale testing.
+
+Builds reproducible (seeded) street networks and populations instead of the hand-written
+scenarios in Scenarios.py:
+-   grid_streets: a rectangular street grid.
+-   planar_streets: a random connected planar network (jittered lattice with random links and diagonals).
+-   generate_population: citizens and first responders with configurable specialities, certification levels,
+    decline rates and MeasurementSchedules that trigger emergencies at a chosen rate.
+-   generate_city_scenario: both combined into a Scenario.
+
+Street segments are named like in Scenarios.py ("e0", "e1", ...). A segment connected to several others
+appears in several Edge records with the same id and distance, one per connectedTo link.
+"""
+import math
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from application_components.dataclasses import *
+
+DEFAULT_SEED = 0
+MIN_SEGMENT_LENGTH = 50
+MAX_SEGMENT_LENGTH = 250
+DEFAULT_EXTRA_LINK_PROBABILITY = 0.3
+
+# Readings of a healthy person, they match no medical issue
+HEALTHY_MEASUREMENTS: List[HealthMeasurement] = [HeartRateMeasurement(value=80)]
+
+# Readings that make Medicus detect an emergency treated by the speciality
+EMERGENCY_MEASUREMENTS: Dict[IllnessType, List[HealthMeasurement]] = {
+    # SimpleFracture, basic level
+    IllnessType.TRAUMA: [GroundHardnessMeasurement(value=4)],
+    # CardiacArrest, intermediate level
+    IllnessType.CARDIAC: [HeartRateMeasurement(value=141), EKGReadingMeasurement(value=4),
+                          BreathingRateMeasurement(value=7)],
+    # Choking, basic level
+    IllnessType.RESPIRATORY: [ChokingMeasurement(value=5), AirflowMeasurement(value=150)],
+    # Seizure, intermediate level
+    IllnessType.NEUROLOGICAL: [EKGReadingMeasurement(value=3), MuscleTensionMeasurement(value=7)],
+}
+
+
+@dataclass
+class PopulationConfig:
+    """
+    Composition of a generated population.
+
+    Attributes:
+        citizens (int): Number of citizens, the only people that get emergencies.
+        responders (int): Number of first responders.
+        speciality_weights (Dict[IllnessType, float]): Relative frequency of the specialities of responders
+            and of the emergencies of citizens.
+        certification_weights (Dict[CertificationLevel, float]): Relative frequency of responder certification levels.
+        decline_rate (float): Share of responders that decline a request when they are allowed to.
+        emergency_rate (float): Probability per citizen and tick that an emergency starts.
+        emergency_duration (int): Ticks the emergency readings are reported before the person is healthy again.
+        horizon (int): Ticks covered by the schedules, emergencies starting later are left out.
+    """
+    citizens: int
+    responders: int
+    speciality_weights: Dict[IllnessType, float] = field(
+        default_factory=lambda: {speciality: 1.0 for speciality in IllnessType})
+    certification_weights: Dict[CertificationLevel, float] = field(
+        default_factory=lambda: {level: 1.0 for level in CertificationLevel})
+    decline_rate: float = 0.0
+    emergency_rate: float = 0.001
+    emergency_duration: int = 1
+    horizon: int = 100
+
+
+def _segment_id(index: int) -> str:
+    return f"e{index}"
+
+
+def _link_edges(positions: List[Tuple[float, float]], lengths: List[int],
+                links: List[Tuple[int, int]]) -> List[Edge]:
+    """Edge records for undirected links between segments, every segment appears at least once as id."""
+    has_record = [False] * len(positions)
+    edges = []
+    for first, second in links:
+        if has_record[first] and not has_record[second]:
+            first, second = second, first
+        has_record[first] = True
+        edges.append(Edge(id=_segment_id(first), target=_segment_id(second), distance=lengths[first],
+                          x=positions[first][0], y=positions[first][1]))
+
+    neighbour = {}
+    for first, second in links:
+        neighbour.setdefault(first, second)
+        neighbour.setdefault(second, first)
+    for segment, recorded in enumerate(has_record):
+        if not recorded:
+            target = neighbour.get(segment, segment)
+            edges.append(Edge(id=_segment_id(segment), target=_segment_id(target), distance=lengths[segment],
+                              x=positions[segment][0], y=positions[segment][1]))
+    return edges
+
+
+def grid_streets(rows: int, columns: int, seed: int = DEFAULT_SEED,
+                 min_length: int = MIN_SEGMENT_LENGTH, max_length: int = MAX_SEGMENT_LENGTH) -> List[Edge]:
+    """
+    Street grid of rows x columns segments, each connected to its horizontal and vertical neighbours.
+    Produces about 2 * rows * columns Edge records.
+    """
+    if rows < 1 or columns < 1:
+        raise ValueError(f"A street grid needs at least one row and column. Got: {rows}x{columns}")
+    rng = random.Random(seed)
+    block = (min_length + max_length) / 2
+
+    positions = [(column * block, row * block) for row in range(rows) for column in range(columns)]
+    lengths = [rng.randint(min_length, max_length) for _ in positions]
+    links = []
+    for row in range(rows):
+        for column in range(columns):
+            index = row * columns + column
+            if column + 1 < columns:
+                links.append((index, index + 1))
+            if row + 1 < rows:
+                links.append((index, index + columns))
+    return _link_edges(positions, lengths, links)
+
+
+class _DisjointSets:
+    def __init__(self, size: int):
+        self.parents = list(range(size))
+
+    def find(self, item: int) -> int:
+        root = item
+        while self.parents[root] != root:
+            root = self.parents[root]
+        while self.parents[item] != root:
+            self.parents[item], item = root, self.parents[item]
+        return root
+
+    def union(self, first: int, second: int) -> bool:
+        first, second = self.find(first), self.find(second)
+        if first == second:
+            return False
+        self.parents[second] = first
+        return True
+
+
+def planar_streets(segment_count: int, seed: int = DEFAULT_SEED,
+                   extra_link_probability: float = DEFAULT_EXTRA_LINK_PROBABILITY,
+                   min_length: int = MIN_SEGMENT_LENGTH, max_length: int = MAX_SEGMENT_LENGTH) -> List[Edge]:
+    """
+    Random connected planar street network.
+
+    The segments sit on a jittered square lattice. Candidate links are the lattice neighbours plus one
+    random diagonal per cell, so no two links cross. A random spanning tree keeps the network connected,
+    every other candidate link is kept with `extra_link_probability`.
+    Produces between segment_count - 1 and about 3 * segment_count Edge records.
+    """
+    if segment_count < 1:
+        raise ValueError(f"A street network needs at least one segment. Got: {segment_count}")
+    rng = random.Random(seed)
+    columns = math.ceil(math.sqrt(segment_count))
+    block = (min_length + max_length) / 2
+
+    positions = []
+    for index in range(segment_count):
+        row, column = divmod(index, columns)
+        # Jitter below a quarter block keeps every lattice cell convex, so its diagonal stays inside
+        positions.append(((column + rng.uniform(-0.2, 0.2)) * block, (row + rng.uniform(-0.2, 0.2)) * block))
+    lengths = [rng.randint(min_length, max_length) for _ in positions]
+
+    candidates = []
+    for index in range(segment_count):
+        row, column = divmod(index, columns)
+        right = index + 1 if column + 1 < columns and index + 1 < segment_count else None
+        below = index + columns if index + columns < segment_count else None
+        if right is not None:
+            candidates.append((index, right))
+        if below is not None:
+            candidates.append((index, below))
+        if right is not None and below is not None and below + 1 < segment_count:
+            candidates.append((index, below + 1) if rng.random() < 0.5 else (right, below))
+    rng.shuffle(candidates)
+
+    components = _DisjointSets(segment_count)
+    links = [link for link in candidates
+             if components.union(*link) or rng.random() < extra_link_probability]
+    return _link_edges(positions, lengths, links)
+
+
+def _weighted_choice(rng: random.Random, weights: Dict):
+    options = list(weights)
+    return rng.choices(options, weights=[weights[option] for option in options])[0]
+
+
+def _emergency_onset(rng: random.Random, rate: float, horizon: int) -> Optional[int]:
+    """First tick at which an emergency starts (geometric distribution), None if not within the horizon."""
+    if rate <= 0:
+        return None
+    if rate >= 1:
+        return 0
+    onset = int(math.log(1.0 - rng.random()) / math.log(1.0 - rate))
+    return onset if onset < horizon else None
+
+
+def generate_population(edges: List[Edge], config: PopulationConfig, seed: int = DEFAULT_SEED) -> List[Person]:
+    """
+    Citizens and first responders placed on random street segments.
+    Citizens whose emergency starts within the horizon get a MeasurementSchedule reporting healthy readings
+    until the onset, then the EMERGENCY_MEASUREMENTS of their emergency for `emergency_duration` ticks.
+    """
+    rng = random.Random(seed)
+    segments = sorted({each_edge.id for each_edge in edges}, key=lambda segment: int(segment[1:]))
+    if not segments:
+        raise ValueError("A population needs at least one street segment")
+
+    people = []
+    for ssn in range(config.citizens):
+        speciality = _weighted_choice(rng, config.speciality_weights)
+        onset = _emergency_onset(rng, config.emergency_rate, config.horizon)
+        schedule = None
+        if onset is not None:
+            schedule = MeasurementSchedule(
+                schedule_items=[
+                    MeasurementScheduleItem(measurements=HEALTHY_MEASUREMENTS, duration=onset),
+                    MeasurementScheduleItem(measurements=EMERGENCY_MEASUREMENTS[speciality],
+                                            duration=config.emergency_duration),
+                ],
+                default_measurements=HEALTHY_MEASUREMENTS
+            )
+        people.append(Person(
+            target=rng.choice(segments), ssn=ssn, name=f"Citizen {ssn}", hasEmergency=False, type="Citizen",
+            speciality=speciality, certificationLevel=_weighted_choice(rng, config.certification_weights),
+            measurements=HEALTHY_MEASUREMENTS, measurement_schedule=schedule
+        ))
+
+    for ssn in range(config.citizens, config.citizens + config.responders):
+        people.append(Person(
+            target=rng.choice(segments), ssn=ssn, name=f"Responder {ssn}", hasEmergency=False,
+            type="FirstResponder", speciality=_weighted_choice(rng, config.speciality_weights),
+            certificationLevel=_weighted_choice(rng, config.certification_weights),
+            measurements=HEALTHY_MEASUREMENTS, declines_request=rng.random() < config.decline_rate
+        ))
+    return people
+
+
+def generate_city_scenario(name: str, edge_count: int, population: PopulationConfig, layout: str = "grid",
+                           seed: int = DEFAULT_SEED, timeout_factor: float = 1.5) -> Scenario:
+    """
+    Scenario with a generated street network of about `edge_count` Edge records ("grid" or "planar")
+    and a generated population, simulated for `population.horizon` rounds.
+    Generated scenarios have no single expected responder (goal_ssn_to_select is -1).
+    """
+    if layout == "grid":
+        side = max(1, round(math.sqrt(edge_count / 2)))
+        edges = grid_streets(side, side, seed=seed)
+    elif layout == "planar":
+        # A spanning tree plus the kept share of the other ~2 candidate links per segment
+        edges = planar_streets(max(1, round(edge_count / (1 + 2 * DEFAULT_EXTRA_LINK_PROBABILITY))), seed=seed)
+    else:
+        raise ValueError(f"Unknown street layout {layout}. Expected 'grid' or 'planar'")
+
+    people = generate_population(edges, population, seed=seed)
+    return Scenario(
+        name=name,
+        description=f"Generated {layout} city | {len(edges)} edges, {population.citizens} citizens, "
+                    f"{population.responders} responders, seed {seed}",
+        graph=GraphData(edges=edges, people=people),
+        simulation=Simulation(number_data_iterations=population.horizon, timeout_factor=timeout_factor),
+        goal_ssn_to_select=-1
+    )
@@ -0,0 +1,174 @@
+"""
+Runs scenarios concurrently, each in its own isolated environment.
+
+Every scenario gets its own message bus, headless Simpy, MedicusService, ResultsCollector and GraphDB
+repository, so scenarios cannot see each other's people or emergencies. Medicus writes the scenario
+into named graphs below a base IRI of its own (see DataGraphs), which are dropped afterwards.
+
+Without a GraphDB URL the repositories come from the in-memory GraphDB stand-in (stand_ins/graphdb_stand_in.py),
+one per parallel slot. Against a real GraphDB the repositories have to exist already (set up like "semtec"),
+and at most one scenario runs per repository at a time.
+
+    python -m scenarios.parallel_runner "Scenario 1" "Scenario 7"
+    python -m scenarios.parallel_runner --graphdb http://localhost:7200 --repositories semtec semtec2
+
+With --wire-format the bus messages are sent in the wire format (application_components/wire_format.py)
+over a byte-carrying broker stand-in (stand_ins/bus_stand_in.py), as they would over Redis or Kafka.
+"""
+import argparse
+import asyncio
+import logging
+import re
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from broadcaster import Broadcast
+
+from application_components.dataclasses import *
+from application_components.medicus.async_graphdb_client import AsyncGraphDBClient
+from application_components.medicus.medicus_server import DATA_GRAPH, MedicusService
+from application_components.results_collector import ResultsCollector, ScenarioVerdict
+from application_components.simulation_environment.simulation_env import Simpy
+from application_components.wire_format import WireFormatBroadcast
+from scenarios.Scenarios import get_scenarios
+from stand_ins.bus_stand_in import BusStandIn
+from stand_ins.graphdb_stand_in import GraphDBStandIn
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_PARALLEL = 4
+STAND_IN_BASE_URL = "http://graphdb-stand-in"
+
+
+@dataclass
+class ScenarioRunResult:
+    scenario_name: str
+    repository_id: str
+    verdict: Optional[ScenarioVerdict]
+    elapsed_seconds: float
+    error: Optional[str] = None
+
+    @property
+    def passed(self) -> bool:
+        return self.error is None and self.verdict is not None and self.verdict.passed
+
+
+def scenario_graph(scenario: Scenario) -> str:
+    """Base IRI of the named graphs of a scenario, e.g. .../graphs/simulation/scenario-1"""
+    return f"{DATA_GRAPH}/{re.sub(r'[^A-Za-z0-9]+', '-', scenario.name).strip('-').lower()}"
+
+
+class ParallelScenarioRunner:
+    """
+    Runs scenarios concurrently on a pool of GraphDB repositories.
+    A scenario waits for a free repository, runs in virtual time (headless Simpy) and releases the
+    repository after dropping its named graphs.
+    """
+    def __init__(self, graphdb_base_url: Optional[str] = None, repository_ids: Optional[List[str]] = None,
+                 max_parallel: int = DEFAULT_MAX_PARALLEL, wire_format: bool = False):
+        self.wire_format = wire_format
+        self.stand_in = None
+        if graphdb_base_url is None:
+            repository_ids = repository_ids or [f"scenarios-{slot}" for slot in range(max_parallel)]
+            self.stand_in = GraphDBStandIn(repository_ids=tuple(repository_ids))
+            graphdb_base_url = STAND_IN_BASE_URL
+        elif not repository_ids:
+            raise ValueError("Running against GraphDB requires the ids of existing repositories")
+        self.graphdb_base_url = graphdb_base_url
+        self.repository_ids = list(repository_ids)
+
+    def _graphdb_client(self, repository_id: str) -> AsyncGraphDBClient:
+        transport = self.stand_in.transport() if self.stand_in is not None else None
+        return AsyncGraphDBClient(self.graphdb_base_url, repository_id, transport=transport)
+
+    def _broadcast(self) -> Broadcast:
+        if self.wire_format:
+            return WireFormatBroadcast(backend=BusStandIn(), text_frames=False)
+        return Broadcast("memory://")
+
+    async def run(self, scenarios: List[Scenario]) -> List[ScenarioRunResult]:
+        free_repositories: asyncio.Queue = asyncio.Queue()
+        for repository_id in self.repository_ids:
+            free_repositories.put_nowait(repository_id)
+
+        async def run_on_free_repository(scenario: Scenario) -> ScenarioRunResult:
+            repository_id = await free_repositories.get()
+            try:
+                return await self.run_scenario(scenario, repository_id)
+            finally:
+                free_repositories.put_nowait(repository_id)
+
+        return list(await asyncio.gather(*(run_on_free_repository(scenario) for scenario in scenarios)))
+
+    async def run_scenario(self, scenario: Scenario, repository_id: str) -> ScenarioRunResult:
+        started = time.perf_counter()
+        broadcast = self._broadcast()
+        await broadcast.connect()
+        medicus = MedicusService(broadcast, asyncio.get_running_loop(),
+                                 graphdb_client=self._graphdb_client(repository_id),
+                                 precompute_distances=False, data_graph=scenario_graph(scenario))
+        simpy = Simpy(broadcast, loop=asyncio.get_running_loop(), headless=True)
+        results_collector = ResultsCollector(broadcast)
+        await results_collector.start()
+        tasks = [asyncio.create_task(medicus.listen_to_events()),
+                 asyncio.create_task(simpy.listen_to_bus_messages())]
+        try:
+            await medicus.listening.wait()
+            # Clears what an aborted earlier run may have left in the scenario graph
+            await medicus.reset_database()
+            logger.info(f"--- Starting Scenario: {scenario.name} on repository {repository_id} ---")
+            simpy.load_scenario(scenario.graph, scenario.simulation)
+            simpy.start_simulation()
+            await asyncio.to_thread(simpy.simulation_thread.join)
+            verdict = results_collector.verify(scenario)
+            return ScenarioRunResult(scenario.name, repository_id, verdict, time.perf_counter() - started)
+        except Exception as e:
+            logger.exception(f"Scenario {scenario.name} failed")
+            return ScenarioRunResult(scenario.name, repository_id, None, time.perf_counter() - started, error=str(e))
+        finally:
+            await medicus.reset_database()
+            await results_collector.stop()
+            await medicus.stop()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await broadcast.disconnect()
+
+
+def format_report(results: List[ScenarioRunResult], elapsed_seconds: float) -> str:
+    lines = [f"Scenario report ({len(results)} scenarios in {elapsed_seconds:.2f} s)"]
+    for result in results:
+        outcome = f"ERROR: {result.error}" if result.error else str(result.verdict)
+        lines.append(f"  {result.scenario_name:<12} {result.elapsed_seconds:6.2f} s  [{result.repository_id}]  {outcome}")
+    passed = sum(1 for result in results if result.passed and not result.verdict.skipped)
+    skipped = sum(1 for result in results if result.passed and result.verdict.skipped)
+    lines.append(f"  {passed} passed, {skipped} skipped, {len(results) - passed - skipped} failed")
+    return "\n".join(lines)
+
+
+async def main(scenario_names: List[str], graphdb_base_url: Optional[str], repository_ids: Optional[List[str]],
+               max_parallel: int, wire_format: bool = False) -> bool:
+    scenarios = get_scenarios()
+    selected_scenarios = [scenarios.get_scenario_by_name(name) for name in scenario_names] or scenarios.scenarios
+    runner = ParallelScenarioRunner(graphdb_base_url, repository_ids, max_parallel, wire_format)
+    started = time.perf_counter()
+    results = await runner.run(selected_scenarios)
+    print(format_report(results, time.perf_counter() - started))
+    return all(result.passed for result in results)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description="Runs scenarios in parallel, each with its own repository")
+    parser.add_argument("scenarios", nargs="*", help="Scenario names (default: all)")
+    parser.add_argument("--graphdb", help="GraphDB base URL (default: in-memory stand-in)")
+    parser.add_argument("--repositories", nargs="+", help="Existing repositories to run the scenarios on")
+    parser.add_argument("--parallel", type=int, default=DEFAULT_MAX_PARALLEL,
+                        help="Scenarios run at once on the stand-in")
+    parser.add_argument("--wire-format", action="store_true",
+                        help="Send the bus messages in the wire format over a broker stand-in")
+    arguments = parser.parse_args()
+    all_passed = asyncio.run(main(arguments.scenarios, arguments.graphdb, arguments.repositories, arguments.parallel,
+                                  arguments.wire_format))
+    raise SystemExit(0 if all_passed else 1)
@@ -0,0 +1,55 @@
+"""
+In-process stand-in for a message broker (Redis, Kafka, ...), for benchmarks, scenario runs and offline use.
+
+Unlike broadcaster's memory backend it only carries bytes (or text, sent as UTF-8), and delivers a copy,
+so a message object can never reach a subscriber without going through the wire format.
+It counts the messages and bytes published per channel.
+
+    broadcast = WireFormatBroadcast(backend=BusStandIn(), text_frames=False)
+"""
+import asyncio
+from collections import Counter
+from typing import Any, Set
+
+from broadcaster import Event
+from broadcaster._backends.base import BroadcastBackend
+
+
+class BusStandIn(BroadcastBackend):
+    def __init__(self, url: str = "stand-in://"):
+        self._subscribed: Set[str] = set()
+        self._published: asyncio.Queue = None
+        self.messages: Counter = Counter()
+        self.bytes: Counter = Counter()
+
+    async def connect(self) -> None:
+        self._published = asyncio.Queue()
+
+    async def disconnect(self) -> None:
+        pass
+
+    async def subscribe(self, channel: str) -> None:
+        self._subscribed.add(channel)
+
+    async def unsubscribe(self, channel: str) -> None:
+        self._subscribed.discard(channel)
+
+    async def publish(self, channel: str, message: Any) -> None:
+        if isinstance(message, str):
+            message = message.encode("utf-8")
+        if not isinstance(message, (bytes, bytearray, memoryview)):
+            raise TypeError(f"The bus carries bytes, got {type(message).__name__}")
+        payload = bytes(message)
+        self.messages[channel] += 1
+        self.bytes[channel] += len(payload)
+        await self._published.put(Event(channel=channel, message=payload))
+
+    async def next_published(self) -> Event:
+        while True:
+            event = await self._published.get()
+            if event.channel in self._subscribed:
+                return event
+
+    def bytes_per_message(self) -> float:
+        total_messages = sum(self.messages.values())
+        return sum(self.bytes.values()) / total_messages if total_messages else 0.0
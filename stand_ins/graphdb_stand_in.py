@@ -0,0 +1,259 @@
+"""
+In-memory stand-in for GraphDB, for benchmarks, scenario runs and offline use.
+
+Implements the part of the GraphDB REST API that Medicus uses, on top of rdflib:
+-   POST /rest/login                                   -> token in the Authorization header
+-   POST|GET /repositories/{repository}                -> SPARQL SELECT/ASK, results as sparql-results+json
+-   POST /repositories/{repository}/statements         -> SPARQL UPDATE or RDF data (N-Triples, Turtle,
+                                                          N-Quads), optionally into the named graph ?context=<iri>
+
+Every repository starts with the medical issue ontology (graphdb_input/rdf_ver3.ttl) and reasons
+incrementally about the statements added later, covering what the queries of Medicus rely on:
+-   rdfs:subClassOf is reflexive and transitive, rdf:type is inherited along it (cax-sco).
+-   the measurement_match rule of graphdb_input/rdf.pie, against the treatment levels of the ontology.
+Inferred statements are added to the named graph of their premise, so dropping a graph removes them,
+but they are not retracted when their premises are deleted one by one.
+rdflib does not treat "x" and "x"^^xsd:string as the same term (RDF 1.1 does), so string literals
+are stored and queried without the datatype.
+
+Use `transport()` to connect an AsyncGraphDBClient in-process, or run this module to serve it on port 7200.
+"""
+import itertools
+import logging
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from rdflib import Dataset, Graph, Literal, RDF, RDFS, URIRef, XSD
+from rdflib.plugins.stores.memory import Memory
+
+from application_components.medicus.medical_issue_matcher import CSA, MEDICAL_ISSUE_DEFINITIONS_PATH
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPOSITORY_ID = "semtec"
+DEFAULT_PORT = 7200
+SPARQL_RESULTS_JSON = "application/sparql-results+json"
+RDF_FORMATS = {
+    "application/n-triples": "nt",
+    "text/plain": "nt",
+    "text/turtle": "turtle",
+    "application/x-turtle": "turtle",
+    "application/n-quads": "nquads",
+}
+
+TYPED_STRING_PATTERN = re.compile(
+    r"(\"(?:[^\"\\]|\\.)*\")\^\^(?:xsd:string|<http://www\.w3\.org/2001/XMLSchema#string>)")
+
+
+class _RecordingMemory(Memory):
+    """rdflib memory store that remembers the statements (and their graphs) added since the last `take_added()`."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.recording = False
+        self._added: List[Tuple] = []
+
+    def add(self, triple, context, quoted: bool = False):
+        subject, predicate, obj = triple
+        if isinstance(obj, Literal) and obj.datatype == XSD.string:
+            obj = Literal(str(obj), lang=obj.language)
+            triple = (subject, predicate, obj)
+        if self.recording and next(iter(self.triples(triple, context)), None) is None:
+            self._added.append((triple, context))
+        super().add(triple, context, quoted)
+
+    def take_added(self) -> List[Tuple]:
+        added, self._added = self._added, []
+        return added
+
+
+class StandInRepository:
+    """
+    One repository: an rdflib Dataset whose default graph is the union of all named graphs (like GraphDB),
+    plus the incremental reasoner described in the module docstring.
+    """
+    def __init__(self, ontology_path: Path = MEDICAL_ISSUE_DEFINITIONS_PATH):
+        self.store = _RecordingMemory()
+        self.dataset = Dataset(store=self.store, default_union=True)
+        self.dataset.default_context.parse(ontology_path, format="turtle")
+
+        ontology = self.dataset.default_context
+        self.superclasses: Dict[URIRef, Set[URIRef]] = self._subclass_closure(ontology)
+        for each_class, superclasses in self.superclasses.items():
+            for superclass in superclasses:
+                ontology.add((each_class, RDFS.subClassOf, superclass))
+        for subject, each_class in list(ontology.subject_objects(RDF.type)):
+            self._add_inherited_types(subject, each_class, ontology)
+
+        # (measurement type, value) -> required measurement value pairs of the treatment levels
+        self.required_pairs: Dict[Tuple, List] = defaultdict(list)
+        for required_pair in ontology.objects(None, CSA.hasMeasurementValuePair):
+            key = (ontology.value(required_pair, CSA.hasMeasurement), ontology.value(required_pair, CSA.hasValue))
+            self.required_pairs[key].append(required_pair)
+        self.store.recording = True
+
+    @staticmethod
+    def _subclass_closure(graph: Graph) -> Dict[URIRef, Set[URIRef]]:
+        direct = defaultdict(set)
+        for subclass, superclass in graph.subject_objects(RDFS.subClassOf):
+            if isinstance(subclass, URIRef) and isinstance(superclass, URIRef):
+                direct[subclass].add(superclass)
+                direct.setdefault(superclass, set())
+        closure = {}
+        for each_class in direct:
+            reached, pending = {each_class}, [each_class]
+            while pending:
+                for superclass in direct[pending.pop()]:
+                    if superclass not in reached:
+                        reached.add(superclass)
+                        pending.append(superclass)
+            closure[each_class] = reached
+        return closure
+
+    def _add_inherited_types(self, subject, each_class, context: Graph):
+        for superclass in self.superclasses.get(each_class, ()):
+            if superclass != each_class:
+                self.store.add((subject, RDF.type, superclass), context)
+
+    def _reason(self):
+        """Applies the rules to everything added since the last call, until nothing new is inferred."""
+        graph = self.dataset
+        added = self.store.take_added()
+        while added:
+            measurement_pairs = {}
+            for (subject, predicate, obj), context in added:
+                if predicate == RDF.type:
+                    self._add_inherited_types(subject, obj, context)
+                elif predicate == CSA.hasHealthMeasurement:
+                    measurement_pairs[obj] = context
+                elif predicate in (CSA.hasMeasurement, CSA.hasValue):
+                    measurement_pairs.setdefault(subject, context)
+            for measurement_pair, context in measurement_pairs.items():
+                if (None, CSA.hasHealthMeasurement, measurement_pair) not in graph:
+                    continue
+                key = (graph.value(measurement_pair, CSA.hasMeasurement), graph.value(measurement_pair, CSA.hasValue))
+                for required_pair in self.required_pairs.get(key, ()):
+                    self.store.add((measurement_pair, CSA.matchesMedicalIssueMeasurementPair, required_pair), context)
+            added = self.store.take_added()
+
+    @staticmethod
+    def _normalise(sparql: str) -> str:
+        return TYPED_STRING_PATTERN.sub(r"\1", sparql)
+
+    def query(self, sparql: str) -> bytes:
+        return self.dataset.query(self._normalise(sparql)).serialize(format="json")
+
+    def update(self, sparql: str):
+        self.dataset.update(self._normalise(sparql))
+        self._reason()
+
+    def add_data(self, data: bytes, rdf_format: str, graph: Optional[str] = None):
+        """Adds the statements to `graph` (default graph if None). N-Quads name their graphs themselves."""
+        if rdf_format == "nquads":
+            # Dataset.parse of N-Quads empties the default graph of the dataset, so they are parsed separately
+            parsed = Dataset()
+            parsed.parse(data=data, format=rdf_format)
+            for subject, predicate, obj, graph_name in parsed.quads():
+                self.dataset.graph(graph_name).add((subject, predicate, obj))
+        else:
+            target = self.dataset.graph(URIRef(graph)) if graph else self.dataset.default_context
+            target.parse(data=data, format=rdf_format)
+        self._reason()
+
+    def __len__(self) -> int:
+        return len(self.dataset)
+
+
+class GraphDBStandIn:
+    """
+    FastAPI application serving StandInRepository instances under the GraphDB REST paths.
+    Requests are handled one at a time on the event loop, like a single-threaded store.
+    `request_counts` counts the requests per repository and kind (query, update, statements, login).
+    """
+    def __init__(self, repository_ids: Tuple[str, ...] = (DEFAULT_REPOSITORY_ID,),
+                 ontology_path: Path = MEDICAL_ISSUE_DEFINITIONS_PATH):
+        self.ontology_path = ontology_path
+        self.repositories: Dict[str, StandInRepository] = {
+            repository_id: StandInRepository(ontology_path) for repository_id in repository_ids
+        }
+        self.request_counts: Dict[str, Counter] = defaultdict(Counter)
+        self._tokens = itertools.count(1)
+        self.app = FastAPI(title="GraphDB stand-in")
+        self.setup_routes()
+
+    def create_repository(self, repository_id: str) -> StandInRepository:
+        repository = self.repositories.get(repository_id)
+        if repository is None:
+            repository = self.repositories[repository_id] = StandInRepository(self.ontology_path)
+        return repository
+
+    def round_trips(self, repository_id: str = DEFAULT_REPOSITORY_ID) -> int:
+        """Requests sent to the repository, logins excluded."""
+        counts = self.request_counts[repository_id]
+        return counts["query"] + counts["update"] + counts["statements"]
+
+    def transport(self) -> httpx.ASGITransport:
+        return httpx.ASGITransport(app=self.app)
+
+    def setup_routes(self):
+        @self.app.post("/rest/login")
+        async def login():
+            self.request_counts["rest"]["login"] += 1
+            return Response(status_code=200, headers={"Authorization": f"GDB stand-in-{next(self._tokens)}"})
+
+        @self.app.get("/repositories/{repository_id}")
+        async def query_get(repository_id: str, query: str):
+            return self._run_query(repository_id, query)
+
+        @self.app.post("/repositories/{repository_id}")
+        async def query_post(repository_id: str, request: Request):
+            body = await request.body()
+            query = self._form_field(request, body, "query")
+            return self._run_query(repository_id, query)
+
+        @self.app.post("/repositories/{repository_id}/statements")
+        async def statements(repository_id: str, request: Request):
+            repository = self.repositories.get(repository_id)
+            if repository is None:
+                return Response(status_code=404, content=f"Unknown repository: {repository_id}")
+            body = await request.body()
+            content_type = request.headers.get("content-type", "").split(";")[0].strip()
+            try:
+                if content_type in RDF_FORMATS:
+                    self.request_counts[repository_id]["statements"] += 1
+                    context = request.query_params.get("context", "").strip("<>")
+                    repository.add_data(body, RDF_FORMATS[content_type], graph=context or None)
+                else:
+                    self.request_counts[repository_id]["update"] += 1
+                    repository.update(self._form_field(request, body, "update"))
+            except Exception as e:
+                logger.warning(f"Stand-in rejected statements for {repository_id}: {e}")
+                return Response(status_code=400, content=str(e))
+            return Response(status_code=204)
+
+    @staticmethod
+    def _form_field(request: Request, body: bytes, name: str) -> str:
+        if request.headers.get("content-type", "").startswith("application/x-www-form-urlencoded"):
+            return parse_qs(body.decode("utf-8")).get(name, [""])[0]
+        return body.decode("utf-8")
+
+    def _run_query(self, repository_id: str, query: str) -> Response:
+        repository = self.repositories.get(repository_id)
+        if repository is None:
+            return Response(status_code=404, content=f"Unknown repository: {repository_id}")
+        self.request_counts[repository_id]["query"] += 1
+        try:
+            return Response(content=repository.query(query), media_type=SPARQL_RESULTS_JSON)
+        except Exception as e:
+            logger.warning(f"Stand-in rejected query for {repository_id}: {e}")
+            return Response(status_code=400, content=str(e))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    uvicorn.run(GraphDBStandIn().app, host="0.0.0.0", port=DEFAULT_PORT, log_level="info")
@@ -0,0 +1,189 @@
+import asyncio
+
+import pytest
+
+from application_components.channel_queue import ChannelQueue, OverflowPolicy
+from application_components.worker_pool import ShardedWorkerPool
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def queued(queue: ChannelQueue) -> list:
+    return list(queue._items.values())
+
+
+def test_drop_oldest_discards_the_oldest_message_when_full():
+    async def scenario():
+        dropped = []
+        queue = ChannelQueue("test", 3, OverflowPolicy.DROP_OLDEST, on_discard=dropped.append)
+        for message in range(5):
+            await queue.put(message)
+        return queue, dropped
+
+    queue, dropped = run(scenario())
+    assert queued(queue) == [2, 3, 4]
+    assert dropped == [0, 1]
+    assert queue.metrics()["dropped"] == 2
+
+
+def test_drop_oldest_keeps_messages_that_are_not_discardable():
+    async def scenario():
+        queue = ChannelQueue("test", 3, OverflowPolicy.DROP_OLDEST, discardable=lambda message: message[1] != "emergency")
+        for message in [(1, "emergency"), (2, "normal"), (3, "normal"), (4, "normal")]:
+            await queue.put(message)
+        return queue
+
+    assert queued(run(scenario())) == [(1, "emergency"), (3, "normal"), (4, "normal")]
+
+
+def test_full_queue_of_kept_messages_drops_the_arriving_discardable_one():
+    async def scenario():
+        dropped = []
+        queue = ChannelQueue("test", 2, OverflowPolicy.DROP_OLDEST, on_discard=dropped.append,
+                             discardable=lambda message: message[1] != "emergency")
+        for message in [(1, "emergency"), (2, "emergency"), (3, "normal")]:
+            await queue.put(message)
+        return queue, dropped
+
+    queue, dropped = run(scenario())
+    assert queued(queue) == [(1, "emergency"), (2, "emergency")]
+    assert dropped == [(3, "normal")]
+
+
+def test_coalesce_keeps_every_message_while_there_is_room():
+    async def scenario():
+        queue = ChannelQueue("test", 4, OverflowPolicy.COALESCE, coalesce_key=lambda message: message[0])
+        for message in [("alice", 1), ("alice", 2), ("bob", 1)]:
+            await queue.put(message)
+        return queue
+
+    queue = run(scenario())
+    assert queued(queue) == [("alice", 1), ("alice", 2), ("bob", 1)]
+    assert queue.metrics()["coalesced"] == 0
+
+
+def test_coalesce_at_capacity_replaces_the_latest_message_of_the_same_key_in_place():
+    async def scenario():
+        replaced = []
+        queue = ChannelQueue("test", 3, OverflowPolicy.COALESCE, coalesce_key=lambda message: message[0],
+                             on_discard=replaced.append)
+        for message in [("alice", 1), ("bob", 1), ("alice", 2), ("alice", 3)]:
+            await queue.put(message)
+        return queue, replaced
+
+    queue, replaced = run(scenario())
+    assert queued(queue) == [("alice", 1), ("bob", 1), ("alice", 3)]
+    assert replaced == [("alice", 2)]
+    assert queue.metrics()["coalesced"] == 1
+
+
+def test_coalesce_at_capacity_never_replaces_a_message_that_is_not_discardable():
+    async def scenario():
+        queue = ChannelQueue("test", 2, OverflowPolicy.COALESCE, coalesce_key=lambda message: message[0],
+                             discardable=lambda message: message[1] != "emergency")
+        for message in [("bob", "normal"), ("alice", "emergency"), ("alice", "normal")]:
+            await queue.put(message)
+        return queue
+
+    assert queued(run(scenario())) == [("alice", "emergency"), ("alice", "normal")]
+
+
+def test_coalesce_without_a_queued_message_of_the_key_drops_the_oldest():
+    async def scenario():
+        queue = ChannelQueue("test", 2, OverflowPolicy.COALESCE, coalesce_key=lambda message: message[0])
+        for message in [("alice", 1), ("bob", 1), ("carol", 1)]:
+            await queue.put(message)
+        return queue
+
+    queue = run(scenario())
+    assert queued(queue) == [("bob", 1), ("carol", 1)]
+    assert queue.metrics()["dropped"] == 1
+
+
+def test_block_makes_the_producer_wait_until_a_message_is_taken():
+    async def scenario():
+        queue = ChannelQueue("test", 1, OverflowPolicy.BLOCK)
+        await queue.put(1)
+        producer = asyncio.create_task(queue.put(2))
+        await asyncio.sleep(0)
+        waited = not producer.done()
+        assert await queue.get() == 1
+        await asyncio.wait_for(producer, 1)
+        return queue, waited
+
+    queue, waited = run(scenario())
+    assert waited
+    assert queued(queue) == [2]
+    assert queue.metrics()["blocked_puts"] == 1
+    assert queue.metrics()["dropped"] == 0
+
+
+def test_block_put_nowait_accepts_beyond_capacity_and_counts_the_overflow():
+    async def scenario():
+        queue = ChannelQueue("test", 2, OverflowPolicy.BLOCK)
+        for message in range(4):
+            queue.put_nowait(message)
+        return queue
+
+    metrics = run(scenario()).metrics()
+    assert metrics["depth"] == 4
+    assert metrics["overflowed"] == 2
+    assert metrics["dropped"] == 0
+
+
+def test_block_wait_for_capacity_returns_once_there_is_room():
+    async def scenario():
+        queue = ChannelQueue("test", 1, OverflowPolicy.BLOCK)
+        await queue.put(1)
+        waiter = asyncio.create_task(queue.wait_for_capacity())
+        await asyncio.sleep(0)
+        waited = not waiter.done()
+        await queue.get()
+        await asyncio.wait_for(waiter, 1)
+        return waited
+
+    assert run(scenario())
+
+
+def test_join_waits_until_every_message_is_marked_as_handled():
+    async def scenario():
+        queue = ChannelQueue("test", 2, OverflowPolicy.DROP_OLDEST)
+        await queue.put(1)
+        joined = asyncio.create_task(queue.join())
+        await queue.get()
+        await asyncio.sleep(0)
+        pending = not joined.done()
+        queue.task_done()
+        await asyncio.wait_for(joined, 1)
+        return pending
+
+    assert run(scenario())
+
+
+def test_coalesce_requires_a_key():
+    with pytest.raises(ValueError):
+        ChannelQueue("test", 1, OverflowPolicy.COALESCE)
+
+
+def test_worker_pool_handles_the_messages_of_one_key_in_order():
+    async def scenario():
+        handled = []
+
+        async def handle(message):
+            await asyncio.sleep(0)
+            handled.append(message)
+
+        pool = ShardedWorkerPool("test", handle, shard_key=lambda message: message[0], shard_count=4)
+        pool.start()
+        for sequence in range(20):
+            pool.submit_nowait((sequence % 3, sequence))
+        await pool.drain(timeout=1)
+        return handled
+
+    handled = run(scenario())
+    assert len(handled) == 20
+    for key in range(3):
+        sequences = [sequence for message_key, sequence in handled if message_key == key]
+        assert sequences == sorted(sequences)
@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+from application_components.dataclasses import Edge
+from application_components.medicus.distance_index import AllPairsDistanceIndex, LandmarkDistanceIndex
+from application_components.medicus.street_network import StreetNetwork
+from scenarios.city_generator import PopulationConfig, generate_city_scenario
+
+
+@pytest.fixture(scope="module")
+def city_network() -> StreetNetwork:
+    scenario = generate_city_scenario("Distance index", 300, PopulationConfig(citizens=10, responders=5), seed=7)
+    return StreetNetwork.from_graph(scenario.graph)
+
+
+@pytest.fixture(scope="module")
+def split_network() -> StreetNetwork:
+    """Two street components: a-b-c-d and x-y."""
+    return StreetNetwork([
+        Edge("a", "b", 10), Edge("b", "c", 20), Edge("c", "d", 5), Edge("d", "a", 40),
+        Edge("x", "y", 7), Edge("y", "y", 3),
+    ])
+
+
+def sample_pairs(network: StreetNetwork, count: int, seed: int = 1):
+    segments = sorted(network.lengths)
+    generator = random.Random(seed)
+    return [(generator.choice(segments), generator.choice(segments)) for _ in range(count)]
+
+
+def test_landmark_distances_agree_with_all_pairs(city_network):
+    all_pairs = AllPairsDistanceIndex.build(city_network)
+    landmarks = LandmarkDistanceIndex.build(city_network, landmark_count=8)
+    for source, target in sample_pairs(city_network, 300):
+        assert landmarks.distance(source, target) == all_pairs.distance(source, target), (source, target)
+
+
+def test_landmark_ranking_agrees_with_all_pairs(city_network):
+    all_pairs = AllPairsDistanceIndex.build(city_network)
+    landmarks = LandmarkDistanceIndex.build(city_network, landmark_count=8)
+    segments = sorted(city_network.lengths)
+    generator = random.Random(2)
+    for _ in range(30):
+        source = generator.choice(segments)
+        targets = generator.sample(segments, 25)
+        assert landmarks.rank(source, targets, 3) == all_pairs.rank(source, targets, 3)
+
+
+def test_all_pairs_agrees_with_the_street_network_search(city_network):
+    all_pairs = AllPairsDistanceIndex.build(city_network)
+    for source, target in sample_pairs(city_network, 50, seed=3):
+        assert all_pairs.distance(source, target) == city_network.shortest_distances(source, [target]).get(target)
+
+
+@pytest.mark.parametrize("index_type", [AllPairsDistanceIndex, LandmarkDistanceIndex])
+def test_unreachable_segments_have_no_distance_and_are_not_ranked(split_network, index_type):
+    index = index_type.build(split_network)
+    assert index.distance("a", "x") is None
+    assert index.distance("a", "a") == 0
+    assert index.distance("a", "c") == 20
+    assert index.rank("a", ["x", "y", "c", "b"], 3) == [("b", 0), ("c", 20)]